@@ -22,14 +22,28 @@ interface ConfusionEntry {
   count: number;
 }
 
+interface ModelEvaluation {
+  level: string;
+  images: number;
+  accuracy: number;
+  top5_accuracy: number;
+  macro_f1: number;
+  calibration: { ece: number };
+  evaluated_at: string;
+}
+
+// Served from the model's evaluation report when there is one (no training fields),
+// otherwise the static training summary (evaluation is null)
 interface ModelStats {
   model_name: string;
-  total_epochs: number;
+  total_epochs: number | null;
   final_accuracy: number;
   training_history: TrainingMetric[];
   confusion_matrix: ConfusionEntry[];
-  learning_rate: number;
+  learning_rate: number | null;
   architecture_description: string;
+  model_hash?: string | null;
+  evaluation?: ModelEvaluation | null;
 }
 
 interface PersonalStats {
@@ -196,7 +210,9 @@ export default function Insights() {
                   <div>
                     <p className="text-sm text-muted-foreground">Final Accuracy</p>
                     <h3 className="text-3xl font-bold mt-1 text-success">{(data.final_accuracy * 100).toFixed(1)}%</h3>
-                    <p className="text-xs text-muted-foreground mt-1">on Test Set</p>
+                    <p className="text-xs text-muted-foreground mt-1">
+                      {data.evaluation ? `on ${data.evaluation.images} labelled images` : "on Test Set"}
+                    </p>
                   </div>
                   <TrendingUp className="w-8 h-8 text-success opacity-50" />
                 </div>
@@ -207,9 +223,19 @@ export default function Insights() {
               <CardContent className="pt-6">
                 <div className="flex justify-between items-start">
                   <div>
-                    <p className="text-sm text-muted-foreground">Total Epochs</p>
-                    <h3 className="text-3xl font-bold mt-1">{data.total_epochs}</h3>
-                    <p className="text-xs text-muted-foreground mt-1">Training Cycles</p>
+                    {data.evaluation ? (
+                      <>
+                        <p className="text-sm text-muted-foreground">Top-5 Accuracy</p>
+                        <h3 className="text-3xl font-bold mt-1">{(data.evaluation.top5_accuracy * 100).toFixed(1)}%</h3>
+                        <p className="text-xs text-muted-foreground mt-1">Right answer in the top 5</p>
+                      </>
+                    ) : (
+                      <>
+                        <p className="text-sm text-muted-foreground">Total Epochs</p>
+                        <h3 className="text-3xl font-bold mt-1">{data.total_epochs ?? "—"}</h3>
+                        <p className="text-xs text-muted-foreground mt-1">Training Cycles</p>
+                      </>
+                    )}
                   </div>
                   <Activity className="w-8 h-8 text-warning opacity-50" />
                 </div>
@@ -220,9 +246,19 @@ export default function Insights() {
               <CardContent className="pt-6">
                 <div className="flex justify-between items-start">
                   <div>
-                    <p className="text-sm text-muted-foreground">Learning Rate</p>
-                    <h3 className="text-3xl font-bold mt-1 font-mono">{data.learning_rate}</h3>
-                    <p className="text-xs text-muted-foreground mt-1">Adam Optimizer</p>
+                    {data.evaluation ? (
+                      <>
+                        <p className="text-sm text-muted-foreground">Macro F1</p>
+                        <h3 className="text-3xl font-bold mt-1 font-mono">{data.evaluation.macro_f1.toFixed(3)}</h3>
+                        <p className="text-xs text-muted-foreground mt-1">Calibration error {data.evaluation.calibration.ece.toFixed(3)}</p>
+                      </>
+                    ) : (
+                      <>
+                        <p className="text-sm text-muted-foreground">Learning Rate</p>
+                        <h3 className="text-3xl font-bold mt-1 font-mono">{data.learning_rate ?? "—"}</h3>
+                        <p className="text-xs text-muted-foreground mt-1">Adam Optimizer</p>
+                      </>
+                    )}
                   </div>
                   <GitGraph className="w-8 h-8 text-accent opacity-50" />
                 </div>
@@ -230,77 +266,79 @@ export default function Insights() {
             </Card>
           </div>
 
-          {/* Charts Section */}
-          <div className="grid grid-cols-1 lg:grid-cols-2 gap-6 mt-6">
+          {/* Charts Section (training curves aren't part of an evaluation report) */}
+          {data.training_history.length > 0 && (
+            <div className="grid grid-cols-1 lg:grid-cols-2 gap-6 mt-6">
 
-            {/* Accuracy Curve */}
-            <Card className="border-l-4 border-l-success">
-              <CardHeader>
-                <CardTitle className="flex items-center gap-2">
-                  <TrendingUp className="w-5 h-5 text-success" />
-                  Learning Curve (Accuracy)
-                </CardTitle>
-                <CardDescription>Visualizing how the model gets smarter over time.</CardDescription>
-              </CardHeader>
-              <CardContent>
-                <ResponsiveContainer width="100%" height={300}>
-                  <AreaChart data={data.training_history}>
-                    <defs>
-                      <linearGradient id="colorAcc" x1="0" y1="0" x2="0" y2="1">
-                        <stop offset="5%" stopColor="hsl(var(--success))" stopOpacity={0.3} />
-                        <stop offset="95%" stopColor="hsl(var(--success))" stopOpacity={0} />
-                      </linearGradient>
-                    </defs>
-                    <CartesianGrid strokeDasharray="3 3" className="stroke-border" />
-                    <XAxis dataKey="epoch" tick={{ fill: 'hsl(var(--muted-foreground))' }} label={{ value: 'Epochs', position: 'insideBottomRight', offset: -5 }} />
-                    <YAxis domain={[0, 1]} tick={{ fill: 'hsl(var(--muted-foreground))' }} />
-                    <Tooltip contentStyle={{ backgroundColor: 'hsl(var(--card))', borderColor: 'hsl(var(--border))' }} />
-                    <Area type="monotone" dataKey="accuracy" stroke="hsl(var(--success))" fillOpacity={1} fill="url(#colorAcc)" name="Training Acc" />
-                    <Area type="monotone" dataKey="val_accuracy" stroke="hsl(var(--foreground))" strokeDasharray="5 5" fill="transparent" name="Validation Acc" />
-                    <Legend />
-                  </AreaChart>
-                </ResponsiveContainer>
-                <div className="mt-4 p-3 bg-muted/50 rounded-lg flex gap-3 text-sm">
-                  <Info className="w-5 h-5 text-success shrink-0" />
-                  <p>
-                    <span className="font-bold">Insight:</span> The gap between Training (Green) and Validation (Dashed) accuracy is small, indicating
-                    <span className="font-semibold text-success"> minimal overfitting</span>. The model generalizes well to new images.
-                  </p>
-                </div>
-              </CardContent>
-            </Card>
+              {/* Accuracy Curve */}
+              <Card className="border-l-4 border-l-success">
+                <CardHeader>
+                  <CardTitle className="flex items-center gap-2">
+                    <TrendingUp className="w-5 h-5 text-success" />
+                    Learning Curve (Accuracy)
+                  </CardTitle>
+                  <CardDescription>Visualizing how the model gets smarter over time.</CardDescription>
+                </CardHeader>
+                <CardContent>
+                  <ResponsiveContainer width="100%" height={300}>
+                    <AreaChart data={data.training_history}>
+                      <defs>
+                        <linearGradient id="colorAcc" x1="0" y1="0" x2="0" y2="1">
+                          <stop offset="5%" stopColor="hsl(var(--success))" stopOpacity={0.3} />
+                          <stop offset="95%" stopColor="hsl(var(--success))" stopOpacity={0} />
+                        </linearGradient>
+                      </defs>
+                      <CartesianGrid strokeDasharray="3 3" className="stroke-border" />
+                      <XAxis dataKey="epoch" tick={{ fill: 'hsl(var(--muted-foreground))' }} label={{ value: 'Epochs', position: 'insideBottomRight', offset: -5 }} />
+                      <YAxis domain={[0, 1]} tick={{ fill: 'hsl(var(--muted-foreground))' }} />
+                      <Tooltip contentStyle={{ backgroundColor: 'hsl(var(--card))', borderColor: 'hsl(var(--border))' }} />
+                      <Area type="monotone" dataKey="accuracy" stroke="hsl(var(--success))" fillOpacity={1} fill="url(#colorAcc)" name="Training Acc" />
+                      <Area type="monotone" dataKey="val_accuracy" stroke="hsl(var(--foreground))" strokeDasharray="5 5" fill="transparent" name="Validation Acc" />
+                      <Legend />
+                    </AreaChart>
+                  </ResponsiveContainer>
+                  <div className="mt-4 p-3 bg-muted/50 rounded-lg flex gap-3 text-sm">
+                    <Info className="w-5 h-5 text-success shrink-0" />
+                    <p>
+                      <span className="font-bold">Insight:</span> The gap between Training (Green) and Validation (Dashed) accuracy is small, indicating
+                      <span className="font-semibold text-success"> minimal overfitting</span>. The model generalizes well to new images.
+                    </p>
+                  </div>
+                </CardContent>
+              </Card>
 
-            {/* Loss Curve */}
-            <Card className="border-l-4 border-l-destructive">
-              <CardHeader>
-                <CardTitle className="flex items-center gap-2">
-                  <TrendingDown className="w-5 h-5 text-destructive" />
-                  Error Minimization (Loss)
-                </CardTitle>
-                <CardDescription>Measuring the difference between prediction and reality.</CardDescription>
-              </CardHeader>
-              <CardContent>
-                <ResponsiveContainer width="100%" height={300}>
-                  <LineChart data={data.training_history}>
-                    <CartesianGrid strokeDasharray="3 3" className="stroke-border" />
-                    <XAxis dataKey="epoch" tick={{ fill: 'hsl(var(--muted-foreground))' }} />
-                    <YAxis tick={{ fill: 'hsl(var(--muted-foreground))' }} />
-                    <Tooltip contentStyle={{ backgroundColor: 'hsl(var(--card))', borderColor: 'hsl(var(--border))' }} />
-                    <Line type="monotone" dataKey="loss" stroke="hsl(var(--destructive))" strokeWidth={2} dot={false} name="Training Loss" />
-                    <Line type="monotone" dataKey="val_loss" stroke="hsl(var(--warning))" strokeWidth={2} dot={false} name="Validation Loss" />
-                    <Legend />
-                  </LineChart>
-                </ResponsiveContainer>
-                <div className="mt-4 p-3 bg-muted/50 rounded-lg flex gap-3 text-sm">
-                  <Info className="w-5 h-5 text-destructive shrink-0" />
-                  <p>
-                    <span className="font-bold">Insight:</span> "Loss" is the penalty for bad guesses. Steep drop in early epochs shows
-                    <span className="font-semibold text-foreground"> rapid feature learning</span> (edges, textures), followed by fine-tuning.
-                  </p>
-                </div>
-              </CardContent>
-            </Card>
-          </div>
+              {/* Loss Curve */}
+              <Card className="border-l-4 border-l-destructive">
+                <CardHeader>
+                  <CardTitle className="flex items-center gap-2">
+                    <TrendingDown className="w-5 h-5 text-destructive" />
+                    Error Minimization (Loss)
+                  </CardTitle>
+                  <CardDescription>Measuring the difference between prediction and reality.</CardDescription>
+                </CardHeader>
+                <CardContent>
+                  <ResponsiveContainer width="100%" height={300}>
+                    <LineChart data={data.training_history}>
+                      <CartesianGrid strokeDasharray="3 3" className="stroke-border" />
+                      <XAxis dataKey="epoch" tick={{ fill: 'hsl(var(--muted-foreground))' }} />
+                      <YAxis tick={{ fill: 'hsl(var(--muted-foreground))' }} />
+                      <Tooltip contentStyle={{ backgroundColor: 'hsl(var(--card))', borderColor: 'hsl(var(--border))' }} />
+                      <Line type="monotone" dataKey="loss" stroke="hsl(var(--destructive))" strokeWidth={2} dot={false} name="Training Loss" />
+                      <Line type="monotone" dataKey="val_loss" stroke="hsl(var(--warning))" strokeWidth={2} dot={false} name="Validation Loss" />
+                      <Legend />
+                    </LineChart>
+                  </ResponsiveContainer>
+                  <div className="mt-4 p-3 bg-muted/50 rounded-lg flex gap-3 text-sm">
+                    <Info className="w-5 h-5 text-destructive shrink-0" />
+                    <p>
+                      <span className="font-bold">Insight:</span> "Loss" is the penalty for bad guesses. Steep drop in early epochs shows
+                      <span className="font-semibold text-foreground"> rapid feature learning</span> (edges, textures), followed by fine-tuning.
+                    </p>
+                  </div>
+                </CardContent>
+              </Card>
+            </div>
+          )}
 
           {/* Bottom Section: Confusion Matrix & Theory */}
           <div className="grid grid-cols-1 lg:grid-cols-3 gap-6 mt-6">
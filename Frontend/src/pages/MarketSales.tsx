@@ -2,7 +2,7 @@ import { useEffect, useState } from "react";
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
 import { Button } from "@/components/ui/button";
-import { TrendingUp, TrendingDown, DollarSign, Calendar, MapPin, Search, Loader2, ArrowRight } from "lucide-react";
+import { TrendingUp, TrendingDown, Minus, DollarSign, Calendar, MapPin, Search, Loader2, ArrowRight } from "lucide-react";
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from "recharts";
 import { Input } from "@/components/ui/input";
 import { useAuth } from "@/context/AuthContext";
@@ -143,8 +143,8 @@ export default function MarketSales() {
                     <p className="text-xs text-muted-foreground mt-1">{data.unit}</p>
                   </div>
                   <div className="text-right">
-                    <div className={`flex items-center gap-1 ${data.trend === 'Bullish' ? 'text-success' : 'text-destructive'}`}>
-                      {data.trend === 'Bullish' ? <TrendingUp className="w-4 h-4" /> : <TrendingDown className="w-4 h-4" />}
+                    <div className={`flex items-center gap-1 ${data.trend === 'Bullish' ? 'text-success' : data.trend === 'Stable' ? 'text-muted-foreground' : 'text-destructive'}`}>
+                      {data.trend === 'Bullish' ? <TrendingUp className="w-4 h-4" /> : data.trend === 'Stable' ? <Minus className="w-4 h-4" /> : <TrendingDown className="w-4 h-4" />}
                       <span className="text-sm font-medium">{data.trend}</span>
                     </div>
                     <p className="text-xs text-muted-foreground mt-1">{data.trend_description}</p>
@@ -6,6 +6,7 @@ import {
   AlertCircle,
   CheckCircle2,
   TrendingUp,
+  Minus,
   Calendar,
   Leaf,
   Loader2
@@ -181,8 +182,8 @@ export default function Overview() {
             {marketData ? (
               <>
                 <div className="text-3xl font-bold text-foreground">{marketData.trend}</div>
-                <p className={`text-xs mt-1 flex items-center gap-1 ${marketData.trend === 'Bullish' ? 'text-success' : 'text-destructive'}`}>
-                  {marketData.trend === 'Bullish' ? <TrendingUp className="w-3 h-3" /> : <TrendingUp className="w-3 h-3 rotate-180" />}
+                <p className={`text-xs mt-1 flex items-center gap-1 ${marketData.trend === 'Bullish' ? 'text-success' : marketData.trend === 'Stable' ? 'text-muted-foreground' : 'text-destructive'}`}>
+                  {marketData.trend === 'Bullish' ? <TrendingUp className="w-3 h-3" /> : marketData.trend === 'Stable' ? <Minus className="w-3 h-3" /> : <TrendingUp className="w-3 h-3 rotate-180" />}
                   {marketData.trend_description}
                 </p>
               </>
@@ -0,0 +1,157 @@
+"""
+Admission control for inference requests.
+
+A request is admitted when a concurrency slot is free and its estimated
+memory (upload bytes + decoded pixels + model inputs) fits in the budget
+next to everything already running. Otherwise it waits in its lane:
+
+    interactive  single scans from the app; always served first
+    bulk         surveys and background jobs
+
+A lane holds at most `max_queued` waiters, and an interactive waiter gives
+up after `max_wait_s`. Both cases raise `Rejected`, with a Retry-After
+estimated from the queue ahead and the recent service time. Rejecting
+early keeps latency predictable and memory flat under overload: queued
+requests only hold their (spooled) uploads, never decoded images.
+
+Single event loop only (no locks): acquire/release are called from request
+handlers and job workers of one process.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+LANES = ("interactive", "bulk")
+
+
+class Rejected(Exception):
+    """The request can't be admitted now; retry after `retry_after` seconds"""
+
+    def __init__(self, lane, reason, retry_after):
+        super().__init__(f"{lane} queue {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    lane: str
+    cost: int
+    waited_s: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)  # when admitted
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=32, memory_budget_bytes=512 * 2 ** 20, max_queued=None,
+                 max_wait_s=2.0, initial_service_s=0.2, smoothing=0.1):
+        self.max_concurrent = max(1, max_concurrent)
+        self.memory_budget = max(1, memory_budget_bytes)
+        self.max_queued = {"interactive": 64, "bulk": 16, **(max_queued or {})}
+        self.max_wait_s = max_wait_s
+        self.service_s = initial_service_s  # moving average of admitted requests' service time
+        self.smoothing = smoothing
+        self.active = 0
+        self.memory_in_use = 0
+        self.admitted = dict.fromkeys(LANES, 0)
+        self.rejected = dict.fromkeys(LANES, 0)
+        self._waiters = {lane: deque() for lane in LANES}  # (cost, future), FIFO per lane
+
+    def queued(self, lane):
+        return len(self._waiters[lane])
+
+    def _fits(self, cost):
+        if self.active >= self.max_concurrent:
+            return False
+        # A request larger than the whole budget still runs, alone
+        return self.active == 0 or self.memory_in_use + cost <= self.memory_budget
+
+    def _ahead(self, lane):
+        """Waiters served before a new one in `lane`"""
+        lanes = LANES[:LANES.index(lane) + 1]
+        return sum(len(self._waiters[name]) for name in lanes)
+
+    def retry_after(self, lane):
+        """Seconds until a request joining `lane` now would likely start"""
+        wait = (self._ahead(lane) + 1) * self.service_s / self.max_concurrent
+        return max(1, min(60, math.ceil(wait)))
+
+    def _grant(self, lane, cost):
+        self.active += 1
+        self.memory_in_use += cost
+        self.admitted[lane] += 1
+
+    def _reject(self, lane, reason):
+        self.rejected[lane] += 1
+        raise Rejected(lane, reason, self.retry_after(lane))
+
+    async def acquire(self, cost, lane="interactive", reject=True):
+        """
+        Wait for admission and return a Ticket (pass it to release()).
+        reject=False waits as long as it takes (background jobs); otherwise
+        raises Rejected when the lane is full or the wait exceeds max_wait_s.
+        """
+        cost = min(max(0, int(cost)), self.memory_budget)
+        t0 = time.perf_counter()
+        if self._ahead(lane) == 0 and self._fits(cost):
+            self._grant(lane, cost)
+            return Ticket(lane, cost)
+        if reject and len(self._waiters[lane]) >= self.max_queued[lane]:
+            self._reject(lane, "full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (cost, future)
+        self._waiters[lane].append(entry)
+        try:
+            timeout = self.max_wait_s if reject and lane == "interactive" else None
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as the wait was abandoned: hand the slot back
+                self._release(lane, cost)
+            else:
+                future.cancel()
+                self._waiters[lane].remove(entry)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject(lane, "timeout")
+            raise
+        return Ticket(lane, cost, waited_s=time.perf_counter() - t0)
+
+    def release(self, ticket):
+        service_s = time.perf_counter() - ticket.started_at
+        self.service_s += self.smoothing * (service_s - self.service_s)
+        self._release(ticket.lane, ticket.cost)
+
+    def _release(self, lane, cost):
+        self.active -= 1
+        self.memory_in_use -= cost
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit waiters in lane order (FIFO within a lane) while they fit"""
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters:
+                cost, future = waiters[0]
+                if future.done():
+                    waiters.popleft()
+                    continue
+                if not self._fits(cost):
+                    return
+                waiters.popleft()
+                self._grant(lane, cost)
+                future.set_result(None)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "memory_in_use": self.memory_in_use,
+            "memory_budget": self.memory_budget,
+            "service_s": round(self.service_s, 4),
+            "queued": {lane: self.queued(lane) for lane in LANES},
+            "admitted": dict(self.admitted),
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,181 @@
+"""
+Weather advisories for farms: irrigation, spraying, frost / storm alerts and
+disease risk, from the 48-hour forecast of each farm's weather cell.
+
+Rules are evaluated on arrays over all distinct cells of a batch at once
+((cells, steps) per weather variable, (rules, cells, steps) for diseases);
+farms then read their cell's results, so a batch costs one pass over the
+forecasts however many farms share a cell.
+
+Disease rules are weather windows in which a disease in DISEASE_DATABASE
+spreads (e.g. late blight: 10-25 °C with humidity >= 90%). Hours inside the
+window over the horizon give its risk, and the advisory carries the
+database entry's severity and precautions.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+
+from weather import STEP_HOURS
+
+logger = logging.getLogger(__name__)
+
+# Irrigation / spraying / alert thresholds (rain in mm, wind in km/h, temperatures in °C)
+SKIP_IRRIGATION_RAIN_24H = 5.0
+HEAT_STRESS_TEMP = 30.0
+HEAT_STRESS_HUMIDITY = 40.0
+SPRAY_MAX_WIND = 15.0
+SPRAY_MAX_RAIN_12H = 0.5
+FROST_TEMP = 5.0
+
+
+@dataclass(frozen=True)
+class DiseaseRule:
+    disease: str                      # DISEASE_DATABASE key
+    crops: Tuple[str, ...]
+    temp_c: Tuple[float, float]
+    humidity: Tuple[float, float]
+    wet: bool                         # also needs rain in the step (wet leaves)
+    moderate_hours: float
+    high_hours: float
+
+
+DISEASE_RULES = (
+    DiseaseRule("late_blight", ("Tomato", "Potato"), (10, 25), (90, 100), False, 6, 12),
+    DiseaseRule("early_blight", ("Tomato", "Potato"), (24, 29), (90, 100), False, 6, 12),
+    DiseaseRule("bacterial_spot", ("Tomato", "Pepper", "Peach"), (24, 30), (0, 100), True, 6, 12),
+    DiseaseRule("septoria_leaf_spot", ("Tomato",), (20, 25), (0, 100), True, 6, 12),
+    DiseaseRule("apple_scab", ("Apple",), (6, 24), (0, 100), True, 9, 18),
+    DiseaseRule("common_rust", ("Corn", "Maize"), (16, 25), (95, 100), False, 6, 12),
+    DiseaseRule("powdery_mildew", ("Squash", "Cherry"), (20, 27), (50, 80), False, 12, 24),
+)
+
+
+def _crop_key(crop):
+    return crop.strip().lower()
+
+
+class AdvisoryEngine:
+    def __init__(self, disease_db, rules=DISEASE_RULES):
+        missing = [r.disease for r in rules if r.disease not in disease_db]
+        if missing:
+            logger.warning("Disease rules without a disease database entry are skipped", extra={"diseases": missing})
+        self.rules = [r for r in rules if r.disease in disease_db]
+        self.disease_db = disease_db
+        self.temp_lo, self.temp_hi, self.hum_lo, self.hum_hi = (
+            np.array([getattr(r, field)[i] for r in self.rules], dtype=np.float32)[:, None, None]
+            for field, i in (("temp_c", 0), ("temp_c", 1), ("humidity", 0), ("humidity", 1))
+        )
+        self.wet = np.array([r.wet for r in self.rules])[:, None, None]
+        self.moderate_hours = np.array([r.moderate_hours for r in self.rules])[:, None]
+        self.high_hours = np.array([r.high_hours for r in self.rules])[:, None]
+        self.rules_by_crop = {}  # crop -> rule numbers
+        for i, rule in enumerate(self.rules):
+            for crop in rule.crops:
+                self.rules_by_crop.setdefault(_crop_key(crop), []).append(i)
+
+    def evaluate_cells(self, forecasts):
+        """Rule results for a list of Forecasts, as arrays over cells ((rules, cells) for diseases)"""
+        temp = np.stack([f.temp_c for f in forecasts])
+        humidity = np.stack([f.humidity for f in forecasts])
+        rain = np.stack([f.rain_mm for f in forecasts])
+        wind = np.stack([f.wind_kmh for f in forecasts])
+        storm = np.stack([f.storm for f in forecasts])
+        day, half_day = 24 // STEP_HOURS, 12 // STEP_HOURS
+
+        favourable = ((temp >= self.temp_lo) & (temp <= self.temp_hi) & (humidity >= self.hum_lo)
+                      & (humidity <= self.hum_hi) & (~self.wet | (rain > 0)))
+        hours = favourable.sum(axis=-1) * STEP_HOURS
+        return {
+            "temp": temp[:, 0],
+            "rain_24h": rain[:, :day].sum(axis=1),
+            "rain_12h": rain[:, :half_day].sum(axis=1),
+            "temp_max_24h": temp[:, :day].max(axis=1),
+            "temp_min_24h": temp[:, :day].min(axis=1),
+            "humidity_min_24h": humidity[:, :day].min(axis=1),
+            "wind_max_12h": wind[:, :half_day].max(axis=1),
+            "storm_24h": storm[:, :day].any(axis=1),
+            "disease_hours": hours,
+            "disease_risk": np.select([hours >= self.high_hours, hours >= self.moderate_hours], [2, 1], 0),
+        }
+
+    def advise(self, farms, forecasts):
+        """
+        Advisories for farms ({"farm_id", "region", "crops"} dicts; no crops = every crop with a rule)
+        given each farm's Forecast (None if its weather couldn't be fetched).
+        """
+        cells = {}
+        for forecast in forecasts:
+            if forecast is not None:
+                cells.setdefault(id(forecast), (len(cells), forecast))
+        results = self.evaluate_cells([f for _, f in cells.values()]) if cells else None
+        return [
+            self._farm_advisory(farm, forecast, results, cells[id(forecast)][0]) if forecast is not None
+            else {"farm_id": farm.get("farm_id"), "region": farm.get("region"), "weather_available": False,
+                  "advice": [], "disease_risks": []}
+            for farm, forecast in zip(farms, forecasts)
+        ]
+
+    def _farm_advisory(self, farm, forecast, r, c):
+        temp, rain_24h, rain_12h = float(r["temp"][c]), float(r["rain_24h"][c]), float(r["rain_12h"][c])
+        wind = float(r["wind_max_12h"][c])
+        advice = []
+
+        if rain_24h > SKIP_IRRIGATION_RAIN_24H:
+            advice.append(("irrigation", "Skip Irrigation Today",
+                           f"{rain_24h:.1f} mm of rain expected in the next 24 hours. Natural watering is sufficient.", "Low"))
+        elif r["temp_max_24h"][c] > HEAT_STRESS_TEMP and r["humidity_min_24h"][c] < HEAT_STRESS_HUMIDITY:
+            advice.append(("irrigation", "Increase Irrigation",
+                           f"High heat (up to {r['temp_max_24h'][c]:.0f}°C) and low humidity. Crops may experience stress.", "High"))
+        else:
+            advice.append(("irrigation", "Standard Irrigation", "Weather conditions are normal. Follow routine schedule.", "Medium"))
+
+        if wind > SPRAY_MAX_WIND:
+            advice.append(("spraying", "Avoid Spraying Pesticides",
+                           f"Wind up to {wind:.0f} km/h in the next 12 hours will cause drift. Wait for calm weather.", "High"))
+        elif rain_12h > SPRAY_MAX_RAIN_12H:
+            advice.append(("spraying", "Postpone Spraying", "Rain in the next 12 hours will wash away chemicals. Wait for dry spell.", "High"))
+
+        if r["temp_min_24h"][c] < FROST_TEMP:
+            advice.append(("alert", "Frost Warning",
+                           f"Temperature dropping to {r['temp_min_24h'][c]:.0f}°C. Cover sensitive nursery plants.", "High"))
+        elif r["storm_24h"][c]:
+            advice.append(("alert", "Storm Alert", "Severe weather expected. Secure loose equipment and stay indoors.", "High"))
+
+        crops = farm.get("crops") or []
+        if crops:
+            rule_crops = {}
+            for crop in crops:
+                for i in self.rules_by_crop.get(_crop_key(crop), ()):
+                    rule_crops.setdefault(i, []).append(crop)
+        else:
+            rule_crops = {i: list(rule.crops) for i, rule in enumerate(self.rules)}
+        risks = []
+        for i in sorted(rule_crops, key=lambda i: -r["disease_hours"][i, c]):
+            level = r["disease_risk"][i, c]
+            if not level:
+                continue
+            rule = self.rules[i]
+            info = self.disease_db[rule.disease]
+            risks.append({
+                "disease": rule.disease.replace("_", " ").title(),
+                "crops": rule_crops[i],
+                "risk": "High" if level == 2 else "Moderate",
+                "favourable_hours": int(r["disease_hours"][i, c]),
+                "severity": info["severity"],
+                "precautions": info["precautions"],
+            })
+
+        return {
+            "farm_id": farm.get("farm_id"),
+            "region": farm.get("region"),
+            "weather_available": True,
+            "location": forecast.location,
+            "temp": round(temp, 1),
+            "condition": forecast.description,
+            "advice": [{"category": category, "title": title, "desc": desc, "priority": priority}
+                       for category, title, desc, priority in advice],
+            "disease_risks": risks,
+        }
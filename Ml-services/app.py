@@ -1,12 +1,51 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Header, UploadFile, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from PIL import Image
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+import asyncio
+import contextlib
+import functools
 import io
+import itertools
+import logging
+import numpy as np
+import os
 import random
-from transformers import pipeline
-import torch
-from typing import List, Optional
+import secrets
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import evaluation
+import market
+import metrics
+import tiling
+from batching import MicroBatcher, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from executor import InferenceExecutor
+from inference import (
+    AGGREGATION_STRATEGIES, PRIMARY_MODEL_NAME, predict_batch, predict_batch_in_worker, aggregate_probabilities, top_k
+)
+from admission import LANES, AdmissionController, Rejected
+from advisories import AdvisoryEngine
+from embedding_index import EmbeddingIndex
+from model_loader import ModelLoader
+from model_registry import ModelRegistry, ModelSpec, ModelUnavailable, ServedModel, load_specs
+from outbreaks import OutbreakCounters, PeerSnapshots, geohash, is_geohash, region_report, save_snapshot
+from prediction_cache import PredictionCache
+from response_encoding import Diagnosis, dumps
+from price_store import PriceStore
+from market_index import DEFAULT_LOCATIONS_PATH, MarketIndex
+from preprocessing import TENSOR_HEADER, ImageError
+from survey import iter_survey_files, run_survey
+from weather import FileWeatherProvider, OpenWeatherProvider, WeatherCache
+from jobs import JOB_PRIORITIES, JobQueue, JobStore
+from label_index import DiseaseMatcher, LabelIndex, parse_disease_label
+from logging_config import configure_logging
+from process_memory import process_memory, to_mb
+from profiler import SamplingProfiler
+
+configure_logging()
+logger = logging.getLogger("agro.ml")
 
 app = FastAPI(
     title="AgroAgent ML Service",
@@ -205,29 +244,443 @@ DISEASE_DATABASE = {
     }
 }
 
-# Load Model
-print("Loading Hugging Face Plant Disease Model...")
-print(f"📚 Loaded {len(DISEASE_DATABASE)} disease entries from database.")
-print(f"Keys: {list(DISEASE_DATABASE.keys())}")
-classifier = None
-MODEL_NAME = "Not loaded"
-
-try:
-    classifier = pipeline(
-        "image-classification",
-        model="linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification",
-        device=-1
+logger.info("Disease database loaded", extra={"entries": len(DISEASE_DATABASE)})
+logger.debug("Disease database keys", extra={"keys": list(DISEASE_DATABASE)})
+
+disease_matcher = DiseaseMatcher(DISEASE_DATABASE)
+
+
+def build_label_index(labels):
+    """Map every model label (and the PlantVillage classes) to plant, disease and disease info"""
+    index = LabelIndex.build(labels, DISEASE_DATABASE, parse_disease_label, extra_labels=PLANT_DISEASE_CLASSES)
+    if index.unmapped:
+        logger.warning("Labels without a disease database entry (generic advice will be served)",
+                       extra={"count": len(index.unmapped), "labels": index.unmapped})
+    logger.info("Label index built", extra={"model_labels": len(index), "labels": len(index.by_label)})
+    return index
+
+
+# Inference executor: keeps PIL decoding and forward passes off the event loop
+#   INFERENCE_EXECUTOR=thread  -> thread pool sharing the app's model
+#   INFERENCE_EXECUTOR=process -> process pool, one model copy per worker
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+PIN_CPUS = os.getenv("INFERENCE_PIN_CPUS", "false").lower() in ("1", "true", "yes")
+
+# Model (loaded in the background at startup, torch is never imported at module level)
+model = ModelLoader(intra_op_threads=TORCH_NUM_THREADS, index_builder=build_label_index)
+
+executor = InferenceExecutor(
+    kind=INFERENCE_EXECUTOR,
+    workers=INFERENCE_WORKERS,
+    torch_threads=TORCH_NUM_THREADS,
+    pin_cpus=PIN_CPUS
+)
+
+# Micro-batching: images from concurrent requests share one forward pass
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+# Upload limits: per file, checked before anything is decoded (the whole body is capped by UploadLimit)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+TENSOR_MEDIA_TYPE = "application/octet-stream"  # body of /predict-disease/tensor
+
+# Bulk surveys are decoded + classified in windows of this many images
+SURVEY_WINDOW = int(os.getenv("SURVEY_WINDOW", "32"))
+SURVEY_IMAGE_BYTES = 4 * 1024 * 1024  # per survey image in a window (upload + decode), for admission
+
+# Admission control for inference requests: at most ADMISSION_MAX_CONCURRENT run at once, within a
+# memory budget; the rest wait in their lane (interactive before bulk). A full lane, or an interactive
+# wait over ADMISSION_MAX_WAIT_MS, is answered with 429 + Retry-After.
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "32")),
+    memory_budget_bytes=int(float(os.getenv("ADMISSION_MEMORY_BUDGET_MB", "512")) * 1024 * 1024),
+    max_queued={
+        "interactive": int(os.getenv("ADMISSION_MAX_QUEUED_INTERACTIVE", "64")),
+        "bulk": int(os.getenv("ADMISSION_MAX_QUEUED_BULK", "16")),
+    },
+    max_wait_s=float(os.getenv("ADMISSION_MAX_WAIT_MS", "2000")) / 1000,
+)
+
+# Asynchronous diagnosis jobs (results persisted to SQLite)
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+JOB_MAX_IMAGES = int(os.getenv("JOB_MAX_IMAGES", "10"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "72"))
+JOB_MAX_WAIT_SECONDS = 30.0
+JOB_PURGE_INTERVAL_SECONDS = float(os.getenv("JOB_PURGE_INTERVAL_SECONDS", "3600"))  # finished jobs past retention are deleted this often
+# serve.py recovers interrupted jobs once in the pre-fork master, so its workers must not
+JOB_RECOVER_ON_STARTUP = True
+
+# Whole-body limits of the multipart routes, enforced on Content-Length and while the body streams in,
+# before Starlette parses it and spools the files to disk. A survey may carry any number of images
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+SURVEY_MAX_UPLOAD_BYTES = int(os.getenv("SURVEY_MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+UPLOAD_BODY_LIMITS = {
+    "/predict-disease": 3 * MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/jobs": JOB_MAX_IMAGES * MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/survey": SURVEY_MAX_UPLOAD_BYTES,
+}
+
+
+class UploadLimit:
+    """ASGI middleware: 413 for a POST body over its route's limit, without receiving the rest of it"""
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        detail = f"Upload exceeds the {limit} byte limit of {scope['path']}"
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside request.form(); FastAPI re-raises HTTPExceptions from body parsing
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadLimit, limits=UPLOAD_BODY_LIMITS)
+
+# Per-request sampling profiles: with PROFILE_REQUESTS=true, a request sent with
+# "X-Profile: 1" is profiled and a folded-stack file (flame graph input) written to PROFILE_DIR
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "false").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "agro-profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+
+# /health and /metrics report process memory (from smaps_rollup) as re-read in the background this often
+MEMORY_REFRESH_SECONDS = float(os.getenv("MEMORY_REFRESH_SECONDS", "5"))
+
+# Real price history (built by ingest_prices.py); crops without history fall back to simulated prices
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_store"))
+price_history = PriceStore.open(PRICE_STORE_DIR)
+if price_history is not None:
+    logger.info("Price history store mapped", extra={
+        "path": PRICE_STORE_DIR, "rows": price_history.rows, "crops": len(price_history.crops),
+        "markets": len(price_history.markets), "last_date": price_history.meta["last_date"]
+    })
+
+# Market locations for nearest-market lookup (requests with lat/lng), ranked by price net of transport
+MARKET_LOCATIONS_PATH = os.getenv("MARKET_LOCATIONS_PATH", DEFAULT_LOCATIONS_PATH)
+TRANSPORT_COST_PER_QUINTAL_KM = float(os.getenv("TRANSPORT_COST_PER_QUINTAL_KM", "0.5"))
+market_locations = MarketIndex.load_csv(MARKET_LOCATIONS_PATH)
+if market_locations is not None:
+    logger.info("Market location index built", extra={"path": MARKET_LOCATIONS_PATH, "markets": len(market_locations)})
+
+# Batch market analysis limits (crops x locations pairs, forecast days)
+MARKET_BATCH_MAX_PAIRS = int(os.getenv("MARKET_BATCH_MAX_PAIRS", "500"))
+MARKET_MAX_HORIZON_DAYS = 90
+
+# Multi-view modes of /predict-disease (tiles / tta): views per image are capped by the
+# latency budget (ms of forward-pass time per request) and by TILE_MAX_VIEWS
+TILE_MAX_VIEWS = int(os.getenv("TILE_MAX_VIEWS", "16"))
+TILE_LATENCY_BUDGET_MS = float(os.getenv("TILE_LATENCY_BUDGET_MS", "250"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.25"))
+tile_budget = tiling.TileBudget(max_views=TILE_MAX_VIEWS)
+
+# Past scans (penultimate-layer embeddings, one index per model) for similar-case retrieval;
+# a scan at least DUPLICATE_SIMILARITY (cosine) close to a past case gets that case's diagnosis.
+# The index keeps the newest EMBEDDING_INDEX_MAX_ROWS cases (older ones are overwritten, about
+# 2.6 KB each on disk) and a diagnosis searches the newest EMBEDDING_SEARCH_ROWS of them (about
+# 2 ms per 1000 rows), so its cost is bounded however long the service runs.
+# EMBEDDING_INDEX_DIR="" disables the index.
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_index"))
+EMBEDDING_INDEX_MAX_ROWS = int(os.getenv("EMBEDDING_INDEX_MAX_ROWS", "100000"))
+EMBEDDING_SEARCH_ROWS = int(os.getenv("EMBEDDING_SEARCH_ROWS", "5000"))
+SIMILAR_CASES_K = int(os.getenv("SIMILAR_CASES_K", "5"))
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", "0.985"))
+
+# How per-image probability vectors are combined into one diagnosis
+AGGREGATION_STRATEGY = os.getenv("AGGREGATION_STRATEGY", "mean")
+
+# Per-image probability vectors keyed by upload hash (re-uploads / retries skip inference)
+prediction_cache = PredictionCache(
+    max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "3600")),
+    disk_dir=os.getenv("PREDICTION_CACHE_DIR") or None
+)
+
+
+# Model registry: the startup model plus crop-specialised models listed in MODEL_REGISTRY_PATH
+# (see model_registry.py), loaded on first use and evicted least-recently-used once their weights
+# exceed MODEL_RAM_BUDGET_MB. POST /models/{name}/swap (needs MODEL_ADMIN_TOKEN) hot-swaps a version.
+MODEL_REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models.json"))
+MODEL_RAM_BUDGET_MB = float(os.getenv("MODEL_RAM_BUDGET_MB", "1024"))
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+DEFAULT_MODEL_SPEC = ModelSpec(name="plantvillage", display_name=PRIMARY_MODEL_NAME)
+
+# Regional outbreak counters (see outbreaks.py): diagnoses sent with ?lat=&lng= are counted per geohash
+# cell, crop and disease in OUTBREAK_BUCKET_MINUTES buckets over the last OUTBREAK_WINDOW_DAYS, and
+# snapshotted to OUTBREAK_SNAPSHOT_DIR every OUTBREAK_SNAPSHOT_SECONDS (one file per worker process).
+# OUTBREAK_SNAPSHOT_DIR="" keeps them in memory only.
+OUTBREAK_SNAPSHOT_DIR = os.getenv("OUTBREAK_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "outbreaks"))
+OUTBREAK_BUCKET_MINUTES = int(os.getenv("OUTBREAK_BUCKET_MINUTES", "60"))
+OUTBREAK_WINDOW_DAYS = int(os.getenv("OUTBREAK_WINDOW_DAYS", "28"))
+OUTBREAK_GEOHASH_PRECISION = int(os.getenv("OUTBREAK_GEOHASH_PRECISION", "5"))
+OUTBREAK_SNAPSHOT_SECONDS = float(os.getenv("OUTBREAK_SNAPSHOT_SECONDS", "300"))
+OUTBREAK_MIN_CASES = int(os.getenv("OUTBREAK_MIN_CASES", "3"))
+OUTBREAK_LAYOUT = {
+    "bucket_seconds": OUTBREAK_BUCKET_MINUTES * 60,
+    "buckets": OUTBREAK_WINDOW_DAYS * 24 * 60 // OUTBREAK_BUCKET_MINUTES,
+    "precision": OUTBREAK_GEOHASH_PRECISION,
+}
+# Weather advisories (see weather.py / advisories.py): forecasts come from OpenWeather (OPENWEATHER_API_KEY)
+# or, with WEATHER_PROVIDER=file, from WEATHER_FILE_PATH, and are cached per geohash cell for
+# WEATHER_CACHE_TTL_MINUTES, with at most WEATHER_MAX_CONCURRENT_FETCHES upstream calls at once
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "openweather")
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
+WEATHER_FILE_PATH = os.getenv("WEATHER_FILE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "weather.json"))
+WEATHER_CACHE_TTL_MINUTES = float(os.getenv("WEATHER_CACHE_TTL_MINUTES", "30"))
+WEATHER_GEOHASH_PRECISION = int(os.getenv("WEATHER_GEOHASH_PRECISION", "5"))
+WEATHER_MAX_CONCURRENT_FETCHES = int(os.getenv("WEATHER_MAX_CONCURRENT_FETCHES", "8"))
+ADVISORY_BATCH_MAX_FARMS = int(os.getenv("ADVISORY_BATCH_MAX_FARMS", "20000"))
+
+
+def open_weather_provider():
+    if WEATHER_PROVIDER == "file":
+        try:
+            return FileWeatherProvider(WEATHER_FILE_PATH)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Weather file unreadable, advisories disabled", extra={"path": WEATHER_FILE_PATH, "error": str(e)})
+            return None
+    if WEATHER_PROVIDER != "openweather":
+        logger.warning("Unknown WEATHER_PROVIDER, advisories disabled", extra={"provider": WEATHER_PROVIDER})
+        return None
+    if not OPENWEATHER_API_KEY:
+        logger.warning("OPENWEATHER_API_KEY not set, advisories disabled")
+        return None
+    return OpenWeatherProvider(OPENWEATHER_API_KEY)
+
+
+weather_provider = open_weather_provider()
+weather_cache = WeatherCache(weather_provider, precision=WEATHER_GEOHASH_PRECISION, ttl_seconds=WEATHER_CACHE_TTL_MINUTES * 60,
+                             max_concurrent=WEATHER_MAX_CONCURRENT_FETCHES) if weather_provider is not None else None
+advisory_engine = AdvisoryEngine(DISEASE_DATABASE)
+
+WORKER_ID = 0  # set by serve.py in each worker process (names its outbreak snapshot)
+
+
+def observe_batch(size, seconds):
+    metrics.observe_batch(size, seconds)
+    tile_budget.observe(size, seconds)
+
+
+def make_batcher(classifier):
+    """Micro-batcher for one model version ((softmax, embedding) per image from one forward pass)"""
+    return MicroBatcher(
+        functools.partial(predict_batch, classifier) if INFERENCE_EXECUTOR == "thread" else predict_batch_in_worker,
+        executor,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        max_in_flight=INFERENCE_WORKERS,
+        on_batch=observe_batch
     )
-    MODEL_NAME = "PlantVillage MobileNet (38 classes)"
-    print(f"✅ Model loaded: {MODEL_NAME}")
-except Exception as e:
-    print(f"⚠️ Primary model failed: {e}")
+
+
+async def open_model(spec, loader=None):
+    """Load a model version (unless `loader` already holds it), then start its batcher and open its case index"""
+    if loader is None:
+        if INFERENCE_EXECUTOR != "thread":
+            raise RuntimeError("Loading models at runtime needs INFERENCE_EXECUTOR=thread (process workers hold the startup model)")
+        loader = ModelLoader(intra_op_threads=TORCH_NUM_THREADS, index_builder=build_label_index,
+                             model_id=spec.model_id, model_name=spec.display_name)
+        if not await asyncio.to_thread(loader.load):
+            raise RuntimeError(loader.error)
+    case_index = None
+    try:
+        case_index = await asyncio.to_thread(EmbeddingIndex.open, EMBEDDING_INDEX_DIR, loader.fingerprint,
+                                            EMBEDDING_INDEX_MAX_ROWS, EMBEDDING_SEARCH_ROWS)
+    except (OSError, ValueError) as e:
+        logger.warning("Embedding index unavailable, similar cases disabled", extra={"path": EMBEDDING_INDEX_DIR, "error": str(e)})
+    if case_index is not None:
+        logger.info("Embedding index opened", extra={"path": case_index.path, "cases": len(case_index)})
+    batcher = make_batcher(loader.classifier)
+    await batcher.start()
+    if loader is not model:
+        loader.mark_ready()
+    return ServedModel(spec, loader, batcher, case_index)
+
+
+async def close_model(served):
+    """Stop a retired model version once its last request is done (its weights are freed with it)"""
+    await served.batcher.stop()
+    if served.case_index is not None:
+        await asyncio.to_thread(served.case_index.close)
+    logger.info("Model closed", extra={"model": served.name, "version": served.version, "hits": served.hits})
+
+
+registry = ModelRegistry(load_specs(MODEL_REGISTRY_PATH), int(MODEL_RAM_BUDGET_MB * 1024 * 1024), open_model, close_model)
+
+
+async def load_model_in_background():
+    """Load + warm up the model off the event loop, then bring up the inference path"""
+    logger.info("Loading plant disease model in the background")
+    if not await asyncio.to_thread(model.load):
+        return
     try:
-        classifier = pipeline("image-classification", model="google/vit-base-patch16-224", device=-1)
-        MODEL_NAME = "Google ViT Base"
-        print(f"✅ Fallback: {MODEL_NAME}")
-    except Exception as e2:
-        print(f"❌ All models failed: {e2}")
+        executor.start()
+        await executor.warm_up()
+        registry.set_default(await open_model(DEFAULT_MODEL_SPEC, loader=model))
+    except Exception as e:
+        model.mark_failed(e)
+        return
+    logger.info("Inference path up", extra={
+        "executor": INFERENCE_EXECUTOR, "workers": INFERENCE_WORKERS,
+        "batch_max_size": BATCH_MAX_SIZE, "batch_max_wait_ms": BATCH_MAX_WAIT_MS
+    })
+    model.mark_ready()
+
+
+_model_loading_task = None
+job_queue: Optional[JobQueue] = None
+outbreaks = OutbreakCounters(**OUTBREAK_LAYOUT)
+outbreak_peers: Optional[PeerSnapshots] = None
+_outbreak_snapshot_task = None
+_process_memory = None
+_memory_refresh_task = None
+
+
+def outbreak_snapshot_path():
+    return os.path.join(OUTBREAK_SNAPSHOT_DIR, f"counts-{WORKER_ID}.npz")
+
+
+def open_outbreak_counters():
+    """This worker's counters from its last snapshot, and the other workers' snapshots"""
+    os.makedirs(OUTBREAK_SNAPSHOT_DIR, exist_ok=True)
+    path = outbreak_snapshot_path()
+    counters = OutbreakCounters.load(path, **OUTBREAK_LAYOUT)
+    logger.info("Outbreak counters restored", extra={"path": path, "rows": len(counters.keys), "scans": counters.recorded})
+    return counters, PeerSnapshots(os.path.join(OUTBREAK_SNAPSHOT_DIR, "counts-*.npz"), path, **OUTBREAK_LAYOUT)
+
+
+async def save_outbreak_counters():
+    # Copied on the event loop (where the counters change), written off it
+    try:
+        await asyncio.to_thread(save_snapshot, outbreak_snapshot_path(), outbreaks.snapshot())
+    except OSError as e:
+        logger.warning("Outbreak snapshot failed", extra={"path": outbreak_snapshot_path(), "error": str(e)})
+
+
+async def snapshot_outbreaks_periodically():
+    while True:
+        await asyncio.sleep(OUTBREAK_SNAPSHOT_SECONDS)
+        await save_outbreak_counters()
+
+
+async def refresh_process_memory_periodically():
+    # Parsing smaps_rollup walks every mapping; kept off the event loop and out of /health
+    global _process_memory
+    while True:
+        _process_memory = await asyncio.to_thread(process_memory)
+        await asyncio.sleep(MEMORY_REFRESH_SECONDS)
+
+
+def record_outbreak(result, lat, lng):
+    """Count a located diagnosis (re-scans of a plant already diagnosed are not counted again)"""
+    if lat is None or lng is None or result.tail["duplicate_of"] is not None:
+        return
+    outbreaks.record(lat, lng, result.head["plant"], result.head["disease"])
+
+metrics.REGISTRY.register(metrics.ServiceCollector(model, prediction_cache, {
+    "batcher": lambda: sum(served.batcher.queue_depth for served in registry.resident),
+    "executor": lambda: executor.queue_depth,
+    "jobs": lambda: job_queue.queued if job_queue is not None else 0,
+    **{f"admission_{lane}": (lambda lane=lane: admission.queued(lane)) for lane in LANES},
+}, memory=lambda: _process_memory, admission=admission))
+
+
+async def run_diagnosis_job(payload):
+    """Job worker body: same pipeline as /predict-disease, behind interactive scans"""
+    uploads, strategy, model_name = payload
+    preprocessor = model.classifier.preprocessor
+    cost = sum(len(contents) + preprocessor.decoded_bytes(io.BytesIO(contents)) for contents in uploads)
+    ticket = await admit(cost, "bulk", reject=False)
+    timings = {"queue": ticket.waited_s * 1000}
+    try:
+        async with registry.acquire(model_name) as served:
+            result = await diagnose(served, uploads, strategy, timings, priority=PRIORITY_BULK)
+    finally:
+        admission.release(ticket)
+    metrics.observe_stages("/jobs", timings)
+    return result.as_dict()
+
+
+@app.on_event("startup")
+async def start_inference():
+    global _model_loading_task, job_queue, outbreaks, outbreak_peers, _outbreak_snapshot_task, _memory_refresh_task
+    _model_loading_task = asyncio.create_task(load_model_in_background())
+    _memory_refresh_task = asyncio.create_task(refresh_process_memory_periodically())
+
+    if OUTBREAK_SNAPSHOT_DIR:
+        outbreaks, outbreak_peers = await asyncio.to_thread(open_outbreak_counters)
+        _outbreak_snapshot_task = asyncio.create_task(snapshot_outbreaks_periodically())
+
+    store = await asyncio.to_thread(JobStore, JOB_DB_PATH)
+    if JOB_RECOVER_ON_STARTUP:
+        await asyncio.to_thread(store.recover, JOB_RETENTION_HOURS * 3600)
+    job_queue = JobQueue(store, run_diagnosis_job, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED,
+                         retention_seconds=JOB_RETENTION_HOURS * 3600, purge_interval=JOB_PURGE_INTERVAL_SECONDS)
+    await job_queue.start()
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Request latency + in-flight metrics, and the opt-in per-request sampling profiler"""
+    route = metrics.route_template(request)
+    profiler = None
+    if PROFILE_REQUESTS and request.headers.get("x-profile", "").lower() in ("1", "true", "yes"):
+        profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000).start()
+
+    in_flight = metrics.REQUESTS_IN_FLIGHT.labels(route)
+    in_flight.inc()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        in_flight.dec()
+        metrics.REQUEST_SECONDS.labels(request.method, route, str(status)).observe(time.perf_counter() - t0)
+        if profiler is not None:
+            profiler.stop()
+
+    if profiler is not None:
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(t0 * 1000) % 1000:03d}-{route.strip('/').replace('/', '_') or 'root'}.folded"
+        path = await asyncio.to_thread(profiler.write, os.path.join(PROFILE_DIR, name))
+        response.headers["X-Profile-File"] = path
+        logger.info("Request profile written", extra={"route": route, "path": path, "samples": profiler.sample_count})
+    return response
+
+
+@app.on_event("shutdown")
+async def stop_inference():
+    if job_queue is not None:
+        await job_queue.stop()
+        job_queue.store.close()
+    await registry.close()
+    executor.shutdown()
+    if _memory_refresh_task is not None:
+        _memory_refresh_task.cancel()
+    if _outbreak_snapshot_task is not None:
+        _outbreak_snapshot_task.cancel()
+        await save_outbreak_counters()
 
 # Pydantic Models
 class Prediction(BaseModel):
@@ -240,6 +693,22 @@ class TreatmentPlan(BaseModel):
     action: str
     days_later: int
 
+class ViewSummary(BaseModel):
+    image: int
+    mode: str
+    views: int
+    rows: Optional[int] = None
+    cols: Optional[int] = None
+    heatmap: Optional[List[List[float]]] = None  # tiles mode: probability of disease per tile, row-major
+
+class SimilarCase(BaseModel):
+    case_id: int
+    similarity: float
+    plant: str
+    disease: str
+    confidence: float
+    diagnosed_at: str
+
 class DiagnosisResponse(BaseModel):
     success: bool
     plant: str
@@ -254,15 +723,38 @@ class DiagnosisResponse(BaseModel):
     treatment_plan: List[TreatmentPlan] = []
     top5_predictions: List[Prediction]
     model: str
+    views: Optional[List[ViewSummary]] = None
+    similar_cases: Optional[List[SimilarCase]] = None
+    duplicate_of: Optional[int] = None  # past case whose diagnosis was returned (near-duplicate scan)
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: str
+    priority: str
+    status_url: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    priority: str
+    image_count: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[DiagnosisResponse] = None
+    error: Optional[str] = None
 
 class MarketRequest(BaseModel):
     crop: str = "wheat"
     location: str = "India"
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lng: Optional[float] = Field(None, ge=-180, le=180)
 
 class MarketPrice(BaseModel):
     market_name: str
     price: int
-    distance_km: int
+    distance_km: Optional[int] = None
+    net_price: Optional[int] = None
 
 class MarketResponse(BaseModel):
     crop: str
@@ -274,63 +766,88 @@ class MarketResponse(BaseModel):
     forecast: List[dict]
     nearby_markets: List[MarketPrice] = []
     last_updated: str
+    data_source: str = "simulated"
+
+class MarketBatchRequest(BaseModel):
+    crops: List[str] = ["wheat"]
+    locations: List[str] = ["India"]
+    horizons: List[int] = [7]
+    seed: Optional[int] = None
+
+class MarketHorizon(BaseModel):
+    days: int
+    predicted_price: int
+    change_pct: float
+
+class MarketBatchItem(BaseModel):
+    crop: str
+    location: str
+    current_price: int
+    unit: str
+    trend: str
+    trend_description: str
+    forecast: List[dict]
+    horizons: List[MarketHorizon]
+    nearby_markets: List[MarketPrice] = []
+    data_source: str = "simulated"
+    last_updated: Optional[str] = None  # date of the latest price, for price_history results
+
+class MarketBatchResponse(BaseModel):
+    seed: int
+    horizons: List[int]
+    results: List[MarketBatchItem]
+    last_updated: str
+
+class CacheStats(BaseModel):
+    enabled: bool
+    entries: int
+    hits: int
+    misses: int
+    evictions: int
+    disk_tier: bool
+
+class LoadedModel(BaseModel):
+    name: str
+    model: str
+    version: Optional[str] = None
+    fingerprint: Optional[str] = None
+    backend: str
+    crops: List[str] = []
+    size_mb: float
+    hits: int
+    in_flight: int
+    loaded_at: float
 
 class HealthResponse(BaseModel):
     status: str
     ml_model: str
     is_model_loaded: bool
     disease_classes: int
-
-def parse_disease_label(label):
-    """Parse PlantVillage format label (Plant___Disease) or fallback formats"""
-    # 1. Standard PlantVillage format
-    if "___" in label:
-        plant_raw, disease_raw = label.split("___")
-        plant = plant_raw.replace("_", " ").replace("(", "").replace(")", "").strip()
-        disease = disease_raw.replace("_", " ").replace("(", "").replace(")", "").strip()
-        if disease.lower() == "healthy":
-            return plant, "Healthy"
-        return plant, disease.title()
-
-    # 2. Fallback: Check if label starts with a known plant name
-    # Common plants in our DB
-    KNOWN_PLANTS = ["Apple", "Blueberry", "Cherry", "Corn", "Grape", "Orange", "Peach", "Pepper", "Potato", "Raspberry", "Rice", "Soybean", "Squash", "Strawberry", "Tomato", "Wheat"]
-    
-    clean_label = label.replace("_", " ").strip()
-    
-    for plant in KNOWN_PLANTS:
-        if clean_label.lower().startswith(plant.lower()):
-            # Extract logic: "Strawberry with Leaf Scorch" -> Plant: Strawberry, Disease: Leaf Scorch
-            disease_part = clean_label[len(plant):].strip()
-            
-            # Remove connecting words like "with", "leaf", "disease" if they start the string
-            # (Simple heuristic)
-            if disease_part.lower().startswith("with "):
-                disease_part = disease_part[5:].strip()
-            
-            if not disease_part:
-                return plant, "Healthy" if "healthy" in label.lower() else "Unknown Issue"
-                
-            return plant, disease_part.title()
-
-    return "Unknown", label.title()
+    live: bool = True
+    ready: bool = False
+    model_status: str = "not_started"
+    model_error: Optional[str] = None
+    model_load_timings: Dict[str, float] = {}
+    inference_backend: str = "torch"
+    inference_executor: str = "thread"
+    inference_queue_depth: int = 0
+    prediction_cache: Optional[CacheStats] = None
+    admission: Optional[dict] = None
+    models: List[LoadedModel] = []  # resident registry models, least recently used first
+    model_registry: Optional[dict] = None
+    weather_cache: Optional[dict] = None
+    worker_pid: int = 0
+    process_memory_mb: Optional[Dict[str, float]] = None  # rss, pss, shared (e.g. pre-forked weights), unique
 
 def get_disease_info(disease_name):
-    """Get disease details with debug logging"""
-    disease_key = disease_name.lower().replace(" ", "_").replace("-", "_")
-    print(f"🔍 DEBUG: Lookup '{disease_name}' -> key '{disease_key}'")
-    
-    # Direct match first (faster/safer)
-    if disease_key in DISEASE_DATABASE:
-        print(f"✅ Exact match found for '{disease_key}'")
+    """
+    Get disease details for a free-text disease name (exact key, then longest phrase match).
+    Predictions don't call this: they use the label index built when the model loads.
+    """
+    disease_key = disease_matcher.match(disease_name)
+    if disease_key is not None:
         return DISEASE_DATABASE[disease_key]
 
-    for key in DISEASE_DATABASE:
-        if key in disease_key or disease_key in key:
-            print(f"✅ Partial match found: '{key}' matching '{disease_key}'")
-            return DISEASE_DATABASE[key]
-            
-    print(f"❌ NO MATCH found for '{disease_key}'. Using fallback.")
     return {
         "description": f"Disease: {disease_name}. Consult an expert.",
         "symptoms": ["Visible plant stress"],
@@ -341,135 +858,630 @@ def get_disease_info(disease_name):
     }
 
 
+async def read_upload(file: UploadFile, max_bytes: Optional[int] = None) -> bytes:
+    """Read an upload in chunks, rejecting it as soon as it exceeds max_bytes (per file; UploadLimit caps the body)"""
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    chunks, size = [], 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"'{file.filename}' exceeds the upload limit of {max_bytes} bytes")
+        chunks.append(chunk)
+
+
+def view_bytes():
+    """Memory of one model input: the uint8 array plus its float32 normalized copy"""
+    height, width = model.classifier.preprocessor.output_size
+    return height * width * 3 * (1 + 4)
+
+
+def request_cost(files, views=1):
+    """Estimated peak memory of a diagnosis: uploads + decoded images (from their headers) + model inputs"""
+    preprocessor = model.classifier.preprocessor
+    return sum((f.size or 0) + preprocessor.decoded_bytes(f.file) + views * view_bytes() for f in files)
+
+
+async def admit(cost, lane, reject=True):
+    """Admission ticket (release it when done), or 429 + Retry-After when saturated"""
+    try:
+        ticket = await admission.acquire(cost, lane, reject=reject)
+    except Rejected as e:
+        metrics.ADMISSION_REJECTED.labels(e.lane, e.reason).inc()
+        raise HTTPException(status_code=429, detail=f"Server busy ({e}), retry later",
+                            headers={"Retry-After": str(e.retry_after)})
+    metrics.ADMISSION_WAIT_SECONDS.labels(lane).observe(ticket.waited_s)
+    return ticket
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Streams like StreamingResponse and releases what the request holds (admission ticket, model) however the stream ends"""
+
+    def __init__(self, content, held: contextlib.AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.held = held
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.held.aclose()
+
+
+def route_model(model_name, crop):
+    """Registry model for a request (?model= or ?crop=), 404 for an unknown model"""
+    try:
+        return registry.route(model_name, crop)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{model_name}'; available: {', '.join(sorted(registry.specs))}")
+
+
+def ensure_model_ready():
+    if not model.ready:
+        detail = "Model failed to load" if model.status == "failed" else "Model is still loading"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+
+def diagnosis_status(disease_name, confidence):
+    return "Healthy" if "healthy" in disease_name.lower() else (
+        "Disease Detected" if confidence > 50 else "Analysis Complete"
+    )
+
+
+def server_timing(timings):
+    """Format {stage: ms} as a Server-Timing header value"""
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
+
+
+def resolve_strategy(aggregation):
+    strategy = aggregation or AGGREGATION_STRATEGY
+    if strategy not in AGGREGATION_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"aggregation must be one of {', '.join(AGGREGATION_STRATEGIES)}")
+    return strategy
+
+
+def match_past_cases(served, keys, probs, embeddings):
+    """
+    Look up every image in the case index, then add the new ones (runs off the event loop).
+    Images without a fresh embedding (prediction cache hits) use their stored one, if any.
+    Returns ([(row, similarity, case)] most similar first, {image: (row, stored probs) of its near-duplicate}).
+    """
+    case_index = served.case_index
+    queries = []
+    for i, (key, embedding) in enumerate(zip(keys, embeddings)):
+        if embedding is None:
+            embedding = case_index.embedding_for(key)
+        if embedding is not None:
+            queries.append((i, embedding))
+    if not queries:
+        return [], {}
+
+    hits = case_index.search(np.stack([e for _, e in queries]), SIMILAR_CASES_K)
+    duplicates, best = {}, {}
+    for (i, embedding), matches in zip(queries, hits):
+        stored = None
+        if matches and matches[0][1] >= DUPLICATE_SIMILARITY:
+            stored = case_index.probs_for(matches[0][0], matches[0][2]["key"])
+        if stored is not None:
+            duplicates[i] = (matches[0][0], stored)
+        elif embeddings[i] is not None and case_index.row_for_key(keys[i]) is None:
+            entry = served.index[int(np.argmax(probs[i]))]
+            case_index.add(keys[i], embedding, probs[i], plant=entry.plant, disease=entry.disease,
+                           confidence=round(float(probs[i].max()) * 100, 2))
+        for row, similarity, case in matches:
+            if similarity > best.get(row, (-1.0, None))[0]:
+                best[row] = (similarity, case)
+    similar = sorted(((row, similarity, case) for row, (similarity, case) in best.items()), key=lambda item: -item[1])
+    return similar[:SIMILAR_CASES_K], duplicates
+
+
+async def diagnose(served, uploads, strategy, timings, priority=PRIORITY_INTERACTIVE, mode="standard", views=1, decoded=False):
+    """
+    Aggregated diagnosis by the `served` model version for the raw bytes of one or more images of the same plant
+    (decoded=True: uint8 model-input arrays the client already resized, standard mode).
+    In tiles / tta mode each image is cut into up to `views` views; all views of
+    all images share one forward pass and are combined into one vector per image.
+    Standard-mode scans are matched against past cases (similar_cases); a single
+    image that nearly duplicates a past scan gets that scan's stored diagnosis.
+    Stage timings (ms) are accumulated into `timings`. Returns a Diagnosis
+    (encodes straight to DiagnosisResponse JSON, see response_encoding.py).
+    """
+    # 1. Analyze all images in a single forward pass (shared with concurrent requests);
+    #    images seen before (in the same mode) are served from the prediction cache
+    version = served.version if mode == "standard" else f"{served.version}|{mode}:{views}"
+    keys = [PredictionCache.make_key(contents, served.model_name, version) for contents in uploads]
+    probs = [None] * len(uploads)
+    embeddings = [None] * len(uploads)
+    misses = []
+    for i, (key, contents) in enumerate(zip(keys, uploads)):
+        probs[i] = prediction_cache.get(key)
+        if probs[i] is None:
+            misses.append((i, key, contents))
+
+    if misses:
+        # Decode + resize (+ cut views) to model-sized uint8 arrays in parallel on the executor
+        preprocessor = served.classifier.preprocessor
+        if decoded:
+            loaded = [([array], None, {"decode": 0.0, "resize": 0.0}) for _, _, array in misses]
+        else:
+            if mode == "tiles":
+                calls = [executor.run(tiling.load_tiles, preprocessor, contents, views, TILE_OVERLAP) for _, _, contents in misses]
+            elif mode == "tta":
+                calls = [executor.run(tiling.load_tta, preprocessor, contents, views) for _, _, contents in misses]
+            else:
+                calls = [executor.run(preprocessor.load, contents) for _, _, contents in misses]
+            loaded = await asyncio.gather(*calls)
+            if mode == "standard":
+                loaded = [([array], None, stage_ms) for array, stage_ms in loaded]
+        for _, _, stage_ms in loaded:
+            timings["decode"] = timings.get("decode", 0.0) + stage_ms["decode"]
+            timings["resize"] = timings.get("resize", 0.0) + stage_ms["resize"]
+
+        t0 = time.perf_counter()
+        results = await served.batcher.submit_many([array for arrays, _, _ in loaded for array in arrays], priority)
+        timings["infer"] = (time.perf_counter() - t0) * 1000
+        start = 0
+        for (i, key, _), (arrays, grid, _) in zip(misses, loaded):
+            p = np.stack([probs_row for probs_row, _ in results[start:start + len(arrays)]])
+            embeddings[i] = results[start][1]
+            start += len(arrays)
+            # standard: (n_classes,); tiles: (rows, cols, n_classes); tta: (n_views, n_classes)
+            p = p[0] if mode == "standard" else p.reshape(*grid, -1) if grid else p
+            prediction_cache.put(key, p)
+            probs[i] = p
+
+    summaries = None
+    if mode != "standard":
+        summaries = []
+        for i, p in enumerate(probs):
+            if p.ndim == 3:
+                summaries.append({"image": i, "mode": mode, "views": p.shape[0] * p.shape[1], "rows": p.shape[0], "cols": p.shape[1],
+                                  "heatmap": tiling.lesion_heatmap(p, served.index.healthy_ids).tolist()})
+            else:
+                summaries.append({"image": i, "mode": mode, "views": p.shape[0], "rows": None, "cols": None, "heatmap": None})
+        probs = [tiling.combine_views(p, mode) for p in probs]
+
+    # 2. Past cases (standard mode): near-duplicates of a past scan take its stored probability vector
+    similar, duplicate_of = None, None
+    case_index = served.case_index
+    if mode == "standard" and case_index is not None:
+        t0 = time.perf_counter()
+        matches, duplicates = await asyncio.to_thread(match_past_cases, served, keys, probs, embeddings)
+        for i, (_, stored) in duplicates.items():
+            probs[i] = stored
+        if len(uploads) == 1 and 0 in duplicates:
+            duplicate_of = duplicates[0][0]
+        similar = [{"case_id": row, "similarity": round(similarity, 4), **{
+            field: case[field] for field in ("plant", "disease", "confidence", "diagnosed_at")
+        }} for row, similarity, case in matches]
+        timings["similar"] = (time.perf_counter() - t0) * 1000
+
+    # 3. Aggregation Logic: combine the full probability vectors of all images
+    #    (a near-duplicate single scan is served as stored, nothing to combine)
+    t0 = time.perf_counter()
+    scores = probs[0] if duplicate_of is not None else aggregate_probabilities(np.stack(probs), strategy)
+    ranked = top_k(scores, 5)
+    timings["aggregate"] = (time.perf_counter() - t0) * 1000
+
+    # 4. Best class of the aggregated vector (plant / disease / info precomputed at model load)
+    best = served.index[ranked[0]]
+    avg_confidence = float(scores[ranked[0]]) * 100
+    
+    status = diagnosis_status(best.disease, avg_confidence)
+    
+    # 5. Top 5 for the final aggregated result
+    top5 = []
+    for i, idx in enumerate(ranked):
+        entry = served.index[idx]
+        top5.append({"rank": i + 1, "plant": entry.plant, "disease": entry.disease, "confidence": round(float(scores[idx]) * 100, 2)})
+    
+    # Shaped like DiagnosisResponse; the disease info goes in as its pre-encoded JSON fragment
+    return Diagnosis(
+        head={
+            "success": True,
+            "plant": best.plant,
+            "disease": best.disease,
+            "confidence": round(avg_confidence, 2),
+            "status": status,
+        },
+        info=best.info,
+        tail={
+            "top5_predictions": top5,
+            "model": served.model_name,
+            "views": summaries,
+            "similar_cases": similar,
+            "duplicate_of": duplicate_of,
+        },
+    )
+
+
 @app.post("/predict-disease", response_model=DiagnosisResponse, tags=["Disease Detection"])
-async def predict_disease(files: List[UploadFile] = File(..., description="List of plant leaf images (JPG/PNG)")):
+async def predict_disease(
+    files: List[UploadFile] = File(..., description="List of plant leaf images (JPG/PNG)"),
+    aggregation: Optional[str] = Query(None, description="How to combine images: mean, max or geometric"),
+    mode: str = Query("standard", description="standard, tiles (overlapping tiles + lesion heat map, for whole-plant photos) or tta (shifted / mirrored crops)"),
+    latency_budget_ms: Optional[float] = Query(None, gt=0, description=f"tiles / tta: forward-pass time to spend on views (default {TILE_LATENCY_BUDGET_MS:g} ms)"),
+    priority: str = Query("interactive", description="Admission lane: interactive (scans from the app) or bulk (scripts, batch uploads)"),
+    model_name: Optional[str] = Query(None, alias="model", description="Registry model to use (default: chosen by crop)"),
+    crop: Optional[str] = Query(None, description="Crop in the photo; routes to a crop-specialised model when one is registered"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Where the photo was taken (counted in /outbreaks)"),
+    lng: Optional[float] = Query(None, ge=-180, le=180, description="Where the photo was taken (counted in /outbreaks)")
+):
     """
     Upload multiple plant leaf images (max 3) for enhanced disease detection.
-    Returns aggregated diagnosis based on majority vote or confidence averaging.
+    All images run through the model in one batch; their full probability
+    vectors are combined (mean / max / geometric mean) into one diagnosis.
+    In tiles / tta mode each image is analysed as several views (as many as
+    the latency budget allows), combined into one vector per image first.
+    When the service is saturated the request is rejected with 429 and a
+    Retry-After header; time spent waiting for admission is the "queue" stage.
+    ?crop= routes to a crop-specialised model when one is registered.
+    With ?lat=&lng= the diagnosis is counted in the regional outbreak counters.
     """
-    if classifier is None:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    ensure_model_ready()
+    name = route_model(model_name, crop)
     
     if len(files) > 3:
         raise HTTPException(status_code=400, detail="Maximum 3 images allowed")
-    
-    all_predictions = []
-    
+
+    strategy = resolve_strategy(aggregation)
+    if mode not in tiling.MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(tiling.MODES)}")
+    views = tile_budget.views_for(latency_budget_ms or TILE_LATENCY_BUDGET_MS, len(files)) if mode != "standard" else 1
+    if priority not in LANES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(LANES)}")
+
+    ticket = await admit(request_cost(files, views), priority)
+
+    # Per-stage wall time in ms, returned in the Server-Timing header and recorded in /metrics;
+    # "queue" is the admission wait, the other stages are service time
+    timings = {"queue": ticket.waited_s * 1000, "read": 0.0, "decode": 0.0, "resize": 0.0, "infer": 0.0, "aggregate": 0.0, "serialize": 0.0}
+
     try:
-        # 1. Analyze each image
-        for file in files:
-            contents = await file.read()
-            image = Image.open(io.BytesIO(contents)).convert('RGB')
-            results = classifier(image, top_k=3)
-            all_predictions.append(results)
-            
-        # 2. Aggregation Logic
-        # We will sum the scores for each class across all images
-        class_scores = {}
-        
-        for preds in all_predictions:
-            for p in preds:
-                label = p['label']
-                score = p['score']
-                if label not in class_scores:
-                    class_scores[label] = 0.0
-                class_scores[label] += score
-                
-        # 3. Find highest score average
-        best_label = max(class_scores, key=class_scores.get)
-        avg_confidence = (class_scores[best_label] / len(files)) * 100
-        
-        # 4. Parse Final Result
-        plant_name, disease_name = parse_disease_label(best_label)
-        disease_info = get_disease_info(disease_name)
-        
-        status = "Healthy" if "healthy" in disease_name.lower() else (
-            "Disease Detected" if avg_confidence > 50 else "Analysis Complete"
-        )
-        
-        # 5. Top 5 for the final aggregated result (based on summed scores)
-        sorted_labels = sorted(class_scores.items(), key=lambda x: x[1], reverse=True)[:5]
-        top5 = []
-        for i, (label, score) in enumerate(sorted_labels):
-            p, d = parse_disease_label(label)
-            # Normalize score by dividing by num files
-            top5.append(Prediction(rank=i+1, plant=p, disease=d, confidence=round((score/len(files))*100, 2)))
-        
-        return DiagnosisResponse(
-            success=True,
-            plant=plant_name,
-            disease=disease_name,
-            confidence=round(avg_confidence, 2),
-            status=status,
-            severity=disease_info["severity"],
-            description=disease_info["description"],
-            symptoms=disease_info["symptoms"],
-            precautions=disease_info["precautions"],
-            recommendations=disease_info["recommendations"],
-            treatment_plan=disease_info.get("treatment_plan", []),
-            top5_predictions=top5,
-            model=MODEL_NAME
-        )
-            
+        t0 = time.perf_counter()
+        uploads = [await read_upload(file) for file in files]
+        timings["read"] = (time.perf_counter() - t0) * 1000
+
+        async with registry.acquire(name) as served:
+            result = await diagnose(served, uploads, strategy, timings, mode=mode, views=views)
+        record_outbreak(result, lat, lng)
+
+        # Serialize here (not in FastAPI) so the cost shows up as its own stage
+        t0 = time.perf_counter()
+        body = result.json()
+        timings["serialize"] = (time.perf_counter() - t0) * 1000
+        metrics.observe_stages("/predict-disease", timings)
+        return Response(content=body, media_type="application/json", headers={"Server-Timing": server_timing(timings)})
+
+    except HTTPException:
+        raise
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except ImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error: {e}")
+        logger.exception("Disease prediction failed")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission.release(ticket)
+
+
+@app.post(
+    "/predict-disease/tensor",
+    response_model=DiagnosisResponse,
+    tags=["Disease Detection"],
+    openapi_extra={"requestBody": {"required": True, "content": {TENSOR_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}}}},
+)
+async def predict_disease_tensor(
+    request: Request,
+    aggregation: Optional[str] = Query(None, description="How to combine images: mean, max or geometric"),
+    priority: str = Query("interactive", description="Admission lane: interactive (scans from the app) or bulk (scripts, batch uploads)"),
+    model_name: Optional[str] = Query(None, alias="model", description="Registry model to use (default: chosen by crop)"),
+    crop: Optional[str] = Query(None, description="Crop in the photo; routes to a crop-specialised model when one is registered"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Where the photo was taken (counted in /outbreaks)"),
+    lng: Optional[float] = Query(None, ge=-180, le=180, description="Where the photo was taken (counted in /outbreaks)")
+):
+    """
+    Same diagnosis as /predict-disease for 1-3 images the client already resized
+    and center-cropped to the model input (224x224 RGB), sent as one raw body:
+    a 12-byte header (magic "AGT1", count u16, height u16, width u16, channels u8,
+    dtype u8 = 0, little-endian) followed by the uint8 pixels, image after image.
+    About 150 KB per image, and the server skips decoding and resizing entirely.
+    """
+    ensure_model_ready()
+    name = route_model(model_name, crop)
+    strategy = resolve_strategy(aggregation)
+    if priority not in LANES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(LANES)}")
+    height, width = model.classifier.preprocessor.output_size
+    max_bytes = TENSOR_HEADER.size + 3 * height * width * 3
+    length = int(request.headers.get("content-length") or max_bytes)
+    if length > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Tensor upload exceeds {max_bytes} bytes (3 images)")
+
+    # Queued requests hold no body yet; once admitted: the body + the float32 batch
+    ticket = await admit(length * 5, priority)
+    timings = {"queue": ticket.waited_s * 1000, "read": 0.0, "decode": 0.0, "resize": 0.0, "infer": 0.0, "aggregate": 0.0, "serialize": 0.0}
+
+    try:
+        t0 = time.perf_counter()
+        body = bytearray()
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Tensor upload exceeds {max_bytes} bytes (3 images)")
+        timings["read"] = (time.perf_counter() - t0) * 1000
+
+        async with registry.acquire(name) as served:
+            # Header check + zero-copy (N, H, W, 3) view of the body; the batcher normalizes it directly
+            t0 = time.perf_counter()
+            batch = served.classifier.preprocessor.unpack_tensors(body, max_count=3)
+            timings["decode"] = (time.perf_counter() - t0) * 1000
+
+            result = await diagnose(served, list(batch), strategy, timings, decoded=True)
+        record_outbreak(result, lat, lng)
+
+        t0 = time.perf_counter()
+        body = result.json()
+        timings["serialize"] = (time.perf_counter() - t0) * 1000
+        metrics.observe_stages("/predict-disease/tensor", timings)
+        return Response(content=body, media_type="application/json", headers={"Server-Timing": server_timing(timings)})
+
+    except HTTPException:
+        raise
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except ImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Tensor prediction failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission.release(ticket)
+
+
+@app.post("/jobs", response_model=JobSubmitted, status_code=202, tags=["Disease Detection"])
+async def submit_diagnosis_job(
+    files: List[UploadFile] = File(..., description="Plant leaf images (JPG/PNG)"),
+    aggregation: Optional[str] = Query(None, description="How to combine images: mean, max or geometric"),
+    priority: str = Query("normal", description="Job priority: high, normal or low"),
+    model_name: Optional[str] = Query(None, alias="model", description="Registry model to use (default: chosen by crop)"),
+    crop: Optional[str] = Query(None, description="Crop in the photo; routes to a crop-specialised model when one is registered")
+):
+    """
+    Submit a diagnosis as a background job and get a job ID immediately.
+    Poll (or long-poll with ?wait=) GET /jobs/{job_id} for the result.
+    """
+    ensure_model_ready()
+    name = route_model(model_name, crop)
+    if len(files) > JOB_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Maximum {JOB_MAX_IMAGES} images per job")
+    if priority not in JOB_PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(JOB_PRIORITIES)}")
+    strategy = resolve_strategy(aggregation)
+    if job_queue.full:
+        raise HTTPException(status_code=503, detail="Job queue is full", headers={"Retry-After": "30"})
+
+    uploads = [await read_upload(file) for file in files]
+    job_id = await job_queue.submit((uploads, strategy, name), len(uploads), priority)
+    return JobSubmitted(job_id=job_id, status="queued", priority=priority, status_url=f"/jobs/{job_id}")
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus, tags=["Disease Detection"])
+async def get_diagnosis_job(
+    job_id: str,
+    wait: float = Query(0.0, ge=0.0, description=f"Long-poll: seconds to wait for completion (max {JOB_MAX_WAIT_SECONDS:g})")
+):
+    """Status of a diagnosis job, with the DiagnosisResponse once it is done."""
+    job = await job_queue.get(job_id, wait=min(wait, JOB_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatus(job_id=job.pop("id"), **job)
+
+
+def describe_probabilities(index, probs):
+    """Top-1 diagnosis of a single image's probability vector (`index`: the model's label index)"""
+    idx = int(np.argmax(probs))
+    confidence = float(probs[idx]) * 100
+    entry = index[idx]
+    return {
+        "plant": entry.plant,
+        "disease": entry.disease,
+        "confidence": round(confidence, 2),
+        "status": diagnosis_status(entry.disease, confidence),
+        "severity": entry.info.severity,
+    }
+
+
+@app.post("/survey", tags=["Disease Detection"])
+async def field_survey(
+    files: List[UploadFile] = File(..., description="Leaf images and/or ZIP archives (one folder per crop)"),
+    model_name: Optional[str] = Query(None, alias="model", description="Registry model to use (default: chosen by crop)"),
+    crop: Optional[str] = Query(None, description="Crop surveyed; routes to a crop-specialised model when one is registered")
+):
+    """
+    Bulk field survey: upload any number of images, or ZIP archives with one
+    folder per crop. Results stream back as NDJSON, one line per image as soon
+    as it is classified, then a final per-folder summary line.
+    """
+    ensure_model_ready()
+    name = route_model(model_name, crop)
+    held = contextlib.AsyncExitStack()
+    # Two windows are in flight at once (one classifying, one loading)
+    ticket = await admit(2 * SURVEY_WINDOW * (SURVEY_IMAGE_BYTES + view_bytes()), "bulk")
+    held.callback(admission.release, ticket)
+    try:
+        served = await held.enter_async_context(registry.acquire(name))
+    except ModelUnavailable as e:
+        await held.aclose()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    preprocessor = served.classifier.preprocessor
+    items = iter_survey_files([(f.filename, f.file) for f in files], MAX_UPLOAD_BYTES)
+
+    async def load_image(contents):
+        array, _ = await executor.run(preprocessor.load, contents)
+        return array
+
+    async def classify(arrays):
+        # Keep each group within the batch size so survey windows interleave with interactive scans
+        groups = [arrays[i:i + BATCH_MAX_SIZE] for i in range(0, len(arrays), BATCH_MAX_SIZE)]
+        results = await asyncio.gather(*(served.batcher.submit_many(g, PRIORITY_BULK) for g in groups))
+        return [p for group in results for p, _ in group]
+
+    async def ndjson():
+        describe = functools.partial(describe_probabilities, served.index)
+        async for record in run_survey(items, load_image, classify, describe, window=SURVEY_WINDOW):
+            yield dumps(record) + b"\n"
+
+    return AdmittedStreamingResponse(ndjson(), held, media_type="application/x-ndjson")
 
 
 @app.post("/market-analysis", response_model=MarketResponse, tags=["Market Analysis"])
 async def market_analysis(request: MarketRequest):
-    """Get market price analysis for a crop."""
-    base_prices = {
-        "wheat": 2200, "rice": 2800, "cotton": 6500, "sugarcane": 350,
-        "soybean": 4200, "maize": 2100, "potato": 1500, "tomato": 2500, "onion": 1800
-    }
-    base = base_prices.get(request.crop.lower(), 2500)
-    var = random.uniform(-0.1, 0.15)
-    price = int(base * (1 + var))
-    
-    forecast = []
-    p = price
-    for i in range(7):
-        c = random.uniform(-0.03, 0.05)
-        p = int(p * (1 + c))
-        forecast.append({"day": i+1, "predicted_price": p, "trend": "up" if c > 0 else "down"})
-    
-    # Simulate Nearby Markets (Compare prices)
-    nearby_markets = [
-        {"market_name": f"{request.location} APMC", "price": price, "distance_km": 5},
-        {"market_name": "Major City Mandi", "price": int(price * (1 + random.uniform(0.02, 0.08))), "distance_km": 25},
-        {"market_name": "Export Zone", "price": int(price * (1 + random.uniform(0.10, 0.15))), "distance_km": 60}
-    ]
-
-
-
-    trend_desc = "Prices rising due to high demand" if var > 0 else "Prices dropping due to supply surplus"
-
-    return MarketResponse(
-        crop=request.crop.title(),
-        location=request.location,
-        current_price=price,
-        unit="₹/quintal",
-        trend="Bullish" if var > 0 else "Bearish",
-        trend_description=trend_desc,
-        forecast=forecast,
-        nearby_markets=nearby_markets,
-        last_updated="Just now"
-    )
+    """
+    Get market price analysis for a crop (from price history when available, otherwise simulated).
+    With lat/lng, nearby_markets are the best-paying of the nearest markets, net of transport cost.
+    """
+    if price_history is not None:
+        history = await asyncio.to_thread(market.analyze_history, price_history, request.crop, request.location)
+        if history is not None:
+            result = MarketResponse(crop=request.crop.title(), location=request.location, unit=market.PRICE_UNIT,
+                                    data_source="price_history", **history)
+            return with_nearest_markets(result, request, market.history_price_for(price_history, request.crop))
+
+    # Same seed and simulation as a one-pair /market-analysis/batch call with a 7-day horizon
+    crops, locations, horizons = [request.crop], [request.location], [7]
+    rng = np.random.default_rng(market.request_seed(crops, locations, horizons))
+    item = market.batch_results(crops, locations, horizons, market.simulate(crops, locations, horizons, rng))[0]
+    del item["horizons"]
+    result = MarketResponse(last_updated="Just now", **item)
+    price = result.current_price
+    return with_nearest_markets(result, request, lambda m: market.simulated_market_price(price, request.crop, m["name"]))
+
+
+def with_nearest_markets(result, request, price_for):
+    """Replace nearby_markets with the spatial-index ranking when the request has coordinates"""
+    if request.lat is None or request.lng is None or market_locations is None:
+        return result
+    ranked = market.rank_nearby(market_locations, request.lat, request.lng, price_for, TRANSPORT_COST_PER_QUINTAL_KM)
+    if ranked:
+        result.nearby_markets = [MarketPrice(**m) for m in ranked]
+    return result
+
+
+@app.post("/market-analysis/batch", response_model=MarketBatchResponse, tags=["Market Analysis"])
+async def market_analysis_batch(request: MarketBatchRequest):
+    """
+    Market analysis for every crop x location pair in one call, with a forecast
+    up to the longest horizon and the price/change at each requested horizon.
+    Pass `seed` to reproduce a result; without it the seed is derived from the
+    query and the date, so the same query gives the same prices all day.
+    """
+    if not request.crops or not request.locations or not request.horizons:
+        raise HTTPException(status_code=400, detail="crops, locations and horizons must not be empty")
+    if len(request.crops) * len(request.locations) > MARKET_BATCH_MAX_PAIRS:
+        raise HTTPException(status_code=400, detail=f"At most {MARKET_BATCH_MAX_PAIRS} crop x location pairs per request")
+    if any(h < 1 or h > MARKET_MAX_HORIZON_DAYS for h in request.horizons):
+        raise HTTPException(status_code=400, detail=f"horizons must be between 1 and {MARKET_MAX_HORIZON_DAYS} days")
+
+    horizons = sorted(set(request.horizons))
+    seed = request.seed if request.seed is not None else market.request_seed(request.crops, request.locations, horizons)
+    rng = np.random.default_rng(seed)
+    sim = market.simulate(request.crops, request.locations, horizons, rng)
+
+    # Built as plain dicts from the arrays; validating thousands of nested models would dominate the latency
+    results = market.batch_results(request.crops, request.locations, horizons, sim)
+    if price_history is not None:
+        # Pairs whose crop has price history get the same analysis as /market-analysis
+        history = await asyncio.to_thread(
+            lambda: [market.history_batch_result(price_history, crop, location, horizons)
+                     for crop, location in itertools.product(request.crops, request.locations)])
+        results = [h if h is not None else r for r, h in zip(results, history)]
+
+    return JSONResponse(content={
+        "seed": seed,
+        "horizons": horizons,
+        "results": results,
+        "last_updated": "Just now",
+    })
 
 
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
-    """Check service health and model status."""
+    """Check service health and model status (liveness and readiness are reported separately)."""
+    memory = _process_memory
     return HealthResponse(
         status="healthy",
-        ml_model=MODEL_NAME,
-        is_model_loaded=classifier is not None,
-        disease_classes=len(PLANT_DISEASE_CLASSES)
+        ml_model=registry.default.model_name if registry.default else model.model_name,
+        is_model_loaded=model.loaded,
+        disease_classes=len(PLANT_DISEASE_CLASSES),
+        live=True,
+        ready=model.ready,
+        model_status=model.status,
+        model_error=model.error,
+        model_load_timings=model.timings,
+        inference_backend=model.backend,
+        inference_executor=f"{executor.kind} x{executor.workers}",
+        inference_queue_depth=executor.queue_depth + sum(served.batcher.queue_depth for served in registry.resident),
+        prediction_cache=CacheStats(**prediction_cache.stats()),
+        admission=admission.stats(),
+        models=[LoadedModel(**served.info()) for served in registry.resident],
+        model_registry=registry.stats(),
+        weather_cache=weather_cache.stats() if weather_cache is not None else None,
+        worker_pid=os.getpid(),
+        process_memory_mb=to_mb(memory) if memory else None
     )
 
 
 
+@app.post("/models/{name}/swap", response_model=LoadedModel, tags=["Health"])
+async def swap_model(
+    name: str,
+    model_id: Optional[str] = Query(None, description="Load the new version from this hub ID or directory (default: reload the same source)"),
+    x_admin_token: str = Header("", description="MODEL_ADMIN_TOKEN")
+):
+    """
+    Load a new version of a registry model and switch new requests to it.
+    Requests already running finish on the old version, which is then unloaded.
+    With serve.py every worker has its own registry: swap each one, or restart.
+    """
+    if not MODEL_ADMIN_TOKEN or not secrets.compare_digest(x_admin_token, MODEL_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Model swaps need a valid X-Admin-Token (set MODEL_ADMIN_TOKEN)")
+    ensure_model_ready()
+    if name not in registry.specs:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}'; available: {', '.join(sorted(registry.specs))}")
+    try:
+        served = await registry.swap(name, model_id)
+    except Exception as e:
+        logger.exception("Model swap failed", extra={"model": name, "model_id": model_id})
+        raise HTTPException(status_code=500, detail=f"Swap failed, still serving the previous version: {e}")
+    if name == registry.default_name:
+        model.adopt(served)
+    return LoadedModel(**served.info())
+
+
+@app.get("/metrics", tags=["Health"])
+async def prometheus_metrics():
+    """Prometheus metrics: per-stage latency histograms, in-flight requests, batch sizes, model load time, cache counters."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/health/live", tags=["Health"])
+async def liveness():
+    """Liveness probe: the process is up and the event loop is responsive."""
+    return {"live": True}
+
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before."""
+    body = {"ready": model.ready, "model_status": model.status}
+    return JSONResponse(status_code=200 if model.ready else 503, content=body)
+
+
 # --------------------
 # Model Analytics
 # --------------------
@@ -486,70 +1498,314 @@ class ConfusionMatrixEntry(BaseModel):
     predicted: str
     count: int
 
+class ClassMetrics(BaseModel):
+    name: str
+    precision: float
+    recall: float
+    f1: float
+    support: int
+    predicted: int
+
+class CalibrationBin(BaseModel):
+    lower: float
+    upper: float
+    count: int
+    accuracy: float
+    confidence: float
+
+class Calibration(BaseModel):
+    ece: float
+    brier: float
+    mean_confidence: float
+    bins: List[CalibrationBin]
+
+class ModelEvaluation(BaseModel):
+    level: str
+    images: int
+    accuracy: float
+    top5_accuracy: float
+    macro_precision: float
+    macro_recall: float
+    macro_f1: float
+    per_class: List[ClassMetrics]
+    calibration: Calibration
+    confusion_labels: List[str]
+    confusion_counts: List[List[int]]
+    dataset_path: str
+    backend: str
+    evaluated_at: str
+
 class ModelStatsResponse(BaseModel):
     model_name: str
-    total_epochs: int
+    total_epochs: Optional[int] = None
     final_accuracy: float
-    training_history: List[TrainingMetric]
+    training_history: List[TrainingMetric] = []
     confusion_matrix: List[ConfusionMatrixEntry]
-    learning_rate: float
+    learning_rate: Optional[float] = None
     architecture_description: str
+    model_hash: Optional[str] = None
+    evaluation: Optional[ModelEvaluation] = None
 
 
-@app.get("/model-stats", response_model=ModelStatsResponse, tags=["Analytics"])
-async def get_model_stats():
-    """Get educational model training statistics (Simulated for demo)."""
-    
-    # Simulate realistic training curve (MobileNetV2 style)
-    # Seed for stability so user sees consistent "Training" history
-    random.seed(42) 
-    
+# Evaluation reports (written by evaluate_model.py), keyed by model fingerprint
+EVAL_REPORT_DIR = os.getenv("EVAL_REPORT_DIR", evaluation.DEFAULT_REPORT_DIR)
+EVAL_REPORT_RECHECK_SECONDS = 60.0  # a model without a usable report is looked up again this often
+_model_stats: Dict[str, ModelStatsResponse] = {}
+_missing_reports: Dict[str, float] = {}  # fingerprint -> when its report was found missing or unusable
+
+
+def demo_training_stats():
+    """The static (simulated) training summary served until an evaluation report exists"""
+    rng = random.Random(42)  # same curve every time
     history = []
-    acc = 0.55
-    loss = 1.8
-    val_acc = 0.50
-    val_loss = 1.9
-    
-    for i in range(1, 26): # 25 Epochs
-        # Improve metrics logarithmically/randomly
-        acc += random.uniform(0.01, 0.03) * (1 - acc) # Slows as it nears 1.0
-        loss *= random.uniform(0.85, 0.95)
-        
-        val_acc = acc - random.uniform(0.02, 0.05) # Val slightly lower (overfitting check)
-        val_loss = loss + random.uniform(0.05, 0.1)
-        
+    acc, loss = 0.55, 1.8
+    for epoch in range(1, 26):
+        acc += rng.uniform(0.01, 0.03) * (1 - acc)  # slows as it nears 1.0
+        loss *= rng.uniform(0.85, 0.95)
         history.append(TrainingMetric(
-            epoch=i,
+            epoch=epoch,
             accuracy=round(acc, 4),
             loss=round(loss, 4),
-            val_accuracy=round(val_acc, 4),
-            val_loss=round(val_loss, 4)
+            val_accuracy=round(acc - rng.uniform(0.02, 0.05), 4),  # validation slightly lower
+            val_loss=round(loss + rng.uniform(0.05, 0.1), 4)
         ))
-        
-    # Top confusion pairs (Common look-alikes)
-    confusion = [
-        {"actual": "Tomato_Early_Blight", "predicted": "Tomato_Late_Blight", "count": 12},
-        {"actual": "Potato_Early_Blight", "predicted": "Potato_Late_Blight", "count": 8},
-        {"actual": "Corn_Common_Rust", "predicted": "Corn_Northern_Leaf_Blight", "count": 5},
-        {"actual": "Apple_Scab", "predicted": "Apple_Black_Rot", "count": 15},
-        {"actual": "Grape_Black_Rot", "predicted": "Grape_Esca", "count": 7},
-    ]
-
     return ModelStatsResponse(
         model_name="MobileNetV2 (Transfer Learning)",
         total_epochs=25,
         final_accuracy=round(acc, 4),
         training_history=history,
-        confusion_matrix=confusion,
+        confusion_matrix=[
+            {"actual": "Tomato_Early_Blight", "predicted": "Tomato_Late_Blight", "count": 12},
+            {"actual": "Potato_Early_Blight", "predicted": "Potato_Late_Blight", "count": 8},
+            {"actual": "Corn_Common_Rust", "predicted": "Corn_Northern_Leaf_Blight", "count": 5},
+            {"actual": "Apple_Scab", "predicted": "Apple_Black_Rot", "count": 15},
+            {"actual": "Grape_Black_Rot", "predicted": "Grape_Esca", "count": 7},
+        ],
         learning_rate=0.0001,
         architecture_description="CNN with Depthwise Separable Convolutions"
     )
 
 
+DEMO_MODEL_STATS = demo_training_stats()
+
+
+def model_stats_from_report(report):
+    return ModelStatsResponse(
+        model_name=report["model_name"],
+        final_accuracy=report["accuracy"],
+        confusion_matrix=report["top_confusions"],
+        architecture_description=f"{report['model_name']} [{report['backend']}], evaluated on {report['images']} labelled images",
+        model_hash=report["model_hash"],
+        evaluation=ModelEvaluation(
+            level=report["level"],
+            images=report["images"],
+            accuracy=report["accuracy"],
+            top5_accuracy=report["top5_accuracy"],
+            macro_precision=report["macro_precision"],
+            macro_recall=report["macro_recall"],
+            macro_f1=report["macro_f1"],
+            per_class=report["per_class"],
+            calibration=report["calibration"],
+            confusion_labels=report["confusion_matrix"]["labels"],
+            confusion_counts=report["confusion_matrix"]["matrix"],
+            dataset_path=report["dataset"]["path"],
+            backend=report["backend"],
+            evaluated_at=report["evaluated_at"],
+        ),
+    )
+
+
+@app.get("/model-stats", response_model=ModelStatsResponse, tags=["Analytics"])
+async def get_model_stats():
+    """
+    Evaluation report of the loaded model: accuracy, per-class precision/recall,
+    calibration and the most common confusions. Reports are produced offline by
+    evaluate_model.py (once per model version) and served from memory. While the
+    model loads, or if it has no usable report yet, the static training summary is
+    served instead (`evaluation` is null), so this works without a model.
+    """
+    fingerprint = registry.default.fingerprint if registry.default else model.fingerprint  # follows hot-swaps
+    if fingerprint is None:
+        return DEMO_MODEL_STATS
+    stats = _model_stats.get(fingerprint)
+    if stats is not None:
+        return stats
+    if time.monotonic() - _missing_reports.get(fingerprint, -EVAL_REPORT_RECHECK_SECONDS) < EVAL_REPORT_RECHECK_SECONDS:
+        return DEMO_MODEL_STATS
+
+    report = await asyncio.to_thread(evaluation.load_report, EVAL_REPORT_DIR, fingerprint)
+    try:
+        stats = model_stats_from_report(report) if report is not None else None
+    except (KeyError, TypeError, ValueError) as e:  # report of another schema version (pydantic errors are ValueErrors)
+        logger.warning("Evaluation report doesn't match the schema", extra={"fingerprint": fingerprint, "error": repr(e)})
+        stats = None
+    if stats is None:
+        _missing_reports[fingerprint] = time.monotonic()
+        return DEMO_MODEL_STATS
+    _missing_reports.pop(fingerprint, None)
+    _model_stats[fingerprint] = stats
+    return stats
+
+
+
+class OutbreakWindow(BaseModel):
+    scans: int
+    diseased: int
+    disease_rate: float
+
+
+class OutbreakDisease(BaseModel):
+    crop: str
+    disease: str
+    cases: int
+    recent_cases: int
+    recent_rate: float
+    growth: float
+
+
+class OutbreakResponse(BaseModel):
+    region: str
+    precision: int
+    bucket_minutes: int
+    as_of: float
+    windows: Dict[str, OutbreakWindow]
+    diseases: List[OutbreakDisease]
+    emerging: List[OutbreakDisease]
+    daily: List[int]
+
+
+@app.get("/outbreaks", response_model=OutbreakResponse, tags=["Analytics"])
+async def get_outbreaks(
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    region: Optional[str] = Query(None, description="Geohash of the region (instead of lat / lng)"),
+    precision: int = Query(OUTBREAK_GEOHASH_PRECISION, ge=1, le=OUTBREAK_GEOHASH_PRECISION,
+                           description="Region size as geohash length: 5 is about 5 x 5 km, 4 about 40 x 20 km, 3 about 150 km")
+):
+    """
+    Located scans in a region over the last 24 hours, 7 days and 28 days: scan and
+    diseased counts, disease rates, per-disease cases, and emerging diseases
+    (at least OUTBREAK_MIN_CASES cases in the last 7 days, growing faster than
+    before). Read from in-memory counters (all worker processes), no history scan.
+    """
+    if region is not None:
+        region = region.lower()
+        if not is_geohash(region) or len(region) > OUTBREAK_GEOHASH_PRECISION:
+            raise HTTPException(status_code=400, detail=f"region must be a geohash of at most {OUTBREAK_GEOHASH_PRECISION} characters")
+    elif lat is not None and lng is not None:
+        region = geohash(lat, lng, precision)
+    else:
+        raise HTTPException(status_code=400, detail="Give lat and lng, or region")
+
+    now = outbreaks.bucket()
+    series = outbreaks.region_series(region, now)
+    peers = await asyncio.to_thread(outbreak_peers.counters) if outbreak_peers is not None else []
+    for peer in peers:
+        for key, counts in peer.region_series(region, now).items():
+            series[key] = series[key] + counts if key in series else counts
+    report = region_report(series, OUTBREAK_LAYOUT["bucket_seconds"], windows_hours=(24, 24 * 7, OUTBREAK_WINDOW_DAYS * 24),
+                           min_cases=OUTBREAK_MIN_CASES)
+    return OutbreakResponse(region=region, precision=len(region), bucket_minutes=OUTBREAK_BUCKET_MINUTES,
+                            as_of=time.time(), **report)
+
+
+
+class Farm(BaseModel):
+    farm_id: Optional[str] = None
+    lat: float = Field(..., ge=-90, le=90)
+    lng: float = Field(..., ge=-180, le=180)
+    crops: List[str] = []
+
+class AdvisoryBatchRequest(BaseModel):
+    farms: List[Farm]
+
+class Advice(BaseModel):
+    category: str  # irrigation, spraying or alert
+    title: str
+    desc: str
+    priority: str
+
+class DiseaseRisk(BaseModel):
+    disease: str
+    crops: List[str]
+    risk: str  # Moderate or High
+    favourable_hours: int  # hours of spreading weather in the next 48 hours
+    severity: str
+    precautions: List[str]
+
+class FarmAdvisory(BaseModel):
+    farm_id: Optional[str] = None
+    region: Optional[str] = None  # geohash cell whose forecast was used
+    weather_available: bool
+    location: Optional[str] = None
+    temp: Optional[float] = None
+    condition: Optional[str] = None
+    advice: List[Advice]
+    disease_risks: List[DiseaseRisk]
+
+class AdvisoryBatchResponse(BaseModel):
+    generated_at: float
+    farms: int
+    cells: int
+    weather_unavailable: int
+    weather_cache: dict
+    results: List[FarmAdvisory]
+
+
+async def farm_advisories(farms):
+    """Advisory per farm ((farm_id, lat, lng, crops)); each distinct weather cell is fetched once"""
+    if weather_cache is None:
+        raise HTTPException(status_code=503, detail="No weather provider configured (OPENWEATHER_API_KEY or WEATHER_PROVIDER=file)")
+    regions = [weather_cache.cell(lat, lng) for _, lat, lng, _ in farms]
+    forecasts = await weather_cache.get_many(regions)
+    items = [{"farm_id": farm_id, "region": region, "crops": crops} for (farm_id, _, _, crops), region in zip(farms, regions)]
+    return await asyncio.to_thread(advisory_engine.advise, items, [forecasts[region] for region in regions])
+
+
+@app.get("/advisories", response_model=FarmAdvisory, tags=["Advisories"])
+async def get_advisory(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    crop: List[str] = Query([], description="Crops grown (repeat for several); disease risks are given for these")
+):
+    """
+    Irrigation, spraying and frost / storm advice plus disease risk (weather windows
+    favouring late blight, early blight, rusts, ...) from the next 48 hours of forecast.
+    """
+    (result,) = await farm_advisories([(None, lat, lng, crop)])
+    if not result["weather_available"]:
+        raise HTTPException(status_code=503, detail="Weather forecast unavailable", headers={"Retry-After": "60"})
+    return JSONResponse(content=result)
+
+
+@app.post("/advisories/batch", response_model=AdvisoryBatchResponse, tags=["Advisories"])
+async def advisories_batch(request: AdvisoryBatchRequest):
+    """
+    Advisories for many farms in one call (e.g. nightly generation for every
+    registered farm). Farms in the same geohash cell share one forecast, so the
+    upstream weather calls scale with the number of cells, not farms; farms whose
+    forecast couldn't be fetched come back with weather_available = false.
+    """
+    if not request.farms:
+        raise HTTPException(status_code=400, detail="farms must not be empty")
+    if len(request.farms) > ADVISORY_BATCH_MAX_FARMS:
+        raise HTTPException(status_code=400, detail=f"At most {ADVISORY_BATCH_MAX_FARMS} farms per request")
+
+    results = await farm_advisories([(f.farm_id, f.lat, f.lng, f.crops) for f in request.farms])
+    # Plain dicts, like /market-analysis/batch: validating thousands of nested models would dominate
+    return JSONResponse(content={
+        "generated_at": time.time(),
+        "farms": len(results),
+        "cells": len({r["region"] for r in results}),
+        "weather_unavailable": sum(not r["weather_available"] for r in results),
+        "weather_cache": weather_cache.stats(),
+        "results": results,
+    })
+
+
 if __name__ == "__main__":
+    # Single process; for one worker per core sharing one model copy, run serve.py
     import uvicorn
-    print("🌿 AgroAgent ML Service (FastAPI)")
-    print(f"📦 Model: {MODEL_NAME}")
-    print("📚 Swagger UI: http://localhost:5001/docs")
-    print("📘 ReDoc: http://localhost:5001/redoc")
+    logger.info("AgroAgent ML Service (FastAPI) starting; model loads in the background (see /health/ready)",
+                extra={"docs": "http://localhost:5001/docs", "redoc": "http://localhost:5001/redoc"})
     uvicorn.run(app, host="0.0.0.0", port=5001)
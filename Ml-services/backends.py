@@ -0,0 +1,307 @@
+"""
+Inference backends behind the classifier.
+
+Every backend takes a preprocessed float32 batch of shape (N, 3, H, W) and
+returns logits of shape (N, n_classes) as a NumPy array, so the rest of the
+service doesn't care whether the forward pass runs in eager PyTorch, a
+TorchScript export, ONNX Runtime or a dynamically int8-quantized model.
+`predict_features` also returns the penultimate-layer embedding (the input
+of the classifier head) from the same forward pass, when the backend has it.
+
+Non-eager backends load a local artifact written once by convert_model.py:
+
+    artifacts/<backend>/
+        model.torchscript.pt | model.onnx | model.int8.pt
+        manifest.json              (labels, source model, version)
+        preprocessor_config.json   (resize / normalisation settings)
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from preprocessing import Preprocessor
+
+BACKENDS = ("torch", "torchscript", "onnx", "int8")
+ARTIFACT_FILES = {
+    "torchscript": "model.torchscript.pt",
+    "onnx": "model.onnx",
+    "int8": "model.int8.pt",
+}
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+
+
+class Backend:
+    name = "base"
+
+    def __init__(self, image_processor, labels, version, model_name):
+        self.image_processor = image_processor
+        self.preprocessor = Preprocessor.from_image_processor(image_processor)
+        self.labels = labels
+        self.version = version
+        self.model_name = model_name
+        self._fingerprint = None
+
+    def predict_logits(self, pixel_values):
+        raise NotImplementedError
+
+    def predict_features(self, pixel_values):
+        """(logits (N, n_classes), embeddings (N, dim) or None) from one forward pass"""
+        return self.predict_logits(pixel_values), None
+
+    def _hash_weights(self, h):
+        raise NotImplementedError
+
+    def size_bytes(self):
+        """Memory held by the weights (what loading this model costs)"""
+        return 0
+
+    def fingerprint(self):
+        """Content hash of the weights and labels; identifies the model independently of where it came from"""
+        if self._fingerprint is None:
+            h = hashlib.blake2b(digest_size=16)
+            h.update(json.dumps(self.labels).encode())
+            self._hash_weights(h)
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+
+def _hash_file(h, path, chunk_size=1 << 20):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+
+
+def _tensor_bytes(module):
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class TorchBackend(Backend):
+    """Eager PyTorch (the original Hugging Face model)"""
+    name = "torch"
+
+    def __init__(self, model, image_processor, model_name):
+        config = model.config
+        labels = [config.id2label[i] for i in range(len(config.id2label))]
+        version = getattr(config, "_commit_hash", None) or config.name_or_path
+        super().__init__(image_processor, labels, version, model_name)
+        self.model = model.eval()
+
+    def predict_logits(self, pixel_values):
+        import torch
+
+        with torch.inference_mode():
+            return self.model(pixel_values=torch.from_numpy(pixel_values)).logits.float().numpy()
+
+    def predict_features(self, pixel_values):
+        import torch
+
+        with torch.inference_mode(), _head_input(self.model) as captured:
+            logits = self.model(pixel_values=torch.from_numpy(pixel_values)).logits.float().numpy()
+        return logits, captured[0].float().numpy() if captured else None
+
+    def _hash_weights(self, h):
+        for name, tensor in self.model.state_dict().items():
+            h.update(name.encode())
+            h.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+
+    def size_bytes(self):
+        return _tensor_bytes(self.model)
+
+
+class TorchScriptBackend(Backend):
+    """Traced TorchScript module (also used for the int8 dynamically-quantized export)"""
+
+    def __init__(self, path, image_processor, labels, version, model_name, name="torchscript"):
+        import torch
+
+        super().__init__(image_processor, labels, version, model_name)
+        self.name = name
+        self.path = path
+        self.module = torch.jit.load(path, map_location="cpu").eval()
+
+    def predict_logits(self, pixel_values):
+        return self.predict_features(pixel_values)[0]
+
+    def predict_features(self, pixel_values):
+        import torch
+
+        with torch.inference_mode():
+            out = self.module(torch.from_numpy(pixel_values))
+        # Artifacts exported before embeddings were added return logits only
+        if isinstance(out, (tuple, list)):
+            return out[0].float().numpy(), out[1].float().numpy()
+        return out.float().numpy(), None
+
+    def _hash_weights(self, h):
+        _hash_file(h, self.path)
+
+    def size_bytes(self):
+        return _tensor_bytes(self.module)
+
+
+class OnnxBackend(Backend):
+    """ONNX Runtime CPU session (no torch import needed at serving time)"""
+    name = "onnx"
+
+    def __init__(self, path, image_processor, labels, version, model_name, intra_op_threads=0):
+        import onnxruntime as ort
+
+        super().__init__(image_processor, labels, version, model_name)
+        self.path = path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.has_embeddings = "embeddings" in {o.name for o in self.session.get_outputs()}
+
+    def predict_logits(self, pixel_values):
+        return self.session.run(["logits"] if self.has_embeddings else None, {self.input_name: pixel_values})[0]
+
+    def predict_features(self, pixel_values):
+        if not self.has_embeddings:
+            return self.predict_logits(pixel_values), None
+        logits, embeddings = self.session.run(["logits", "embeddings"], {self.input_name: pixel_values})
+        return logits, embeddings
+
+    def _hash_weights(self, h):
+        _hash_file(h, self.path)
+
+    def size_bytes(self):
+        # Initializers are loaded into the session; the file size is a close lower bound
+        return os.path.getsize(self.path)
+
+
+# --------------------
+# Loading
+# --------------------
+
+def load_torch_backend(model_id, model_name):
+    from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+    model = AutoModelForImageClassification.from_pretrained(model_id)
+    image_processor = AutoImageProcessor.from_pretrained(model_id)
+    return TorchBackend(model, image_processor, model_name)
+
+
+def artifact_path(backend, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    return os.path.join(artifact_dir, backend, ARTIFACT_FILES[backend])
+
+
+def load_artifact_backend(backend, artifact_dir=DEFAULT_ARTIFACT_DIR, intra_op_threads=0):
+    """Load an exported backend from artifacts/<backend>/ (see convert_model.py)"""
+    from transformers import AutoImageProcessor
+
+    if backend not in ARTIFACT_FILES:
+        raise ValueError(f"Unknown backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+    directory = os.path.join(artifact_dir, backend)
+    path = artifact_path(backend, artifact_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No {backend} artifact at {path}; run convert_model.py --backend {backend}")
+
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+    image_processor = AutoImageProcessor.from_pretrained(directory)
+    # The artifact backend is part of the version so caches never mix outputs of different backends
+    args = (image_processor, manifest["labels"], f"{manifest['source_version']}+{backend}", manifest["model_name"])
+
+    if backend == "onnx":
+        return OnnxBackend(path, *args, intra_op_threads=intra_op_threads)
+    return TorchScriptBackend(path, *args, name=backend)
+
+
+# --------------------
+# Export (used by convert_model.py)
+# --------------------
+
+class _head_input:
+    """Context manager capturing the input of a HF model's classifier head (the embedding)"""
+
+    def __init__(self, model):
+        self.head = getattr(model, "classifier", None)
+        self.captured = []
+        self._handle = None
+
+    def _hook(self, module, args):
+        self.captured.append(args[0].flatten(1))
+
+    def __enter__(self):
+        if self.head is not None:
+            self._handle = self.head.register_forward_pre_hook(self._hook)
+        return self.captured
+
+    def __exit__(self, *exc):
+        if self._handle is not None:
+            self._handle.remove()
+
+
+def _logits_and_embeddings(model):
+    """Wrap a HF model so traced / exported graphs take a tensor and return (logits, embeddings)"""
+    import torch
+
+    class LogitsAndEmbeddings(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, pixel_values):
+            with _head_input(self.inner) as captured:
+                logits = self.inner(pixel_values=pixel_values).logits
+            return logits, captured[0]
+
+    return LogitsAndEmbeddings(model).eval()
+
+
+def export_backend(torch_backend, backend, artifact_dir=DEFAULT_ARTIFACT_DIR, image_size=224):
+    """Write the artifact for `backend` from an eager TorchBackend. Returns the artifact path."""
+    import torch
+
+    directory = os.path.join(artifact_dir, backend)
+    os.makedirs(directory, exist_ok=True)
+    path = artifact_path(backend, artifact_dir)
+    wrapped = _logits_and_embeddings(torch_backend.model)
+    example = torch.rand(1, 3, image_size, image_size)
+
+    t0 = time.perf_counter()
+    with torch.inference_mode():
+        if backend == "torchscript":
+            traced = torch.jit.trace(wrapped, example, check_trace=False)
+            torch.jit.freeze(traced).save(path)
+        elif backend == "int8":
+            quantized = torch.ao.quantization.quantize_dynamic(wrapped, {torch.nn.Linear}, dtype=torch.qint8)
+            torch.jit.trace(quantized, example, check_trace=False).save(path)
+        elif backend == "onnx":
+            torch.onnx.export(
+                wrapped, (example,), path,
+                input_names=["pixel_values"], output_names=["logits", "embeddings"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}, "embeddings": {0: "batch"}},
+                opset_version=17, dynamo=False
+            )
+        else:
+            raise ValueError(f"Cannot export backend '{backend}'")
+
+    torch_backend.image_processor.save_pretrained(directory)
+    manifest = {
+        "backend": backend,
+        "model_name": torch_backend.model_name,
+        "source_model": torch_backend.model.config.name_or_path,
+        "source_version": torch_backend.version,
+        "labels": torch_backend.labels,
+        "image_size": image_size,
+        "export_seconds": round(time.perf_counter() - t0, 3),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def softmax(logits):
+    logits = np.asarray(logits, dtype=np.float32)
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
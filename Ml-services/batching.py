@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import time
+from typing import Any, Callable, List, Optional
+
+# Lower runs first: interactive scans jump ahead of queued bulk work
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class MicroBatcher:
+    """
+    Collects images from concurrent requests into batches and runs one
+    forward pass per batch.
+
+    A batch is dispatched as soon as it holds `max_batch_size` items or the
+    oldest queued item has waited `max_wait_ms`, whichever comes first.
+    Items submitted together (all images of one diagnosis) are never split
+    across batches, so they always share a single forward pass. Queued groups
+    are taken in priority order (PRIORITY_INTERACTIVE before PRIORITY_BULK),
+    FIFO within a priority.
+    `run_batch` receives a list of items and must return one result per item,
+    in the same order. It is executed on `executor` (an InferenceExecutor),
+    with up to `max_in_flight` batches running at once. `on_batch(size, seconds)`,
+    if given, is called after every successful forward pass.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]], executor, max_batch_size: int = 16,
+                 max_wait_ms: float = 10.0, max_in_flight: int = 1,
+                 on_batch: Optional[Callable[[int, float], None]] = None):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_in_flight = max(1, max_in_flight)
+        self.on_batch = on_batch
+        self.batches_run = 0
+        self.items_run = 0
+        self._queue: "asyncio.PriorityQueue | None" = None
+        self._task: "asyncio.Task | None" = None
+        self._slots: "asyncio.Semaphore | None" = None
+        self._dispatched = set()
+        self._carry = None
+        self._seq = itertools.count()
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.PriorityQueue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._task = asyncio.create_task(self._collect_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, item: Any, priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """Queue a single item and wait for its own result."""
+        return (await self.submit_many([item], priority))[0]
+
+    async def submit_many(self, items: List[Any], priority: int = PRIORITY_INTERACTIVE) -> List[Any]:
+        """Queue a group of items (e.g. all images of one diagnosis) to run in the same batch."""
+        if self._task is None:
+            raise RuntimeError("MicroBatcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((priority, next(self._seq), (list(items), future)))
+        return await future
+
+    async def _collect_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free worker first, so the queue keeps filling up meanwhile
+            await self._slots.acquire()
+            if self._carry is not None:
+                batch, self._carry = [self._carry], None
+            else:
+                batch = [(await self._queue.get())[2]]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+
+            while size < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = (await asyncio.wait_for(self._queue.get(), remaining))[2]
+                except asyncio.TimeoutError:
+                    break
+                if size + len(entry[0]) > self.max_batch_size:
+                    # Doesn't fit: the group opens the next batch instead
+                    self._carry = entry
+                    break
+                batch.append(entry)
+                size += len(entry[0])
+
+            # Skip callers that went away (client disconnected) while queued
+            batch = [(items, future) for items, future in batch if not future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatched.add(task)
+            task.add_done_callback(self._dispatched.discard)
+
+    async def _dispatch(self, batch):
+        flat = [item for items, _ in batch for item in items]
+        t0 = time.perf_counter()
+        try:
+            results = await self.executor.run(self.run_batch, flat)
+            if len(results) != len(flat):
+                raise RuntimeError(f"run_batch returned {len(results)} results for {len(flat)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        self.batches_run += 1
+        self.items_run += len(flat)
+        if self.on_batch is not None:
+            self.on_batch(len(flat), time.perf_counter() - t0)
+        start = 0
+        for items, future in batch:
+            if not future.done():
+                future.set_result(list(results[start:start + len(items)]))
+            start += len(items)
+
+    @property
+    def queue_depth(self) -> int:
+        return (self._queue.qsize() if self._queue is not None else 0) + (self._carry is not None)
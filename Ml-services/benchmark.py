@@ -0,0 +1,314 @@
+"""
+Reproducible latency / throughput benchmark for the ML service.
+
+Runs the FastAPI app in-process (lifespan included) behind an httpx client,
+replays the images under test_images/ at a fixed concurrency and reports
+p50/p95/p99 latency, requests/s, images/s and peak RSS per endpoint, plus
+microbenchmarks of the label lookup and preprocessing hot paths.
+
+    python benchmark.py --tiny-model                     # no weight download
+    python benchmark.py --concurrency 16 --requests 500 --out bench.json
+    python benchmark.py --tiny-model --baseline bench.json
+
+Results are written as JSON (--out) so runs can be compared; --baseline
+prints the change against an earlier result file. The prediction cache is
+disabled unless --with-cache is given, so repeated images are measured
+through the full pipeline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMAGES_DIR = os.path.join(HERE, "..", "test_images")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+MARKET_CROPS = ["wheat", "rice", "cotton", "sugarcane", "soybean", "maize", "potato", "tomato", "onion"]
+
+
+def find_images(images_dir):
+    paths = []
+    for root, _, files in os.walk(images_dir):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process plus the largest finished child, in MB"""
+    if resource is None:
+        return None
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KB elsewhere
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(usage / divisor, 1)
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_tiny_model(path, labels, seed=0):
+    """
+    Write a small random-weight MobileNetV2 with the service's label set to `path`.
+    Same architecture family and preprocessing as the real model, ~0.5M parameters.
+    """
+    import torch
+    from transformers import MobileNetV2Config, MobileNetV2ForImageClassification, MobileNetV2ImageProcessor
+
+    torch.manual_seed(seed)
+    config = MobileNetV2Config(
+        depth_multiplier=0.35, image_size=224, num_labels=len(labels),
+        id2label=dict(enumerate(labels)), label2id={label: i for i, label in enumerate(labels)}
+    )
+    model = MobileNetV2ForImageClassification(config)
+    with torch.no_grad():
+        model.classifier.weight.normal_(0, 1.0)
+        model.classifier.bias.normal_(0, 1.0)
+    model.eval()
+    model.save_pretrained(path)
+    MobileNetV2ImageProcessor(size={"shortest_edge": 256}, crop_size={"height": 224, "width": 224}).save_pretrained(path)
+
+
+def summarize(latencies_ms, elapsed_s, errors, images_per_request=0):
+    lat = np.asarray(latencies_ms) if latencies_ms else np.zeros(1)
+    n = len(latencies_ms)
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+    result = {
+        "requests": n,
+        "errors": errors,
+        "elapsed_s": round(elapsed_s, 3),
+        "requests_per_s": round(n / elapsed_s, 2) if elapsed_s else None,
+        "latency_ms": {
+            "mean": round(float(lat.mean()), 2),
+            "p50": round(float(p50), 2),
+            "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2),
+            "max": round(float(lat.max()), 2),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if images_per_request:
+        result["images_per_s"] = round(n * images_per_request / elapsed_s, 2) if elapsed_s else None
+    return result
+
+
+async def run_load(send, total, concurrency):
+    """Issue `total` requests from `concurrency` workers; send(i) returns an HTTP response"""
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            response = await send(i)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - t0, errors
+
+
+async def bench_endpoints(app_module, args, images):
+    import httpx
+
+    app = app_module.app
+    results = {}
+    async with app.router.lifespan_context(app):
+        while app_module.model.status not in ("ready", "failed"):
+            await asyncio.sleep(0.1)
+        if not app_module.model.ready:
+            raise SystemExit(f"Model failed to load: {app_module.model.error}")
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            n_img = args.images_per_request
+
+            async def predict(i):
+                batch = [images[(i * n_img + j) % len(images)] for j in range(n_img)]
+                files = [("files", (os.path.basename(path), data, "image/png")) for path, data in batch]
+                return await client.post("/predict-disease", files=files)
+
+            async def market(i):
+                crop = MARKET_CROPS[i % len(MARKET_CROPS)]
+                return await client.post("/market-analysis", json={"crop": crop, "location": "Pune"})
+
+            async def health(i):
+                return await client.get("/health")
+
+            endpoints = {
+                "/predict-disease": (predict, n_img),
+                "/market-analysis": (market, 0),
+                "/health": (health, 0),
+            }
+            for path, (send, per_request) in endpoints.items():
+                if path.strip("/") not in args.endpoints:
+                    continue
+                await run_load(send, args.warmup, args.concurrency)
+                latencies, elapsed, errors = await run_load(send, args.requests, args.concurrency)
+                results[path] = summarize(latencies, elapsed, errors, per_request)
+                print_endpoint(path, results[path])
+
+        results["_model"] = {
+            "name": app_module.model.model_name,
+            "backend": app_module.model.backend,
+            "load_timings_s": app_module.model.timings,
+        }
+    return results
+
+
+def timeit(fn, iterations):
+    """Mean microseconds per call (after one warm-up call)"""
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round((time.perf_counter() - t0) * 1e6 / iterations, 3)
+
+
+def bench_micro(app_module, images, iterations):
+    from preprocessing import Preprocessor
+    from label_index import LabelIndex
+
+    labels = app_module.PLANT_DISEASE_CLASSES
+    diseases = [app_module.parse_disease_label(label)[1] for label in labels]
+    index = LabelIndex.build(labels, app_module.DISEASE_DATABASE, app_module.parse_disease_label)
+    results = {
+        # Per call, cycling over every class label / disease name
+        "parse_disease_label_us": timeit(lambda: [app_module.parse_disease_label(x) for x in labels], iterations) / len(labels),
+        "get_disease_info_us": timeit(lambda: [app_module.get_disease_info(x) for x in diseases], iterations) / len(diseases),
+        "label_index_lookup_us": timeit(lambda: [index[i] for i in range(len(index))], iterations) / len(index),
+    }
+
+    if images:
+        preprocessor = Preprocessor()
+        contents = images[0][1]
+        n = max(1, iterations // 100)
+        decoded = preprocessor.decode(contents)
+        arrays = [preprocessor.to_array(decoded)] * 16
+        results.update({
+            "preprocess_decode_us": timeit(lambda: preprocessor.decode(contents), n),
+            "preprocess_resize_crop_us": timeit(lambda: preprocessor.to_array(decoded), n),
+            "preprocess_normalize_batch16_us": timeit(lambda: preprocessor.normalize_into(arrays), n),
+        })
+    return {k: round(v, 3) for k, v in results.items()}
+
+
+def print_endpoint(path, r):
+    lat = r["latency_ms"]
+    extra = f"  {r['images_per_s']:.1f} img/s" if "images_per_s" in r else ""
+    print(f"{path:<18} p50 {lat['p50']:8.2f} ms  p95 {lat['p95']:8.2f} ms  p99 {lat['p99']:8.2f} ms  "
+          f"{r['requests_per_s']:8.1f} req/s{extra}  peak RSS {r['peak_rss_mb']} MB  errors {r['errors']}")
+
+
+def print_comparison(current, baseline):
+    print(f"\nChange vs baseline ({baseline.get('commit')} @ {baseline.get('timestamp')}):")
+    for path, r in current["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(path)
+        if path.startswith("_") or not old:
+            continue
+        for key in ("p50", "p95", "p99"):
+            a, b = old["latency_ms"][key], r["latency_ms"][key]
+            print(f"  {path:<18} {key} {a:8.2f} -> {b:8.2f} ms ({(b - a) / a * 100 if a else 0:+.1f}%)")
+    for key, value in current["micro"].items():
+        old = baseline.get("micro", {}).get(key)
+        if old:
+            print(f"  {key:<34} {old:10.3f} -> {value:10.3f} us ({(value - old) / old * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ML service in-process")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per endpoint")
+    parser.add_argument("--images", default=DEFAULT_IMAGES_DIR, help="Image folder replayed against /predict-disease")
+    parser.add_argument("--images-per-request", type=int, default=1, choices=[1, 2, 3])
+    parser.add_argument("--endpoints", default="predict-disease,market-analysis,health",
+                        help="Comma-separated subset of predict-disease, market-analysis, health")
+    parser.add_argument("--micro-iterations", type=int, default=2000)
+    parser.add_argument("--tiny-model", action="store_true", help="Use a small random-weight stand-in model (no download)")
+    parser.add_argument("--tiny-model-dir", default=os.path.join(tempfile.gettempdir(), "agro-benchmark-tiny-model"))
+    parser.add_argument("--with-cache", action="store_true", help="Keep the prediction cache enabled")
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier --out file to compare against")
+    args = parser.parse_args()
+    args.endpoints = {e.strip().strip("/") for e in args.endpoints.split(",")}
+
+    # Configuration the app reads at import time
+    if args.tiny_model:
+        os.environ["MODEL_ID"] = args.tiny_model_dir
+        os.environ.setdefault("INFERENCE_BACKEND", "torch")
+    if not args.with_cache:
+        os.environ["PREDICTION_CACHE_SIZE"] = "0"
+        os.environ.pop("PREDICTION_CACHE_DIR", None)
+    # Fresh state per run: an embedding index left by an earlier run would turn replayed images into
+    # near-duplicate matches, and scans must not land in the service's outbreak counters
+    os.environ["EMBEDDING_INDEX_DIR"] = tempfile.mkdtemp(prefix="agro-benchmark-index-")
+    os.environ["OUTBREAK_SNAPSHOT_DIR"] = ""
+    os.environ.setdefault("JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "agro-benchmark-jobs.db"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import app as app_module
+    if args.tiny_model:
+        build_tiny_model(args.tiny_model_dir, app_module.PLANT_DISEASE_CLASSES)
+
+    images = [(path, open(path, "rb").read()) for path in find_images(args.images)]
+    if not images and "predict-disease" in args.endpoints:
+        raise SystemExit(f"No images found under {args.images}")
+
+    print(f"Benchmarking with {len(images)} images, concurrency {args.concurrency}, {args.requests} requests/endpoint")
+    endpoints = asyncio.run(bench_endpoints(app_module, args, images))
+    micro = bench_micro(app_module, images, args.micro_iterations)
+    for key, value in micro.items():
+        print(f"{key:<34} {value:10.3f} us")
+
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "images": len(images),
+            "images_per_request": args.images_per_request,
+            "tiny_model": args.tiny_model,
+            "prediction_cache": args.with_cache,
+            "inference_backend": os.getenv("INFERENCE_BACKEND", "torch"),
+            "inference_executor": os.getenv("INFERENCE_EXECUTOR", "thread"),
+            "inference_workers": int(os.getenv("INFERENCE_WORKERS", "1")),
+            "batch_max_size": app_module.BATCH_MAX_SIZE,
+            "batch_max_wait_ms": app_module.BATCH_MAX_WAIT_MS,
+        },
+        "endpoints": endpoints,
+        "micro": micro,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+One-time export of the disease model to a faster CPU backend, plus a parity check.
+
+    python convert_model.py --backend onnx
+    python convert_model.py --backend all --images ../test_images
+    python convert_model.py --backend int8 --check-only
+
+Artifacts are written to artifacts/<backend>/ (or MODEL_ARTIFACT_DIR) and
+served by setting INFERENCE_BACKEND=<backend>. The parity check runs the
+eager model and the exported one over every image under --images and
+fails (exit code 1) if top-1 agreement is below --min-agreement.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+import backends
+import inference
+
+DEFAULT_IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_images")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def find_images(images_dir):
+    paths = []
+    for root, _, files in os.walk(images_dir):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def timed_predict(classifier, images, batch_size=16):
+    """Probabilities for all images plus mean milliseconds per image"""
+    inference.predict_proba(classifier, images[:1])  # warm-up
+    t0 = time.perf_counter()
+    probs = np.concatenate([
+        inference.predict_proba(classifier, images[i:i + batch_size]) for i in range(0, len(images), batch_size)
+    ])
+    return probs, (time.perf_counter() - t0) * 1000 / len(images)
+
+
+def check_parity(reference, candidate, images, min_agreement):
+    ref_probs, ref_ms = timed_predict(reference, images)
+    cand_probs, cand_ms = timed_predict(candidate, images)
+
+    agreement = float((ref_probs.argmax(axis=1) == cand_probs.argmax(axis=1)).mean())
+    max_diff = float(np.abs(ref_probs - cand_probs).max())
+    print(f"   top-1 agreement: {agreement * 100:.1f}% over {len(images)} images")
+    print(f"   max |Δprob|:     {max_diff:.5f}")
+    print(f"   latency:         {ref_ms:.1f} ms/img (torch) -> {cand_ms:.1f} ms/img ({candidate.name})")
+    return agreement >= min_agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the disease model to TorchScript / ONNX / int8 and check parity")
+    parser.add_argument("--backend", choices=list(backends.ARTIFACT_FILES) + ["all"], default="onnx")
+    parser.add_argument("--out", default=inference.MODEL_ARTIFACT_DIR, help="Artifact directory")
+    parser.add_argument("--images", default=DEFAULT_IMAGES_DIR, help="Labelled image folder for the parity check")
+    parser.add_argument("--min-agreement", type=float, default=1.0, help="Required top-1 agreement (0-1)")
+    parser.add_argument("--check-only", action="store_true", help="Don't export, only check an existing artifact")
+    parser.add_argument("--skip-parity", action="store_true")
+    args = parser.parse_args()
+
+    targets = list(backends.ARTIFACT_FILES) if args.backend == "all" else [args.backend]
+
+    print("Loading eager PyTorch model...")
+    reference, _ = inference.load_eager_classifier()
+    if reference is None:
+        sys.exit(1)
+
+    image_paths = [] if args.skip_parity else find_images(args.images)
+    if not args.skip_parity and not image_paths:
+        print(f"⚠️ No images found under {args.images}, skipping parity check")
+    images = [reference.preprocessor.load(open(p, "rb").read())[0] for p in image_paths]
+
+    ok = True
+    for backend in targets:
+        if not args.check_only:
+            path = backends.export_backend(reference, backend, args.out)
+            print(f"📦 {backend}: wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        if images:
+            candidate = backends.load_artifact_backend(backend, args.out)
+            passed = check_parity(reference, candidate, images, args.min_agreement)
+            print(f"{'✅' if passed else '❌'} {backend} parity {'passed' if passed else 'FAILED'}")
+            ok = ok and passed
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Vector index of past scans: similar-case retrieval and near-duplicate detection.
+
+Every diagnosed image adds one row: its penultimate-layer embedding (the
+input of the classifier head, from the forward pass the diagnosis already
+ran) and its probability vector, plus one line of case metadata.
+
+    embeddings.npy  float16 (capacity, dim)        L2-normalised embeddings
+    probs.npy       float16 (capacity, n_classes)  stored diagnosis per case
+    cases.jsonl     one line per write: row, key, plant, disease, confidence, diagnosed_at
+
+The .npy files are memory-mapped; when they are full, capacity doubles
+(copy to a new file, atomic rename) up to max_rows. From then on the index is
+a ring buffer: each new case overwrites the oldest row, so disk, memory and
+search cost stay bounded. cases.jsonl is written after the row (a crash
+mid-append leaves at most one row out of step with its case); once overwrites have doubled it,
+it is rewritten with only the live cases. A search only scans the newest
+search_rows cases. There is one index per model fingerprint, since
+embeddings of different weights are not comparable.
+
+Several processes (pre-forked workers, see serve.py) can share one index:
+appends are serialised by an flock on index.lock, and every process picks
+up rows appended by the others (and re-maps grown files) before it searches.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+DEFAULT_MAX_ROWS = 100_000
+SEARCH_CHUNK_ROWS = 8192  # float16 rows converted to float32 per step of a search
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class EmbeddingIndex:
+    def __init__(self, path, max_rows=DEFAULT_MAX_ROWS, search_rows=None):
+        self.path = path
+        self.max_rows = max_rows
+        self.search_rows = search_rows or max_rows
+        self.cases = []        # metadata per row
+        self._by_key = {}      # upload hash -> row
+        self._last_row = -1    # row written last (the newest case)
+        self._embeddings = None
+        self._probs = None
+        self._mapped_inode = None
+        self._log = None
+        self._generation = 0   # compactions of cases.jsonl
+        self._log_lines = 0    # lines of cases.jsonl already read
+        self._offset = 0       # bytes of cases.jsonl already read
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._cases_path = os.path.join(path, "cases.jsonl")
+        self._lock_file = open(os.path.join(path, "index.lock"), "a")
+
+        with self._exclusive():
+            self._sync()
+            # Drop a torn last line (a writer died mid-append) so the next append starts on a fresh line
+            if os.path.exists(self._cases_path) and os.path.getsize(self._cases_path) != self._offset:
+                with open(self._cases_path, "r+b") as f:
+                    f.truncate(self._offset)
+        self._log = open(self._cases_path, "a", encoding="utf-8")
+
+    @classmethod
+    def open(cls, root, fingerprint, max_rows=DEFAULT_MAX_ROWS, search_rows=None):
+        """The index for a model fingerprint under `root`, or None if disabled (no root)"""
+        if not root or not fingerprint:
+            return None
+        return cls(os.path.join(root, fingerprint), max_rows, search_rows)
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.npy")
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Thread lock + cross-process flock, held while appending"""
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Read cases appended by other processes and re-map grown files; caller holds self._lock"""
+        try:
+            f = open(self._cases_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            # A compacted log starts with {"generation": n}; a new generation means re-reading it from the start
+            first = f.readline()
+            generation = json.loads(first)["generation"] if first.startswith(b'{"generation"') and first.endswith(b"\n") else 0
+            if generation != self._generation:
+                self.cases, self._by_key, self._last_row, self._log_lines, self._offset = [], {}, -1, 0, 0
+                self._generation = generation
+                if self._log is not None:
+                    self._log.close()
+                    self._log = open(self._cases_path, "a", encoding="utf-8")
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    case = json.loads(line)
+                except ValueError:
+                    break
+                self._offset += len(line)
+                if "generation" in case:
+                    continue
+                self._put(case.get("row", len(self.cases)), case)
+                self._log_lines += 1
+        if self.cases and os.stat(self._file("embeddings")).st_ino != self._mapped_inode:
+            self._map()
+
+    def _put(self, row, case):
+        """Record `case` as the metadata of `row`, replacing the case it overwrote"""
+        if row < len(self.cases):
+            old = self.cases[row]
+            if old is not None and self._by_key.get(old["key"]) == row:
+                del self._by_key[old["key"]]
+            self.cases[row] = case
+        else:
+            self.cases.extend([None] * (row - len(self.cases)))
+            self.cases.append(case)
+        self._by_key[case["key"]] = row
+        self._last_row = row
+
+    def _compact(self):
+        """Rewrite cases.jsonl with only the live cases, oldest first; caller holds the exclusive lock"""
+        n = len(self.cases)
+        order = [(self._last_row + 1 + i) % n for i in range(n)]
+        tmp_path = f"{self._cases_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"generation": self._generation + 1}) + "\n")
+            for row in order:
+                if self.cases[row] is not None:
+                    f.write(json.dumps({**self.cases[row], "row": row}) + "\n")
+        os.replace(tmp_path, self._cases_path)
+        self._log.close()
+        self._log = open(self._cases_path, "a", encoding="utf-8")
+        self._generation += 1
+        self._log_lines = sum(case is not None for case in self.cases)
+        self._offset = os.path.getsize(self._cases_path)
+
+    def _map(self):
+        self._embeddings = np.load(self._file("embeddings"), mmap_mode="r+")
+        self._probs = np.load(self._file("probs"), mmap_mode="r+")
+        self._mapped_inode = os.stat(self._file("embeddings")).st_ino
+
+    def __len__(self):
+        return len(self.cases)
+
+    @property
+    def dim(self):
+        return self._embeddings.shape[1] if self._embeddings is not None else None
+
+    def _grow(self, dim, n_classes, row):
+        """Allocate (or double, up to max_rows) the memory-mapped arrays to hold `row`; caller holds the exclusive lock"""
+        capacity = INITIAL_CAPACITY if self._embeddings is None else 2 * len(self._embeddings)
+        capacity = max(min(capacity, self.max_rows), row + 1)
+        n = len(self.cases)
+        for name, width in (("embeddings", dim), ("probs", n_classes)):
+            tmp_path = f"{self._file(name)}.{os.getpid()}.tmp"
+            grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(capacity, width))
+            old = getattr(self, f"_{name}")
+            if old is not None:
+                grown[:n] = old[:n]
+            grown.flush()
+            del grown
+        for name in ("probs", "embeddings"):  # embeddings last: its inode change tells readers to re-map
+            os.replace(f"{self._file(name)}.{os.getpid()}.tmp", self._file(name))
+        self._map()
+
+    def row_for_key(self, key):
+        with self._lock:
+            return self._by_key.get(key)
+
+    def embedding_for(self, key):
+        """Stored embedding of the case with upload hash `key`, or None"""
+        with self._lock:
+            row = self._by_key.get(key)
+            return None if row is None else np.asarray(self._embeddings[row], dtype=np.float32)
+
+    def probs_for(self, row, key):
+        """Stored probability vector of `row`, or None if the case `key` is no longer in it (overwritten)"""
+        with self._lock:
+            case = self.cases[row] if row < len(self.cases) else None
+            if case is None or case["key"] != key:
+                return None
+            return np.asarray(self._probs[row], dtype=np.float32)
+
+    def add(self, key, embedding, probs, **meta):
+        """Append a case; returns its row id"""
+        embedding = _normalize(embedding)
+        with self._exclusive():
+            self._sync()
+            # Next free row, or (once max_rows are in use) the row of the oldest case
+            row = len(self.cases) if len(self.cases) < self.max_rows else (self._last_row + 1) % self.max_rows
+            if self._embeddings is None or row >= len(self._embeddings):
+                self._grow(embedding.shape[-1], len(probs), row)
+            self._embeddings[row] = embedding
+            self._probs[row] = probs
+            case = {"row": row, "key": key, "diagnosed_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **meta}
+            line = json.dumps(case) + "\n"
+            self._log.write(line)
+            self._log.flush()
+            self._log_lines += 1
+            self._offset += len(line.encode("utf-8"))
+            self._put(row, case)
+            if self._log_lines >= 2 * len(self.cases):
+                self._compact()
+        return row
+
+    def _window(self):
+        """Row ranges of the newest search_rows cases; caller holds self._lock"""
+        n = len(self.cases)
+        start = self._last_row + 1 - min(n, self.search_rows)
+        if start >= 0:
+            return [(start, self._last_row + 1)]
+        return [(n + start, n), (0, self._last_row + 1)]
+
+    def search(self, embeddings, k=5):
+        """
+        Cosine similarity of every query (m, dim) against the newest search_rows cases.
+        Returns, per query, [(row, similarity, case metadata)] for the k most similar, best first
+        (read under the lock, so a concurrent add can't swap another case into a result).
+        """
+        queries = _normalize(np.atleast_2d(embeddings))
+        with self._lock:
+            self._sync()
+            if not self.cases or k <= 0:
+                return [[] for _ in queries]
+            window = self._window()
+            rows = np.concatenate([np.arange(start, stop) for start, stop in window])
+            sims = np.empty((len(rows), len(queries)), dtype=np.float32)
+            offset = 0
+            for start, stop in window:
+                for chunk in range(start, stop, SEARCH_CHUNK_ROWS):
+                    end = min(stop, chunk + SEARCH_CHUNK_ROWS)
+                    np.matmul(self._embeddings[chunk:end].astype(np.float32), queries.T, out=sims[offset:offset + end - chunk])
+                    offset += end - chunk
+
+            k = min(k, len(rows))
+            top = np.argpartition(-sims, k - 1, axis=0)[:k]
+            results = []
+            for j in range(len(queries)):
+                best = top[np.argsort(-sims[top[:, j], j]), j]
+                # A row whose case line isn't in the log yet (another process mid-append) has no metadata: skipped
+                results.append([(int(rows[i]), float(sims[i, j]), self.cases[rows[i]]) for i in best
+                                if self.cases[rows[i]] is not None])
+        return results
+
+    def close(self):
+        with self._lock:
+            for array in (self._embeddings, self._probs):
+                if array is not None:
+                    array.flush()
+            self._log.close()
+            self._lock_file.close()
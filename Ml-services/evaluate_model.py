@@ -0,0 +1,109 @@
+"""
+Evaluate the classifier over a labelled image folder and store the report
+that /model-stats serves.
+
+    python evaluate_model.py                            # ../test_images, configured backend
+    python evaluate_model.py --images /data/plantvillage/val --backend onnx
+    python evaluate_model.py --force                    # re-run for an already evaluated model
+
+Each sub-folder is one ground-truth class (named after a class label) or
+plant (named after a plant). The report is keyed by the model fingerprint,
+so it is computed once per model version; run this after changing weights
+or backend and the service picks the new report up on the next request.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+import evaluation
+import inference
+from label_index import parse_disease_label
+
+DEFAULT_IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_images")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def find_labelled_images(images_dir):
+    """[(folder, path)] for every image; folder = the image's parent directory name"""
+    items = []
+    for root, _, files in os.walk(images_dir):
+        folder = os.path.basename(root)
+        items.extend((folder, os.path.join(root, f)) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(items)
+
+
+def predict_all(classifier, paths, batch_size):
+    """Softmax vectors for every image, run in batches (decode errors are reported and skipped)"""
+    preprocessor = classifier.preprocessor
+    probs, kept = [], []
+    for start in range(0, len(paths), batch_size):
+        arrays = []
+        for path in paths[start:start + batch_size]:
+            try:
+                with open(path, "rb") as f:
+                    arrays.append(preprocessor.load(f.read())[0])
+                kept.append(path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {path}: {e}")
+        if arrays:
+            probs.append(inference.predict_proba(classifier, arrays).copy())
+    return (np.concatenate(probs) if probs else np.empty((0, 0))), kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the disease model and cache the report for /model-stats")
+    parser.add_argument("--images", default=DEFAULT_IMAGES_DIR, help="Labelled image folder (one sub-folder per class or plant)")
+    parser.add_argument("--backend", default=None, help="Backend to evaluate (default: INFERENCE_BACKEND)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--out", default=os.getenv("EVAL_REPORT_DIR", evaluation.DEFAULT_REPORT_DIR), help="Report directory")
+    parser.add_argument("--force", action="store_true", help="Re-evaluate even if a report exists for this model")
+    args = parser.parse_args()
+
+    classifier, model_name = inference.load_classifier(backend=args.backend)
+    if classifier is None:
+        sys.exit(1)
+    fingerprint = inference.model_fingerprint(classifier)
+    existing = evaluation.report_path(args.out, fingerprint)
+    if os.path.exists(existing) and not args.force:
+        print(f"✅ Report for model {fingerprint} already exists: {existing} (use --force to re-run)")
+        return
+
+    items = find_labelled_images(args.images)
+    labels = inference.model_labels(classifier)
+    plants = [parse_disease_label(label)[0] for label in labels]
+    level, names, membership, unit_of, unmatched = evaluation.resolve_folders(
+        sorted({folder for folder, _ in items}), labels, plants
+    )
+    for folder in unmatched:
+        print(f"⚠️ Folder '{folder}' matches no class or plant, skipped")
+    items = [(folder, path) for folder, path in items if folder in unit_of]
+    if not items:
+        print(f"❌ No labelled images under {args.images}")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    probs, kept = predict_all(classifier, [path for _, path in items], args.batch_size)
+    folder_of = dict((path, folder) for folder, path in items)
+    actual = np.array([unit_of[folder_of[path]] for path in kept])
+    report = evaluation.compute_metrics(probs, actual, membership, names)
+    report.update({
+        "model_hash": fingerprint,
+        "model_name": model_name,
+        "model_version": inference.model_version(classifier),
+        "backend": classifier.name,
+        "level": level,
+        "dataset": {"path": os.path.abspath(args.images), "folders": {f: names[u] for f, u in sorted(unit_of.items())}},
+        "evaluated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsed_s": round(time.perf_counter() - t0, 2),
+    })
+    path = evaluation.save_report(report, args.out)
+    print(f"📊 {report['images']} images ({level} level): accuracy {report['accuracy'] * 100:.1f}%, "
+          f"macro F1 {report['macro_f1']:.3f}, ECE {report['calibration']['ece']:.3f}")
+    print(f"📦 Report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Offline model evaluation: metrics and the persisted report behind /model-stats.
+
+Ground truth comes from folder names of a labelled image folder. A folder
+named after a class label ("Tomato___Late_blight") is scored per class; a
+folder named after a plant ("Apple", or a near spelling like "Starwberry")
+is scored per plant by summing the probabilities of that plant's classes.
+If any folder is plant-level, the whole report is plant-level.
+
+Reports are JSON files named by the model fingerprint (a hash of weights
+and labels), written once per model version by evaluate_model.py.
+"""
+import difflib
+import json
+import logging
+import os
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_reports")
+CALIBRATION_BINS = 10
+TOP_CONFUSIONS = 10
+
+
+def _key(text):
+    return re.sub(r"[^a-z0-9]+", "", text.lower())
+
+
+def report_path(report_dir, fingerprint):
+    return os.path.join(report_dir, f"{fingerprint}.json")
+
+
+def load_report(report_dir, fingerprint):
+    """The stored report for a model fingerprint, or None (missing or unreadable)"""
+    path = report_path(report_dir, fingerprint)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:  # json.JSONDecodeError is a ValueError
+        logger.warning("Evaluation report unreadable", extra={"path": path, "error": str(e)})
+        return None
+
+
+def save_report(report, report_dir):
+    os.makedirs(report_dir, exist_ok=True)
+    path = report_path(report_dir, report["model_hash"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def resolve_folders(folders, labels, plants):
+    """
+    Map folder names to ground truth.
+
+    labels: class labels of the model; plants: plant name per class.
+    Returns (level, unit names, membership (n_classes, n_units) float32,
+    {folder: unit index}, [unmatched folders]).
+    """
+    label_keys = {_key(label): i for i, label in enumerate(labels)}
+    plant_names = sorted(set(plants))
+    plant_keys = {}
+    for p in plant_names:
+        plant_keys.setdefault(_key(p), p)
+        plant_keys.setdefault(_key(p.split()[0]), p)  # "Corn maize" -> also "corn"
+
+    class_of, plant_of, unmatched = {}, {}, []
+    for folder in folders:
+        key = _key(folder)
+        if key in label_keys:
+            class_of[folder] = label_keys[key]
+            plant_of[folder] = plants[label_keys[key]]
+            continue
+        close = difflib.get_close_matches(key, list(plant_keys), n=1, cutoff=0.8)
+        if close:
+            plant_of[folder] = plant_keys[close[0]]
+        else:
+            unmatched.append(folder)
+
+    matched = [f for f in folders if f not in unmatched]
+    if matched and all(f in class_of for f in matched):
+        membership = np.eye(len(labels), dtype=np.float32)
+        return "class", list(labels), membership, class_of, unmatched
+
+    unit_of_plant = {p: i for i, p in enumerate(plant_names)}
+    membership = np.zeros((len(labels), len(plant_names)), dtype=np.float32)
+    membership[np.arange(len(labels)), [unit_of_plant[p] for p in plants]] = 1.0
+    return "plant", plant_names, membership, {f: unit_of_plant[plant_of[f]] for f in matched}, unmatched
+
+
+def _ratio(num, den):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(den > 0, num / np.where(den > 0, den, 1), 0.0)
+
+
+def compute_metrics(probs, actual, membership, names, bins=CALIBRATION_BINS):
+    """
+    All metrics in vectorized NumPy.
+
+    probs:      (N, n_classes) softmax outputs
+    actual:     (N,) ground-truth unit index per image
+    membership: (n_classes, K) class -> unit matrix (identity for class level)
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.int64)
+    unit_probs = probs @ membership
+    n, k = unit_probs.shape
+
+    predicted = unit_probs.argmax(axis=1)
+    confidence = unit_probs[np.arange(n), predicted]
+    correct = predicted == actual
+
+    confusion = np.bincount(actual * k + predicted, minlength=k * k).reshape(k, k)
+    tp = np.diag(confusion).astype(np.float64)
+    support = confusion.sum(axis=1)
+    predicted_count = confusion.sum(axis=0)
+    precision = _ratio(tp, predicted_count)
+    recall = _ratio(tp, support)
+    f1 = _ratio(2 * precision * recall, precision + recall)
+    present = support > 0
+
+    top5 = np.argsort(-unit_probs, axis=1)[:, :5]
+    top5_correct = (top5 == actual[:, None]).any(axis=1)
+
+    onehot = np.zeros_like(unit_probs)
+    onehot[np.arange(n), actual] = 1.0
+    brier = float(((unit_probs - onehot) ** 2).sum(axis=1).mean())
+
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    bin_idx = np.clip(np.digitize(confidence, edges[1:-1]), 0, bins - 1)
+    bin_count = np.bincount(bin_idx, minlength=bins)
+    bin_acc = _ratio(np.bincount(bin_idx, correct.astype(np.float64), minlength=bins), bin_count)
+    bin_conf = _ratio(np.bincount(bin_idx, confidence, minlength=bins), bin_count)
+    ece = float((bin_count / n * np.abs(bin_acc - bin_conf)).sum())
+
+    off_diagonal = confusion.copy()
+    np.fill_diagonal(off_diagonal, 0)
+    rows, cols = np.nonzero(off_diagonal)
+    order = np.argsort(-off_diagonal[rows, cols], kind="stable")[:TOP_CONFUSIONS]
+
+    shown = np.flatnonzero(present | (predicted_count > 0))
+    return {
+        "images": int(n),
+        "accuracy": round(float(correct.mean()), 4),
+        "top5_accuracy": round(float(top5_correct.mean()), 4),
+        "macro_precision": round(float(precision[present].mean()), 4) if present.any() else 0.0,
+        "macro_recall": round(float(recall[present].mean()), 4) if present.any() else 0.0,
+        "macro_f1": round(float(f1[present].mean()), 4) if present.any() else 0.0,
+        "per_class": [
+            {"name": names[i], "precision": round(float(precision[i]), 4), "recall": round(float(recall[i]), 4),
+             "f1": round(float(f1[i]), 4), "support": int(support[i]), "predicted": int(predicted_count[i])}
+            for i in shown
+        ],
+        "calibration": {
+            "ece": round(ece, 4),
+            "brier": round(brier, 4),
+            "mean_confidence": round(float(confidence.mean()), 4),
+            "bins": [
+                {"lower": round(float(edges[b]), 2), "upper": round(float(edges[b + 1]), 2), "count": int(bin_count[b]),
+                 "accuracy": round(float(bin_acc[b]), 4), "confidence": round(float(bin_conf[b]), 4)}
+                for b in range(bins)
+            ],
+        },
+        "confusion_matrix": {
+            "labels": [names[i] for i in shown],
+            "matrix": confusion[np.ix_(shown, shown)].tolist(),
+        },
+        "top_confusions": [
+            {"actual": names[rows[i]], "predicted": names[cols[i]], "count": int(off_diagonal[rows[i], cols[i]])}
+            for i in order
+        ],
+    }
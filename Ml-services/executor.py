@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import inference
+
+
+def _available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class InferenceExecutor:
+    """
+    Runs image decoding and model inference off the asyncio event loop.
+
+    kind="thread":  a thread pool sharing the app's model; torch intra-op
+                    threads are capped at `torch_threads`.
+    kind="process": a process pool where each worker loads its own model copy
+                    and (optionally) is pinned to its own slice of CPUs.
+    """
+
+    def __init__(self, kind="thread", workers=1, torch_threads=0, pin_cpus=False):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind '{kind}' (expected 'thread' or 'process')")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.torch_threads = max(0, torch_threads)
+        self.pin_cpus = pin_cpus
+        self.in_flight = 0
+        self._pool = None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        if self.kind == "thread":
+            if self.torch_threads > 0 and inference.INFERENCE_BACKEND != "onnx":
+                import torch
+                torch.set_num_threads(self.torch_threads)
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        else:
+            # spawn: forking a process that already runs torch threads can deadlock
+            ctx = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=inference.init_worker,
+                initargs=(self.torch_threads, self._cpu_sets(), ctx.Value("i", 0)),
+            )
+
+    def _cpu_sets(self):
+        """Split the available CPUs into one contiguous slice per worker"""
+        if not self.pin_cpus:
+            return []
+        cpus = _available_cpus()
+        per_worker = max(1, len(cpus) // self.workers)
+        return [set(cpus[i * per_worker:(i + 1) * per_worker]) or {cpus[i % len(cpus)]} for i in range(self.workers)]
+
+    async def warm_up(self):
+        """Make sure every process worker has started and loaded its model"""
+        if self.kind == "process":
+            ready = await asyncio.gather(*(self.run(inference.worker_ready) for _ in range(self.workers)))
+            return all(ready)
+        return True
+
+    async def run(self, fn, *args):
+        if self._pool is None:
+            raise RuntimeError("InferenceExecutor is not started")
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    @property
+    def queue_depth(self) -> int:
+        """Tasks submitted but still waiting for a free worker"""
+        return max(0, self.in_flight - self.workers)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,189 @@
+"""
+Model loading and inference helpers.
+
+Kept free of FastAPI so that process-pool workers can import this module
+(and load their own copy of the model) without importing the whole app.
+"""
+import logging
+import os
+
+import numpy as np
+from PIL import Image
+
+import backends
+
+# MODEL_ID overrides the primary model (hub ID or local directory, e.g. the benchmark stand-in model)
+PRIMARY_MODEL_ID = os.getenv("MODEL_ID", "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification")
+PRIMARY_MODEL_NAME = "PlantVillage MobileNet (38 classes)"
+FALLBACK_MODEL_ID = "google/vit-base-patch16-224"
+FALLBACK_MODEL_NAME = "Google ViT Base"
+
+logger = logging.getLogger(__name__)
+
+# Which backend runs the forward pass: torch | torchscript | onnx | int8
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+MODEL_ARTIFACT_DIR = os.getenv("MODEL_ARTIFACT_DIR", backends.DEFAULT_ARTIFACT_DIR)
+
+
+def load_eager_classifier(verbose=True, model_id=None, model_name=None):
+    """
+    Load the eager PyTorch model, falling back to ViT. Returns (classifier, model_name).
+    An explicit model_id (a registry model) is loaded as is, without fallback.
+    """
+    if model_id is not None:
+        model_name = model_name or model_id
+        try:
+            classifier = backends.load_torch_backend(model_id, model_name)
+        except Exception as e:
+            logger.error("Model failed", extra={"model": model_name, "model_id": model_id, "error": str(e)})
+            return None, "Not loaded"
+        if verbose:
+            logger.info("Model loaded", extra={"model": model_name, "backend": "torch"})
+        return classifier, model_name
+    try:
+        classifier = backends.load_torch_backend(PRIMARY_MODEL_ID, PRIMARY_MODEL_NAME)
+        if verbose:
+            logger.info("Model loaded", extra={"model": PRIMARY_MODEL_NAME, "backend": "torch"})
+        return classifier, PRIMARY_MODEL_NAME
+    except Exception as e:
+        logger.warning("Primary model failed, trying fallback", extra={"model": PRIMARY_MODEL_NAME, "error": str(e)})
+        try:
+            classifier = backends.load_torch_backend(FALLBACK_MODEL_ID, FALLBACK_MODEL_NAME)
+            if verbose:
+                logger.info("Model loaded", extra={"model": FALLBACK_MODEL_NAME, "backend": "torch"})
+            return classifier, FALLBACK_MODEL_NAME
+        except Exception as e2:
+            logger.error("All models failed", extra={"error": str(e2)})
+            return None, "Not loaded"
+
+
+def load_classifier(verbose=True, backend=None, intra_op_threads=0, model_id=None, model_name=None):
+    """
+    Load the classifier on the configured backend. Returns (classifier, model_name).
+    Exported backends fall back to eager PyTorch if their artifact can't be loaded.
+    Exported artifacts are of the primary model, so an explicit model_id always runs eager.
+    """
+    backend = backend or INFERENCE_BACKEND
+    if backend != "torch" and model_id is None:
+        try:
+            classifier = backends.load_artifact_backend(backend, MODEL_ARTIFACT_DIR, intra_op_threads)
+            if verbose:
+                logger.info("Model loaded", extra={"model": classifier.model_name, "backend": backend})
+            return classifier, classifier.model_name
+        except Exception as e:
+            logger.warning("Backend failed, using eager PyTorch", extra={"backend": backend, "error": str(e)})
+    return load_eager_classifier(verbose, model_id, model_name)
+
+
+def model_labels(classifier):
+    """Class labels of the loaded model, indexed like its probability vectors"""
+    return classifier.labels
+
+
+def model_version(classifier):
+    """Best-effort version of the loaded weights (hub commit hash or model path, plus backend)"""
+    return classifier.version
+
+
+def model_fingerprint(classifier):
+    """Content hash of the loaded weights (keys evaluation reports; stable across hosts and paths)"""
+    return classifier.fingerprint()
+
+
+def predict_proba(classifier, images):
+    """
+    Normalize all images into one float32 batch and run a single forward pass.
+    `images` are uint8 arrays from Preprocessor.load (PIL images are also accepted).
+    Returns the full softmax vector of every image, shape (n_images, n_classes).
+    """
+    preprocessor = classifier.preprocessor
+    arrays = [preprocessor.to_array(im) if isinstance(im, Image.Image) else im for im in images]
+    logits = classifier.predict_logits(preprocessor.normalize_into(arrays))
+    return backends.softmax(logits)
+
+
+def predict_batch(classifier, images):
+    """
+    One forward pass returning a (probability vector, embedding) pair per image,
+    the unit of work of the micro-batcher. Embeddings are float16 (None if the
+    backend can't produce them, e.g. an artifact exported without them).
+    """
+    preprocessor = classifier.preprocessor
+    arrays = [preprocessor.to_array(im) if isinstance(im, Image.Image) else im for im in images]
+    logits, embeddings = classifier.predict_features(preprocessor.normalize_into(arrays))
+    probs = backends.softmax(logits)
+    if embeddings is None:
+        return [(p, None) for p in probs]
+    return list(zip(probs, embeddings.astype(np.float16)))
+
+
+def warm_up(classifier):
+    """Run one dummy inference so the first real request doesn't pay for lazy initialisation"""
+    predict_proba(classifier, [Image.new("RGB", (256, 256), (90, 140, 60))])
+
+
+AGGREGATION_STRATEGIES = ("mean", "max", "geometric")
+
+
+def aggregate_probabilities(probs, strategy="mean"):
+    """
+    Combine per-image probability vectors (n_images, n_classes) into one vector.
+
+    mean:      average probability per class
+    max:       strongest evidence any single image gave for each class
+    geometric: renormalised geometric mean (a class must be likely in every image)
+    """
+    probs = np.asarray(probs, dtype=np.float32)
+    if strategy == "mean":
+        return probs.mean(axis=0)
+    if strategy == "max":
+        return probs.max(axis=0)
+    if strategy == "geometric":
+        combined = np.exp(np.log(np.clip(probs, 1e-12, 1.0)).mean(axis=0))
+        return combined / combined.sum()
+    raise ValueError(f"Unknown aggregation strategy '{strategy}'")
+
+
+def top_k(scores, k=5):
+    """Indices of the k highest scores, best first"""
+    k = min(k, len(scores))
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+# --------------------
+# Process-pool workers
+# --------------------
+
+_worker_classifier = None
+
+
+def init_worker(torch_threads, cpu_sets, worker_counter):
+    """Process-pool initializer: pin the worker to its CPUs, limit torch threads and load a private model copy."""
+    global _worker_classifier
+
+    with worker_counter.get_lock():
+        worker_index = worker_counter.value
+        worker_counter.value += 1
+
+    if cpu_sets and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpu_sets[worker_index % len(cpu_sets)])
+
+    if torch_threads > 0 and INFERENCE_BACKEND != "onnx":
+        import torch
+        torch.set_num_threads(torch_threads)
+
+    _worker_classifier, _ = load_classifier(verbose=False, intra_op_threads=torch_threads)
+    if _worker_classifier is not None:
+        warm_up(_worker_classifier)
+
+
+def predict_batch_in_worker(images):
+    if _worker_classifier is None:
+        raise RuntimeError("Model not loaded in worker")
+    return predict_batch(_worker_classifier, images)
+
+
+def worker_ready():
+    """Used to warm up pool workers at startup"""
+    return _worker_classifier is not None
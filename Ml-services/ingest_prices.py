@@ -0,0 +1,217 @@
+"""
+Convert mandi price CSV dumps into the memory-mapped price store.
+
+    python ingest_prices.py data/agmarknet/*.csv
+    python ingest_prices.py prices_2023.csv prices_2024.csv --out /srv/agro/price_store
+
+Columns are found by name (case-insensitive, Agmarknet export headers work
+as-is): date (Arrival_Date / date), crop (Commodity / crop), market (Market /
+mandi), modal price (Modal_Price / price) and optionally State and District.
+Rows are streamed, so input size is bounded by the final column arrays
+(~14 bytes per row), not by the CSV text. The store is rebuilt from the
+given files and swapped in atomically; serve it with PRICE_STORE_DIR.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+import price_store
+
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_store")
+CHUNK_ROWS = 1_000_000
+
+COLUMN_ALIASES = {
+    "date": ("arrival_date", "price_date", "reported_date", "date"),
+    "crop": ("commodity", "crop"),
+    "market": ("market", "market_name", "mandi"),
+    "price": ("modal_price", "modal_x0020_price", "price"),
+    "state": ("state", "state_name"),
+    "district": ("district", "district_name"),
+}
+REQUIRED = ("date", "crop", "market", "price")
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d-%b-%Y", "%d %b %Y", "%m/%d/%Y")
+
+
+def _normalize(header):
+    return re.sub(r"[^a-z0-9]+", "_", header.lower()).strip("_")
+
+
+def find_columns(header):
+    """{field: column index} for the known fields present in a CSV header row"""
+    normalized = [_normalize(h) for h in header]
+    found = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            matches = [i for i, h in enumerate(normalized) if h == alias or h.startswith(alias + "_")]
+            if matches:
+                found[field] = matches[0]
+                break
+    missing = [f for f in REQUIRED if f not in found]
+    if missing:
+        raise ValueError(f"missing column(s) {', '.join(missing)} in header {header}")
+    return found
+
+
+class DateParser:
+    """Parses the handful of date formats seen in dumps; a dump has few distinct dates, so results are memoized"""
+
+    def __init__(self):
+        self._cache = {}
+        self._format = None
+
+    def __call__(self, text):
+        day = self._cache.get(text)
+        if day is None:
+            day = self._cache[text] = price_store.day_number(self._parse(text.strip()))
+        return day
+
+    def _parse(self, text):
+        formats = (self._format,) + DATE_FORMATS if self._format else DATE_FORMATS
+        for fmt in formats:
+            try:
+                value = datetime.strptime(text, fmt).date()
+            except ValueError:
+                continue
+            self._format = fmt
+            return value
+        raise ValueError(f"unrecognised date '{text}'")
+
+
+class Ingestor:
+    def __init__(self):
+        self.crops, self.crop_ids = [], {}
+        self.markets, self.market_ids = [], {}
+        self.parse_date = DateParser()
+        self.chunks = {name: [] for name in price_store.COLUMNS}
+        self.rows = 0
+        self.skipped = 0
+
+    def _crop(self, name):
+        key = name.strip().lower()
+        crop = self.crop_ids.get(key)
+        if crop is None:
+            crop = self.crop_ids[key] = len(self.crops)
+            self.crops.append(name.strip())
+        return crop
+
+    def _market(self, name, state, district):
+        key = (state.lower(), district.lower(), name.lower())
+        market = self.market_ids.get(key)
+        if market is None:
+            market = self.market_ids[key] = len(self.markets)
+            self.markets.append({"name": name, "state": state, "district": district})
+        return market
+
+    def add_file(self, path):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            cols = find_columns(next(reader))
+            state_col, district_col = cols.get("state"), cols.get("district")
+            buf = {name: [] for name in price_store.COLUMNS}
+            for row in reader:
+                try:
+                    price = float(row[cols["price"]])
+                    if not price > 0:
+                        raise ValueError("non-positive price")
+                    day = self.parse_date(row[cols["date"]])
+                    market = self._market(
+                        row[cols["market"]].strip(),
+                        row[state_col].strip() if state_col is not None else "",
+                        row[district_col].strip() if district_col is not None else "",
+                    )
+                    crop = self._crop(row[cols["crop"]])
+                except (ValueError, IndexError):
+                    self.skipped += 1
+                    continue
+                buf["date"].append(day)
+                buf["crop"].append(crop)
+                buf["market"].append(market)
+                buf["price"].append(price)
+                if len(buf["date"]) >= CHUNK_ROWS:
+                    self._flush(buf)
+            self._flush(buf)
+
+    def _flush(self, buf):
+        if not buf["date"]:
+            return
+        self.chunks["date"].append(np.array(buf["date"], dtype=np.int32))
+        self.chunks["crop"].append(np.array(buf["crop"], dtype=np.int16))
+        self.chunks["market"].append(np.array(buf["market"], dtype=np.int32))
+        self.chunks["price"].append(np.array(buf["price"], dtype=np.float32))
+        self.rows += len(buf["date"])
+        for values in buf.values():
+            values.clear()
+
+    def write(self, out, sources):
+        columns = {name: np.concatenate(chunks) if chunks else np.empty(0, dtype) for (name, chunks), dtype in
+                   zip(self.chunks.items(), (np.int32, np.int16, np.int32, np.float32))}
+        self.chunks = None
+        order = np.lexsort((columns["date"], columns["market"], columns["crop"]))
+        columns = {name: values[order] for name, values in columns.items()}
+
+        # One series per (crop, market): boundaries where either changes
+        key = (columns["crop"].astype(np.int64) << 32) | columns["market"]
+        starts = np.r_[0, np.flatnonzero(np.diff(key)) + 1] if len(key) else np.empty(0, np.int64)
+        stops = np.r_[starts[1:], len(key)] if len(key) else np.empty(0, np.int64)
+        series = np.stack([columns["crop"][starts], columns["market"][starts], starts, stops], axis=1).astype(np.int64)
+
+        tmp = f"{out}.tmp-{os.getpid()}"
+        os.makedirs(tmp)
+        for name, values in columns.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), values)
+        np.save(os.path.join(tmp, "series.npy"), series.reshape(-1, 4))
+        meta = {
+            "rows": int(len(key)),
+            "series": int(len(series)),
+            "crops": self.crops,
+            "markets": self.markets,
+            "first_date": price_store.day_string(columns["date"].min()) if len(key) else None,
+            "last_date": price_store.day_string(columns["date"].max()) if len(key) else None,
+            "sources": [os.path.abspath(s) for s in sources],
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        # Swap directories; running workers keep their mappings of the old files
+        old = None
+        if os.path.exists(out):
+            old = f"{out}.old-{os.getpid()}"
+            os.rename(out, old)
+        os.rename(tmp, out)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+        return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped price store from mandi price CSVs")
+    parser.add_argument("csv", nargs="+", help="CSV files (Agmarknet-style columns)")
+    parser.add_argument("--out", default=os.getenv("PRICE_STORE_DIR", DEFAULT_OUT), help="Store directory")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    ingestor = Ingestor()
+    for path in args.csv:
+        try:
+            ingestor.add_file(path)
+        except (OSError, ValueError, StopIteration) as e:
+            print(f"❌ {path}: {e}")
+            sys.exit(1)
+        print(f"📄 {path}: {ingestor.rows} rows so far ({ingestor.skipped} skipped)")
+
+    meta = ingestor.write(args.out, args.csv)
+    print(f"📦 {args.out}: {meta['rows']} rows, {len(meta['crops'])} crops, {len(meta['markets'])} markets, "
+          f"{meta['series']} series, {meta['first_date']} .. {meta['last_date']} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Asynchronous diagnosis jobs.
+
+Clients submit images and get a job ID back immediately; the diagnosis runs
+in a pool of background workers (highest priority first) and the result is
+persisted to SQLite so it can be polled, or long-polled, until it's done.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOB_PRIORITIES = {"high": 1, "normal": 5, "low": 9}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    image_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+)
+"""
+FINISHED_INDEX = "CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)"
+COLUMNS = ("id", "status", "priority", "image_count", "created_at", "started_at", "finished_at", "result", "error")
+
+
+class JobStore:
+    """SQLite persistence for job status and results (blocking; call via asyncio.to_thread)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._conn.execute(FINISHED_INDEX)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def create(self, job_id, priority, image_count):
+        self._execute(
+            "INSERT INTO jobs (id, status, priority, image_count, created_at) VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, priority, image_count, time.time())
+        )
+
+    def mark_running(self, job_id):
+        self._execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def mark_done(self, job_id, result):
+        self._execute(
+            "UPDATE jobs SET status = 'done', finished_at = ?, result = ? WHERE id = ?",
+            (time.time(), json.dumps(result), job_id)
+        )
+
+    def mark_failed(self, job_id, error):
+        self._execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+            (time.time(), error, job_id)
+        )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def recover(self, retention_seconds):
+        """On startup: fail jobs interrupted by a restart and purge expired ones"""
+        self._execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Interrupted by service restart' "
+            "WHERE status IN ('queued', 'running')",
+            (time.time(),)
+        )
+        self.purge(retention_seconds)
+
+    def purge(self, retention_seconds):
+        """Delete jobs that finished more than retention_seconds ago; returns how many"""
+        return self._execute("DELETE FROM jobs WHERE finished_at < ?", (time.time() - retention_seconds,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    Priority queue of diagnosis jobs drained by `workers` background tasks.
+
+    `process(payload)` is the coroutine that does the actual work and returns
+    a JSON-serialisable result; its exceptions are stored as the job error.
+    With retention_seconds, finished jobs older than that are purged every
+    purge_interval seconds.
+    """
+
+    def __init__(self, store, process, workers=2, max_queued=100, retention_seconds=None, purge_interval=3600.0):
+        self.store = store
+        self.process = process
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.purge_interval = purge_interval
+        self._queue = None
+        self._tasks = []
+        self._seq = itertools.count()
+        self._done_events = {}
+
+    @property
+    def queued(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def full(self):
+        return self.queued >= self.max_queued
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.retention_seconds is not None:
+            self._tasks.append(asyncio.create_task(self._purge_periodically()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, payload, image_count, priority="normal"):
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.store.create, job_id, priority, image_count)
+        self._done_events[job_id] = asyncio.Event()
+        await self._queue.put((JOB_PRIORITIES[priority], next(self._seq), job_id, payload))
+        return job_id
+
+    async def get(self, job_id, wait=0.0):
+        """Job record; with wait > 0, long-poll up to `wait` seconds for it to finish"""
+        event = self._done_events.get(job_id)
+        if wait > 0 and event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _worker(self):
+        while True:
+            _, _, job_id, payload = await self._queue.get()
+            try:
+                await asyncio.to_thread(self.store.mark_running, job_id)
+                result = await self.process(payload)
+                await asyncio.to_thread(self.store.mark_done, job_id, result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self.store.mark_failed, job_id, str(e) or type(e).__name__)
+            finally:
+                event = self._done_events.pop(job_id, None)
+                if event is not None:
+                    event.set()
+
+    async def _purge_periodically(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                purged = await asyncio.to_thread(self.store.purge, self.retention_seconds)
+            except sqlite3.Error as e:
+                logger.warning("Job purge failed", extra={"error": str(e)})
+                continue
+            if purged:
+                logger.info("Expired jobs purged", extra={"jobs": purged})
@@ -0,0 +1,186 @@
+"""
+Label -> diagnosis index.
+
+Built once when the model loads: every class label of the model (plus the
+PlantVillage class list) is parsed into plant / disease and resolved to an
+immutable disease-info record, so a prediction is a list lookup instead of
+string parsing and a scan over the disease database.
+
+Disease names are resolved to database keys by whole-word phrase matching,
+longest phrase first, so the result does not depend on dictionary order
+("northern_leaf_blight" wins over "leaf_blight", "black_rot" never matches
+"black_measles").
+
+Each disease-info record is also pre-encoded as a JSON fragment at build time,
+which diagnosis responses splice in as is (see response_encoding.py).
+"""
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Optional, Tuple
+
+from response_encoding import encode_info
+
+# Phrases used by other label sets for diseases that are in the database under another name
+DISEASE_ALIASES = {
+    "black_measles": "esca",
+    "isariopsis_leaf_spot": "leaf_blight",
+    "gray_leaf_spot": "cercospora_leaf_spot",
+    "two_spotted_spider_mite": "spider_mites",
+    "spider_mite": "spider_mites",
+    "mosaic_virus": "tomato_mosaic_virus",
+}
+
+
+def parse_disease_label(label):
+    """Parse PlantVillage format label (Plant___Disease) or fallback formats"""
+    # 1. Standard PlantVillage format
+    if "___" in label:
+        plant_raw, disease_raw = label.split("___")
+        plant = plant_raw.replace("_", " ").replace("(", "").replace(")", "").strip()
+        disease = disease_raw.replace("_", " ").replace("(", "").replace(")", "").strip()
+        if disease.lower() == "healthy":
+            return plant, "Healthy"
+        return plant, disease.title()
+
+    # 2. Fallback: Check if label starts with a known plant name
+    # Common plants in our DB
+    KNOWN_PLANTS = ["Apple", "Blueberry", "Cherry", "Corn", "Grape", "Orange", "Peach", "Pepper", "Potato", "Raspberry", "Rice", "Soybean", "Squash", "Strawberry", "Tomato", "Wheat"]
+    
+    clean_label = label.replace("_", " ").strip()
+    
+    for plant in KNOWN_PLANTS:
+        if clean_label.lower().startswith(plant.lower()):
+            # Extract logic: "Strawberry with Leaf Scorch" -> Plant: Strawberry, Disease: Leaf Scorch
+            disease_part = clean_label[len(plant):].strip()
+            
+            # Drop a qualifier right after the plant name: "Corn (Maize) with ..." -> "with ..."
+            disease_part = re.sub(r"^\([^)]*\)\s*", "", disease_part)
+
+            # Remove connecting words like "with", "leaf", "disease" if they start the string
+            # (Simple heuristic)
+            if disease_part.lower().startswith("with "):
+                disease_part = disease_part[5:].strip()
+            
+            if not disease_part:
+                return plant, "Healthy" if "healthy" in label.lower() else "Unknown Issue"
+                
+            return plant, disease_part.title()
+
+    return "Unknown", label.title()
+
+
+@dataclass(frozen=True)
+class DiseaseInfo:
+    key: Optional[str]  # database key, None for the generic fallback
+    severity: str
+    description: str
+    symptoms: Tuple[str, ...]
+    precautions: Tuple[str, ...]
+    recommendations: Tuple[str, ...]
+    treatment_plan: Tuple[Tuple[str, int], ...]  # (action, days_later)
+
+    @classmethod
+    def from_entry(cls, key, entry):
+        return cls(
+            key=key,
+            severity=entry["severity"],
+            description=entry["description"],
+            symptoms=tuple(entry["symptoms"]),
+            precautions=tuple(entry["precautions"]),
+            recommendations=tuple(entry["recommendations"]),
+            treatment_plan=tuple((step["action"], step["days_later"]) for step in entry.get("treatment_plan", [])),
+        )
+
+    @classmethod
+    def fallback(cls, disease_name):
+        return cls(
+            key=None,
+            severity="Unknown",
+            description=f"Disease: {disease_name}. Consult an expert.",
+            symptoms=("Visible plant stress",),
+            precautions=("Isolate affected plants",),
+            recommendations=("Take samples for lab analysis",),
+            treatment_plan=(),
+        )
+
+    @cached_property
+    def fragment(self):
+        """This record as encoded JSON object fields (bytes), spliced into diagnosis responses"""
+        return encode_info(self)
+
+
+@dataclass(frozen=True)
+class LabelEntry:
+    label: str
+    plant: str
+    disease: str
+    info: DiseaseInfo
+
+    @property
+    def mapped(self):
+        return self.info.key is not None
+
+
+def _words(text):
+    return tuple(w for w in re.split(r"[^a-z0-9]+", text.lower()) if w)
+
+
+def _contains(words, phrase):
+    n = len(phrase)
+    return any(words[i:i + n] == phrase for i in range(len(words) - n + 1))
+
+
+class DiseaseMatcher:
+    """Resolves free-text disease names to database keys (exact key, then longest phrase)"""
+
+    def __init__(self, database, aliases=DISEASE_ALIASES):
+        self.keys = frozenset(database)
+        phrases = {key: key for key in database}
+        phrases.update({alias: key for alias, key in aliases.items() if key in database})
+        # Longest phrase first; ties broken alphabetically so the order is fixed
+        self._phrases = sorted(((_words(p), key) for p, key in phrases.items()), key=lambda x: (-len(x[0]), x[0]))
+
+    def match(self, disease_name):
+        words = _words(disease_name)
+        if "_".join(words) in self.keys:
+            return "_".join(words)
+        for phrase, key in self._phrases:
+            if _contains(words, phrase):
+                return key
+        return None
+
+
+class LabelIndex:
+    """O(1) class id / label -> LabelEntry, built once per loaded model"""
+
+    def __init__(self, entries, by_label):
+        self.entries = entries        # indexed by class id
+        self.by_label = by_label      # every known label string
+        self.unmapped = sorted(label for label, e in by_label.items() if not e.mapped)
+        self.healthy_ids = tuple(i for i, e in enumerate(entries) if e.disease == "Healthy")
+
+    @classmethod
+    def build(cls, labels, database, parse_label, extra_labels=()):
+        matcher = DiseaseMatcher(database)
+        infos = {key: DiseaseInfo.from_entry(key, entry) for key, entry in database.items()}
+        by_label = {}
+        for label in list(labels) + list(extra_labels):
+            if label in by_label:
+                continue
+            plant, disease = parse_label(label)
+            key = matcher.match(disease)
+            info = infos[key] if key is not None else DiseaseInfo.fallback(disease)
+            by_label[label] = LabelEntry(label=label, plant=plant, disease=disease, info=info)
+        for entry in by_label.values():
+            entry.info.fragment  # encode once now, not on the first request for each disease
+        return cls(tuple(by_label[label] for label in labels), by_label)
+
+    def __getitem__(self, class_id):
+        return self.entries[class_id]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, label):
+        return self.by_label.get(label)
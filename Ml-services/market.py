@@ -0,0 +1,244 @@
+"""
+Market prices: analysis of real price history (price_store.PriceStore) when
+it has data for the crop, otherwise simulated prices.
+
+Simulation is vectorized over crops x locations x forecast days. All random
+draws for a request come from one `numpy.random.Generator` seeded per
+request, so a batch is reproducible from its seed and requests never share
+random state (unlike the module-global `random`).
+"""
+import hashlib
+import json
+import time
+
+import numpy as np
+
+import price_store
+
+BASE_PRICES = {
+    "wheat": 2200, "rice": 2800, "cotton": 6500, "sugarcane": 350,
+    "soybean": 4200, "maize": 2100, "potato": 1500, "tomato": 2500, "onion": 1800
+}
+DEFAULT_BASE_PRICE = 2500
+PRICE_UNIT = "₹/quintal"
+
+# Nearby markets compared against the local APMC: (name, distance km, premium range)
+NEARBY_MARKETS = (
+    ("Major City Mandi", 25, (0.02, 0.08)),
+    ("Export Zone", 60, (0.10, 0.15)),
+)
+LOCAL_MARKET_DISTANCE_KM = 5
+
+# Price-history analysis: days of history read, days that count as "recent" for the trend
+HISTORY_WINDOW_DAYS = 60
+TREND_RECENT_DAYS = 7
+# Days with data needed before a slope is fitted and extrapolated (fewer: flat forecast at the current price)
+MIN_SLOPE_OBSERVATIONS = 14
+NEARBY_MARKETS_SHOWN = 3
+
+# Markets considered (nearest first) before ranking by price net of transport
+NEARBY_CANDIDATES = 12
+
+
+def request_seed(crops, locations, horizons, day=None):
+    """Stable seed for a request: the same query on the same (UTC) day gives the same prices"""
+    day = day or time.strftime("%Y-%m-%d", time.gmtime())
+    key = json.dumps([crops, locations, horizons, day]).encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") >> 1
+
+
+def simulate(crops, locations, horizons, rng):
+    """
+    Prices for every (crop, location) pair in one pass.
+
+    Returns a dict of arrays: current (C, L), variation (C, L),
+    forecast (C, L, D) and daily change (C, L, D) with D = max(horizons),
+    and nearby (C, L, M) prices for NEARBY_MARKETS.
+    """
+    n_crops, n_locations, days = len(crops), len(locations), max(horizons)
+    base = np.array([BASE_PRICES.get(c.lower(), DEFAULT_BASE_PRICE) for c in crops], dtype=np.float64)
+
+    variation = rng.uniform(-0.1, 0.15, (n_crops, n_locations))
+    current = np.floor(base[:, None] * (1 + variation))
+
+    change = rng.uniform(-0.03, 0.05, (n_crops, n_locations, days))
+    forecast = np.floor(current[..., None] * np.cumprod(1 + change, axis=-1))
+
+    low = np.array([m[2][0] for m in NEARBY_MARKETS])
+    high = np.array([m[2][1] for m in NEARBY_MARKETS])
+    premium = rng.uniform(low, high, (n_crops, n_locations, len(NEARBY_MARKETS)))
+    nearby = np.floor(current[..., None] * (1 + premium))
+
+    return {"current": current, "variation": variation, "forecast": forecast, "change": change, "nearby": nearby}
+
+
+def batch_results(crops, locations, horizons, sim):
+    """Plain-dict results (one per crop x location) from `simulate` output"""
+    current = sim["current"].astype(np.int64)
+    forecast = sim["forecast"].astype(np.int64)
+    nearby = sim["nearby"].astype(np.int64)
+    bullish = sim["variation"] > 0
+    up = sim["change"] > 0
+    days = forecast.shape[-1]
+
+    # Per-horizon end price and % change, computed for all pairs at once
+    idx = np.asarray(horizons) - 1
+    horizon_price = forecast[..., idx]
+    horizon_change = np.round((horizon_price - current[..., None]) / current[..., None] * 100, 2)
+
+    # Convert to Python objects in bulk; the loop below only assembles dicts
+    current_l, forecast_l, nearby_l = current.tolist(), forecast.tolist(), nearby.tolist()
+    bullish_l, up_l = bullish.tolist(), up.tolist()
+    horizon_price_l, horizon_change_l = horizon_price.tolist(), horizon_change.tolist()
+    day_numbers = list(range(1, days + 1))
+
+    results = []
+    for i, crop in enumerate(crops):
+        for j, location in enumerate(locations):
+            price = current_l[i][j]
+            results.append({
+                "crop": crop.title(),
+                "location": location,
+                "current_price": price,
+                "unit": PRICE_UNIT,
+                "trend": "Bullish" if bullish_l[i][j] else "Bearish",
+                "trend_description": "Prices rising due to high demand" if bullish_l[i][j] else "Prices dropping due to supply surplus",
+                "forecast": [
+                    {"day": d, "predicted_price": p, "trend": "up" if u else "down"}
+                    for d, p, u in zip(day_numbers, forecast_l[i][j], up_l[i][j])
+                ],
+                "horizons": [
+                    {"days": h, "predicted_price": p, "change_pct": c}
+                    for h, p, c in zip(horizons, horizon_price_l[i][j], horizon_change_l[i][j])
+                ],
+                "nearby_markets": [{"market_name": f"{location} APMC", "price": price, "distance_km": LOCAL_MARKET_DISTANCE_KM}] + [
+                    {"market_name": name, "price": p, "distance_km": km}
+                    for (name, km, _), p in zip(NEARBY_MARKETS, nearby_l[i][j])
+                ],
+                "data_source": "simulated",
+            })
+    return results
+
+
+def history_batch_result(store, crop, location, horizons):
+    """A batch result from price history, in the same form as batch_results; None if the store has no data for the crop"""
+    history = analyze_history(store, crop, location, horizon=max(horizons))
+    if history is None:
+        return None
+    current = history["current_price"]
+    predicted = [f["predicted_price"] for f in history["forecast"]]
+    return {
+        "crop": crop.title(),
+        "location": location,
+        "unit": PRICE_UNIT,
+        **history,
+        "horizons": [
+            {"days": h, "predicted_price": predicted[h - 1], "change_pct": round((predicted[h - 1] - current) / current * 100, 2)}
+            for h in horizons
+        ],
+        "data_source": "price_history",
+    }
+
+
+def simulated_market_price(price, crop, market_name):
+    """Stable per-market premium of -5%..+12% around `price` (no random state involved)"""
+    digest = hashlib.blake2b(f"{crop.lower()}|{market_name.lower()}".encode(), digest_size=8).digest()
+    fraction = int.from_bytes(digest, "little") / 2 ** 64
+    return int(price * (1 - 0.05 + 0.17 * fraction))
+
+
+def rank_nearby(index, lat, lng, price_for, transport_cost_per_km, k=NEARBY_MARKETS_SHOWN, candidates=NEARBY_CANDIDATES):
+    """
+    The k best of the `candidates` nearest markets by price net of transport
+    (price - transport_cost_per_km * distance). price_for(market) returns a
+    price or None to skip the market.
+    """
+    ranked = []
+    for m, km in index.nearest(lat, lng, max(k, candidates)):
+        price = price_for(m)
+        if price is None:
+            continue
+        ranked.append({
+            "market_name": m["name"],
+            "price": int(price),
+            "distance_km": int(round(km)),
+            "net_price": int(price - transport_cost_per_km * km),
+        })
+    ranked.sort(key=lambda x: -x["net_price"])
+    return ranked[:k]
+
+
+def history_price_for(store, crop):
+    """price_for() for rank_nearby: each market's latest price in the store, None if it has none recently"""
+    crop_id = store.crop_id(crop)
+
+    def price_for(m):
+        market_id = store.market_id(m["name"], m.get("state"))
+        if crop_id is None or market_id is None:
+            return None
+        last = store.last_date(crop_id, [market_id])
+        if last is None:
+            return None
+        latest = store.latest_prices(crop_id, [market_id], since=last - TREND_RECENT_DAYS * 2 + 1)
+        return latest[market_id][1] if market_id in latest else None
+    return price_for
+
+
+def analyze_history(store, crop, location, horizon=7):
+    """
+    Current price, trend, linear forecast and best-paying markets from price
+    history. Reads only the last HISTORY_WINDOW_DAYS of the matching series.
+    Returns None if the store has no data for the crop at a market, district
+    or state named `location` (the caller then simulates prices).
+    """
+    crop_id = store.crop_id(crop)
+    if crop_id is None:
+        return None
+    markets = store.find_markets(crop_id, location)
+    last = store.last_date(crop_id, markets)
+    if last is None:
+        return None
+
+    days, prices = store.daily_mean(crop_id, markets, since=last - HISTORY_WINDOW_DAYS + 1)
+    current = float(prices[-1])
+    recent = days > last - TREND_RECENT_DAYS
+    if (~recent).any():
+        variation = float(prices[recent].mean() / prices[~recent].mean() - 1)
+        earlier_span = int(last - TREND_RECENT_DAYS - days[0] + 1)
+        trend = "Bullish" if variation > 0 else "Bearish"
+        trend_description = (f"Prices {'up' if variation > 0 else 'down'} {abs(variation) * 100:.1f}% "
+                             f"over the last {TREND_RECENT_DAYS} days vs the prior {earlier_span} days")
+    else:
+        trend = "Stable"
+        trend_description = f"Only {int(last - days[0] + 1)} days of price history, too few for a trend"
+
+    # Least-squares line over the window (x = days relative to the last observation), extrapolated;
+    # a short history gives a flat forecast rather than a line through a few noisy points
+    if len(days) >= MIN_SLOPE_OBSERVATIONS:
+        slope, intercept = np.polyfit((days - last).astype(np.float64), prices, 1)
+    else:
+        slope, intercept = 0.0, current
+    predicted = np.floor(intercept + slope * np.arange(1, horizon + 1)).astype(np.int64).tolist()
+    direction = "up" if slope > 0 else "down" if slope < 0 else "stable"
+    forecast = [{"day": d, "predicted_price": p, "trend": direction} for d, p in zip(range(1, horizon + 1), predicted)]
+
+    # Highest recent prices among other markets in the same state(s)
+    states = {store.markets[m].get("state", "") for m in markets}
+    chosen = set(markets)
+    others = [m for m in store.markets_for(crop_id) if m not in chosen and store.markets[m].get("state", "") in states]
+    latest = store.latest_prices(crop_id, others, since=last - TREND_RECENT_DAYS * 2 + 1)
+    best = sorted(latest.items(), key=lambda item: -item[1][1])[:NEARBY_MARKETS_SHOWN]
+
+    location_name = store.markets[markets[0]]["name"] if len(markets) == 1 else location
+    return {
+        "current_price": int(current),
+        "trend": trend,
+        "trend_description": trend_description,
+        "forecast": forecast,
+        "nearby_markets": [{"market_name": f"{location_name} (avg of {len(markets)} markets)" if len(markets) > 1 else location_name,
+                            "price": int(current), "distance_km": None}] + [
+            {"market_name": store.markets[m]["name"], "price": int(price), "distance_km": None}
+            for m, (_, price) in best
+        ],
+        "last_updated": price_store.day_string(last),
+    }
@@ -0,0 +1,66 @@
+"""
+Spatial index of market (APMC / mandi) locations for nearest-market lookup.
+
+Markets are loaded once from a CSV (name, state, district, lat, lng) and
+placed in a KD-tree over 3-D unit vectors. Straight-line (chord) distance
+between unit vectors is monotonic in great-circle distance, so the tree's
+k nearest are the haversine k nearest; distances are converted back to km.
+A query visits O(log n) nodes, never all markets.
+"""
+import csv
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_LOCATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "market_locations.csv")
+
+
+def unit_vectors(lat, lng):
+    lat, lng = np.radians(lat), np.radians(lng)
+    return np.stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)], axis=-1)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class MarketIndex:
+    def __init__(self, markets):
+        """markets: list of dicts with name, state, district, lat, lng"""
+        if not markets:
+            raise ValueError("MarketIndex needs at least one market")
+        self.markets = markets
+        coords = np.array([(m["lat"], m["lng"]) for m in markets], dtype=np.float64)
+        self._tree = cKDTree(unit_vectors(coords[:, 0], coords[:, 1]))
+
+    @classmethod
+    def load_csv(cls, path):
+        """Index of the markets in `path`, or None if the file doesn't exist"""
+        if not path or not os.path.exists(path):
+            return None
+        markets = []
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                markets.append({
+                    "name": row["name"].strip(),
+                    "state": row.get("state", "").strip(),
+                    "district": row.get("district", "").strip(),
+                    "lat": float(row["lat"]),
+                    "lng": float(row["lng"]),
+                })
+        return cls(markets)
+
+    def __len__(self):
+        return len(self.markets)
+
+    def nearest(self, lat, lng, k=10):
+        """[(market dict, distance km)] for the k markets closest to (lat, lng), nearest first"""
+        k = min(k, len(self.markets))
+        chord, idx = self._tree.query(unit_vectors(lat, lng), k=k)
+        chord, idx = np.atleast_1d(chord), np.atleast_1d(idx)
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+        return [(self.markets[i], float(d)) for i, d in zip(idx.tolist(), distance.tolist())]
@@ -0,0 +1,125 @@
+"""
+Prometheus metrics for the ML service, served at /metrics.
+
+Request-path metrics (per-stage histograms, in-flight gauges, batch sizes)
+are recorded as they happen; values owned by other components (model load
+timings, prediction cache counters, queue depths) are read at scrape time by
+`ServiceCollector`, so those components don't depend on this module.
+"""
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.routing import Match
+
+REGISTRY = CollectorRegistry()
+
+# Stage latencies are mostly milliseconds; forward passes on big batches reach seconds
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+REQUEST_SECONDS = Histogram(
+    "agro_request_duration_seconds", "HTTP request latency (handler + serialization)",
+    ["method", "route", "status"], buckets=STAGE_BUCKETS, registry=REGISTRY
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "agro_requests_in_flight", "Requests currently being handled", ["route"], registry=REGISTRY
+)
+STAGE_SECONDS = Histogram(
+    "agro_stage_duration_seconds", "Time spent per pipeline stage of a request (read, decode, resize, infer, aggregate, serialize)",
+    ["route", "stage"], buckets=STAGE_BUCKETS, registry=REGISTRY
+)
+BATCH_SIZE = Histogram(
+    "agro_inference_batch_size", "Images per forward pass", buckets=BATCH_SIZE_BUCKETS, registry=REGISTRY
+)
+BATCH_SECONDS = Histogram(
+    "agro_inference_batch_duration_seconds", "Wall time of one batched forward pass on the executor",
+    buckets=STAGE_BUCKETS, registry=REGISTRY
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "agro_admission_wait_seconds", "Time a request waited for admission before any work started (not part of its stages)",
+    ["lane"], buckets=STAGE_BUCKETS, registry=REGISTRY
+)
+ADMISSION_REJECTED = Counter(
+    "agro_admission_rejected", "Requests turned away with 429 (reason: full or timeout)", ["lane", "reason"], registry=REGISTRY
+)
+
+
+def route_template(request):
+    """Route path template ("/jobs/{job_id}") so label cardinality stays bounded"""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+def observe_stages(route, timings_ms):
+    for stage, ms in timings_ms.items():
+        STAGE_SECONDS.labels(route, stage).observe(ms / 1000)
+
+
+def observe_batch(size, seconds):
+    BATCH_SIZE.observe(size)
+    BATCH_SECONDS.observe(seconds)
+
+
+class ServiceCollector:
+    """
+    Scrape-time view of model, cache and queue state.
+
+    model:  ModelLoader (status, timings)
+    cache:  PredictionCache (stats())
+    queues: {name: zero-argument callable returning the current depth}
+    memory: zero-argument callable returning {rss, pss, shared, unique} bytes, or None
+    admission: AdmissionController (stats()), or None
+    """
+
+    def __init__(self, model, cache, queues, memory=None, admission=None):
+        self.model = model
+        self.cache = cache
+        self.queues = queues
+        self.memory = memory
+        self.admission = admission
+
+    def collect(self):
+        ready = GaugeMetricFamily("agro_model_ready", "1 once the model is loaded and warmed up")
+        ready.add_metric([], 1.0 if self.model.ready else 0.0)
+        yield ready
+
+        load = GaugeMetricFamily("agro_model_load_seconds", "Model startup time per step", labels=["step"])
+        for step, seconds in self.model.timings.items():
+            load.add_metric([step.removesuffix("_s")], seconds)
+        yield load
+
+        stats = self.cache.stats()
+        for name in ("hits", "misses", "evictions"):
+            counter = CounterMetricFamily(f"agro_prediction_cache_{name}", f"Prediction cache {name}")
+            counter.add_metric([], stats[name])
+            yield counter
+        entries = GaugeMetricFamily("agro_prediction_cache_entries", "Vectors held in the in-memory cache")
+        entries.add_metric([], stats["entries"])
+        yield entries
+
+        depth = GaugeMetricFamily("agro_queue_depth", "Work waiting per queue", labels=["queue"])
+        for name, get_depth in self.queues.items():
+            depth.add_metric([name], get_depth())
+        yield depth
+
+        if self.admission is not None:
+            stats = self.admission.stats()
+            for name, help_text in (("active", "Admitted requests running"), ("memory_in_use", "Estimated bytes held by admitted requests"),
+                                    ("memory_budget", "Memory budget for admitted requests, bytes")):
+                gauge = GaugeMetricFamily(f"agro_admission_{name}", help_text)
+                gauge.add_metric([], stats[name])
+                yield gauge
+
+        usage = self.memory() if self.memory is not None else None
+        if usage:
+            memory = GaugeMetricFamily("agro_process_memory_bytes", "Memory of this worker process by kind", labels=["kind"])
+            for kind, value in usage.items():
+                memory.add_metric([kind], value)
+            yield memory
+
+
+def render():
+    """(body, content type) for the /metrics response"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+
+import inference
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoader:
+    """
+    Loads the classifier in the background so the server can bind and serve
+    model-free endpoints immediately.
+
+    Progress goes not_started -> loading -> warming_up -> ready (or failed),
+    via "preloaded" when a pre-fork master loads the model (see serve.py);
+    `timings` records how long each step took, in seconds.
+    model_id / model_name load a specific model (e.g. a registry model)
+    instead of the configured primary one.
+    """
+
+    def __init__(self, intra_op_threads=0, index_builder=None, model_id=None, model_name=None):
+        self.intra_op_threads = intra_op_threads
+        self.model_id = model_id
+        self.requested_name = model_name
+        self.index_builder = index_builder  # labels -> lookup index, built once per load
+        self.status = "not_started"
+        self.classifier = None
+        self.model_name = "Not loaded"
+        self.labels = []
+        self.index = None
+        self.version = None
+        self.fingerprint = None
+        self.backend = inference.INFERENCE_BACKEND
+        self.error = None
+        self.timings = {}
+        self._started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    @property
+    def loaded(self):
+        return self.classifier is not None
+
+    def load(self, warm_up=True):
+        """
+        Import transformers, load the model on its backend and run a warm-up inference (blocking).
+
+        With warm_up=False the model is left "preloaded": no forward pass has run
+        (so no torch worker threads exist yet) and a pre-fork master can fork
+        workers that share its weights. load() in such a worker only warms up.
+        """
+        with self._lock:
+            if self.status == "preloaded":
+                self.status = "warming_up"
+            elif self.status not in ("not_started", "failed"):
+                return self.loaded
+            else:
+                self.status = "loading"
+        self._started_at = time.perf_counter()
+
+        try:
+            if self.classifier is None:
+                self._load_classifier()
+            if not warm_up:
+                self.status = "preloaded"
+                return True
+
+            self.status = "warming_up"
+            t0 = time.perf_counter()
+            inference.warm_up(self.classifier)
+            self.timings["warmup_s"] = round(time.perf_counter() - t0, 3)
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+            logger.exception("Model loading failed")
+            return False
+        return True
+
+    def _load_classifier(self):
+        t0 = time.perf_counter()
+        import transformers  # noqa: F401  (heavy import, timed separately)
+        self.timings["import_s"] = round(time.perf_counter() - t0, 3)
+
+        t0 = time.perf_counter()
+        classifier, model_name = inference.load_classifier(intra_op_threads=self.intra_op_threads,
+                                                           model_id=self.model_id, model_name=self.requested_name)
+        self.timings["load_s"] = round(time.perf_counter() - t0, 3)
+        if classifier is None:
+            raise RuntimeError("No model could be loaded")
+
+        labels = inference.model_labels(classifier)
+        index = self.index_builder(labels) if self.index_builder is not None else None
+        fingerprint = inference.model_fingerprint(classifier)
+
+        self.labels = labels
+        self.index = index
+        self.version = inference.model_version(classifier)
+        self.fingerprint = fingerprint
+        self.model_name = model_name
+        self.backend = classifier.name
+        self.classifier = classifier
+
+    def adopt(self, served):
+        """Point at another loaded version (a hot-swapped default model) so the old one can be freed"""
+        self.classifier = served.classifier
+        self.labels = served.labels
+        self.index = served.index
+        self.version = served.version
+        self.fingerprint = served.fingerprint
+        self.model_name = served.model_name
+        self.backend = served.backend
+
+    def mark_ready(self):
+        """Called once everything depending on the model (executor, batcher) is up"""
+        self.timings["total_s"] = round(time.perf_counter() - self._started_at, 3)
+        self.status = "ready"
+        logger.info("Model ready", extra={"model": self.model_name, "backend": self.backend, **self.timings})
+
+    def mark_failed(self, error):
+        self.error = str(error)
+        self.status = "failed"
+        logger.error("Model startup failed", extra={"error": self.error})
@@ -0,0 +1,257 @@
+"""
+Registry of the models the service can serve.
+
+    default   the model loaded at startup (PlantVillage MobileNet); always resident
+    others    crop-specialised models listed in MODEL_REGISTRY_PATH, loaded on
+              first use and evicted least-recently-used once the resident
+              models' weights exceed the RAM budget
+
+    {"models": [{"name": "rice-wheat", "model_id": "<hub id or local dir>",
+                 "display_name": "Rice & Wheat ViT", "crops": ["Rice", "Wheat"]}]}
+
+A request is routed by explicit model name or by crop, and acquire() holds
+the version it got for the whole request. swap() loads a new version next
+to the old one and replaces it in a single assignment on the event loop:
+new requests get the new version, requests already holding the old one
+finish on it, and the old one is closed when the last of them is done.
+Evicted models are closed the same way. Until then they still hold their
+memory, so the budget can be exceeded briefly.
+
+How a model is opened and closed (loader, micro-batcher, case index) is up
+to the app; the registry only decides which models are resident. Single
+event loop only, like the admission controller.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ModelUnavailable(RuntimeError):
+    """A registry model could not be loaded"""
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    name: str
+    model_id: Optional[str] = None  # None: the configured primary model (default entry)
+    display_name: Optional[str] = None
+    crops: Tuple[str, ...] = ()
+
+
+def load_specs(path):
+    """Registry models from a JSON file; [] if there is none"""
+    try:
+        with open(path) as f:
+            entries = json.load(f)["models"]
+    except FileNotFoundError:
+        return []
+    return [ModelSpec(name=e["name"], model_id=e["model_id"], display_name=e.get("display_name"),
+                      crops=tuple(e.get("crops", ()))) for e in entries]
+
+
+class ServedModel:
+    """
+    One loaded version of a registry model, plus what serving it needs.
+    Takes its own reference to everything the loader loaded, so it keeps
+    serving this version even if the loader moves on to another one.
+    """
+
+    def __init__(self, spec, loader, batcher, case_index=None):
+        self.spec = spec
+        self.classifier = loader.classifier
+        self.labels = loader.labels
+        self.index = loader.index
+        self.model_name = loader.model_name
+        self.version = loader.version
+        self.fingerprint = loader.fingerprint
+        self.backend = loader.backend
+        self.batcher = batcher
+        self.case_index = case_index  # past scans of this model version (similar cases), or None
+        self.size_bytes = self.classifier.size_bytes()
+        self.hits = 0
+        self.in_flight = 0
+        self.loaded_at = time.time()
+        self.last_used = time.monotonic()
+        self.retired = False
+
+    @property
+    def name(self):
+        return self.spec.name
+
+    def info(self):
+        return {
+            "name": self.name,
+            "model": self.model_name,
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "backend": self.backend,
+            "crops": list(self.spec.crops),
+            "size_mb": round(self.size_bytes / 2 ** 20, 1),
+            "hits": self.hits,
+            "in_flight": self.in_flight,
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """
+    open_model(spec) -> ServedModel (async, loads + starts it) and
+    close_model(served) (async, stops it) are supplied by the app.
+    """
+
+    def __init__(self, specs, budget_bytes, open_model, close_model):
+        self.specs = {spec.name: spec for spec in specs}
+        self.budget_bytes = budget_bytes
+        self.open_model = open_model
+        self.close_model = close_model
+        self.default_name = None
+        self.loads = 0
+        self.evictions = 0
+        self.swaps = 0
+        self._resident = OrderedDict()  # name -> ServedModel, least recently used first
+        self._loading = {}              # name -> task, so concurrent first requests load once
+        self._swap_lock = asyncio.Lock()
+
+    def set_default(self, served):
+        """Register the startup model; it is never evicted"""
+        self.default_name = served.name
+        self.specs[served.name] = served.spec
+        self._resident[served.name] = served
+
+    @property
+    def default(self):
+        return self._resident.get(self.default_name)
+
+    @property
+    def resident(self):
+        return list(self._resident.values())
+
+    @property
+    def resident_bytes(self):
+        return sum(served.size_bytes for served in self._resident.values())
+
+    def route(self, model=None, crop=None):
+        """Name of the model for a request: explicit name, else a model specialised in the crop, else the default"""
+        if model:
+            if model not in self.specs:
+                raise KeyError(model)
+            return model
+        if crop:
+            crop = crop.strip().lower()
+            for spec in self.specs.values():
+                if any(c.lower() == crop for c in spec.crops):
+                    return spec.name
+        return self.default_name
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, name):
+        """The current version of `name` (loaded if needed), held until the block exits"""
+        served = await self._get(name)
+        served.in_flight += 1
+        served.hits += 1
+        served.last_used = time.monotonic()
+        if self._resident.get(name) is served:
+            self._resident.move_to_end(name)
+        try:
+            yield served
+        finally:
+            served.in_flight -= 1
+            if served.retired and served.in_flight == 0:
+                await self._close(served)
+
+    async def _get(self, name):
+        served = self._resident.get(name)
+        if served is not None:
+            return served
+        if name not in self.specs:
+            raise KeyError(name)
+        task = self._loading.get(name)
+        if task is None:
+            task = self._loading[name] = asyncio.ensure_future(self._load(self.specs[name]))
+            task.add_done_callback(lambda _: self._loading.pop(name, None))
+        try:
+            return await asyncio.shield(task)
+        except Exception as e:
+            raise ModelUnavailable(f"Model '{name}' could not be loaded: {e}") from e
+
+    async def _load(self, spec):
+        t0 = time.perf_counter()
+        served = await self.open_model(spec)
+        if spec.name in self._resident:  # swapped in while this load ran
+            await self._close(served)
+            return self._resident[spec.name]
+        self.loads += 1
+        self._resident[spec.name] = served
+        logger.info("Registry model loaded", extra={"model": spec.name, "size_mb": round(served.size_bytes / 2 ** 20, 1),
+                                                     "seconds": round(time.perf_counter() - t0, 2)})
+        await self._evict(keep=spec.name)
+        return served
+
+    async def _evict(self, keep):
+        """Retire least recently used models until the resident weights fit in the budget"""
+        for name in list(self._resident):
+            if self.resident_bytes <= self.budget_bytes:
+                return
+            if name in (keep, self.default_name):
+                continue
+            served = self._resident.pop(name)
+            self.evictions += 1
+            logger.info("Registry model evicted", extra={"model": name, "hits": served.hits, "in_flight": served.in_flight})
+            await self._retire(served)
+
+    async def _retire(self, served):
+        served.retired = True
+        if served.in_flight == 0:
+            await self._close(served)
+
+    async def _close(self, served):
+        try:
+            await self.close_model(served)
+        except Exception:
+            logger.exception("Closing a retired model failed", extra={"model": served.name})
+
+    async def swap(self, name, model_id=None):
+        """
+        Load a new version of `name` (model_id: from another source, else reload
+        the same one) and switch new requests to it. Returns the new ServedModel.
+        """
+        if name not in self.specs:
+            raise KeyError(name)
+        async with self._swap_lock:
+            spec = replace(self.specs[name], model_id=model_id) if model_id else self.specs[name]
+            new = await self.open_model(spec)
+            old = self._resident.get(name)
+            self.specs[name] = spec
+            self._resident[name] = new
+            self._resident.move_to_end(name)
+            self.swaps += 1
+            logger.info("Registry model swapped", extra={
+                "model": name, "old_version": old.version if old else None, "new_version": new.version,
+                "old_in_flight": old.in_flight if old else 0,
+            })
+            if old is not None:
+                await self._retire(old)
+            await self._evict(keep=name)
+        return new
+
+    async def close(self):
+        for served in list(self._resident.values()):
+            await self._close(served)
+        self._resident.clear()
+
+    def stats(self):
+        return {
+            "budget_mb": round(self.budget_bytes / 2 ** 20, 1),
+            "resident_mb": round(self.resident_bytes / 2 ** 20, 1),
+            "available": sorted(self.specs),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "swaps": self.swaps,
+        }
@@ -0,0 +1,278 @@
+"""
+Regional outbreak counters, updated as diagnoses come out.
+
+Every located diagnosis increments one counter row keyed by (region, crop,
+disease), where the region is the geohash of the scan's location at a fixed
+precision (5 = cells of about 5 x 5 km). A row is a ring buffer of
+`buckets` time buckets (uint32 counts). Advancing the clock only clears the
+slots that are reused, so recording is O(1) and a region query sums that
+region's rows in O(rows x buckets). The diagnosis history is never read.
+
+Healthy scans are counted too (disease "Healthy"), so rates are
+diseased / all scans.
+
+Counters live in memory and are snapshotted to an .npz file (atomic
+replace) every few minutes and at shutdown, then restored at startup. With
+several worker processes (serve.py) each worker keeps and snapshots its own
+counters, and queries add in the other workers' latest snapshots.
+"""
+import glob
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+HEALTHY = "Healthy"
+
+
+def geohash(lat, lng, precision=5):
+    """Standard base-32 geohash of a point"""
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            value = value * 2 + (lng >= mid)
+            lng_lo, lng_hi = (mid, lng_hi) if lng >= mid else (lng_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            value = value * 2 + (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def geohash_center(cell):
+    """(lat, lng) of the centre of a geohash cell"""
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                lng_lo, lng_hi = (mid, lng_hi) if bit else (lng_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return (lat_lo + lat_hi) / 2, (lng_lo + lng_hi) / 2
+
+
+def is_geohash(text):
+    return bool(text) and all(c in GEOHASH_ALPHABET for c in text)
+
+
+class OutbreakCounters:
+    def __init__(self, bucket_seconds=3600, buckets=24 * 28, precision=5, initial_rows=256):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.precision = precision
+        self.counts = np.zeros((initial_rows, buckets), dtype=np.uint32)
+        self.keys = []                      # row -> (region, crop, disease)
+        self.rows = {}                      # (region, crop, disease) -> row
+        self.by_region = defaultdict(list)  # region -> rows
+        self.head = None                    # absolute number of the newest bucket
+        self.recorded = 0
+
+    def bucket(self, timestamp=None):
+        return int((time.time() if timestamp is None else timestamp) // self.bucket_seconds)
+
+    def _advance(self, bucket):
+        """Move the ring to `bucket`, clearing the slots of the buckets skipped over"""
+        if self.head is None:
+            self.head = bucket
+            return
+        steps = bucket - self.head
+        if steps <= 0:
+            return
+        n = len(self.keys)
+        if steps >= self.buckets:
+            self.counts[:n] = 0
+        else:
+            slots = [(self.head + i) % self.buckets for i in range(1, steps + 1)]
+            self.counts[:n, slots] = 0
+        self.head = bucket
+
+    def _row(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.counts):
+                grown = np.zeros((2 * row, self.buckets), dtype=np.uint32)
+                grown[:row] = self.counts
+                self.counts = grown
+            self.keys.append(key)
+            self.rows[key] = row
+            self.by_region[key[0]].append(row)
+        return row
+
+    def record(self, lat, lng, crop, disease, timestamp=None, count=1):
+        bucket = self.bucket(timestamp)
+        self._advance(bucket)
+        if bucket <= self.head - self.buckets:
+            return  # older than the window
+        row = self._row((geohash(lat, lng, self.precision), crop, disease))
+        self.counts[row, bucket % self.buckets] += count
+        self.recorded += count
+
+    def region_series(self, prefix, now_bucket):
+        """
+        {(crop, disease): counts per bucket, oldest first, newest = now_bucket}
+        for every cell of the region (a geohash of at most `precision` characters).
+        """
+        if self.head is None:
+            return {}
+        regions = [prefix] if len(prefix) == self.precision else [r for r in self.by_region if r.startswith(prefix)]
+        rows = [row for region in regions for row in self.by_region.get(region, ())]
+        if not rows:
+            return {}
+        order = (np.arange(self.head + 1, self.head + 1 + self.buckets)) % self.buckets
+        series = self.counts[np.ix_(rows, order)]  # ending at self.head
+        lag = now_bucket - self.head              # buckets since these counters last advanced (peer snapshots)
+        if lag > 0:
+            series = np.concatenate([series[:, lag:], np.zeros((len(rows), min(lag, self.buckets)), dtype=np.uint32)], axis=1)
+        elif lag < 0:                             # a peer already past now_bucket: drop its newer buckets
+            series = np.concatenate([np.zeros((len(rows), min(-lag, self.buckets)), dtype=np.uint32), series[:, :lag]], axis=1)
+        merged = {}
+        for row, counts in zip(rows, series):
+            _, crop, disease = self.keys[row]
+            merged[(crop, disease)] = merged.get((crop, disease), 0) + counts
+        return merged
+
+    # Snapshots
+
+    def snapshot(self):
+        """Copy of the state, taken where the counters are updated and written elsewhere with save_snapshot()"""
+        n = len(self.keys)
+        return {
+            "counts": self.counts[:n].copy(),
+            "keys": np.array(json.dumps(self.keys)),
+            "meta": np.array([self.bucket_seconds, self.buckets, self.precision, -1 if self.head is None else self.head]),
+        }
+
+    @classmethod
+    def load(cls, path, bucket_seconds=3600, buckets=24 * 28, precision=5):
+        """Counters restored from a snapshot, or empty ones if there is none or it doesn't match the layout"""
+        counters = cls(bucket_seconds, buckets, precision)
+        try:
+            with np.load(path) as snapshot:
+                meta = snapshot["meta"].tolist()
+                counts = snapshot["counts"]
+                keys = [tuple(k) for k in json.loads(str(snapshot["keys"]))]
+        except FileNotFoundError:
+            return counters
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Outbreak snapshot unreadable, starting empty", extra={"path": path, "error": str(e)})
+            return counters
+        if meta[:3] != [bucket_seconds, buckets, precision]:
+            logger.warning("Outbreak snapshot has another bucket layout, starting empty", extra={"path": path})
+            return counters
+        for key in keys:
+            counters._row(key)
+        counters.counts[:len(keys)] = counts
+        counters.head = None if meta[3] < 0 else meta[3]
+        counters.recorded = int(counts.sum())
+        return counters
+
+
+def save_snapshot(path, snapshot):
+    """Write a snapshot as .npz (atomic replace)"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **snapshot)
+    os.replace(tmp_path, path)
+
+
+class PeerSnapshots:
+    """Latest snapshots of the other worker processes' counters, re-read when their files change"""
+
+    def __init__(self, pattern, own_path, **layout):
+        self.pattern = pattern
+        self.own_path = os.path.abspath(own_path)
+        self.layout = layout
+        self._cache = {}  # path -> (mtime, counters)
+
+    def counters(self):
+        peers = []
+        for path in glob.glob(self.pattern):
+            if os.path.abspath(path) == self.own_path:
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            cached = self._cache.get(path)
+            if cached is None or cached[0] != mtime:
+                cached = self._cache[path] = (mtime, OutbreakCounters.load(path, **self.layout))
+            peers.append(cached[1])
+        return peers
+
+
+def region_report(series, bucket_seconds, windows_hours=(24, 24 * 7, 24 * 28), recent_hours=24 * 7, min_cases=3, top=5):
+    """
+    Rolling counts, rates and emerging diseases from {(crop, disease): per-bucket counts}.
+
+    growth compares the last `recent_hours` with the rest of the window (scaled
+    to the same length): (recent + 1) / (expected + 1). A disease is emerging
+    when it has at least min_cases recent cases and grows (growth > 1).
+    """
+    if not series:
+        return {"windows": {}, "diseases": [], "emerging": [], "daily": []}
+    keys = list(series)
+    counts = np.stack([series[k] for k in keys]).astype(np.int64)
+    diseased = np.array([disease != HEALTHY for _, disease in keys])
+    per_hour = 3600 / bucket_seconds
+
+    def last(hours):
+        return counts[:, -max(1, int(hours * per_hour)):].sum(axis=1)
+
+    windows = {}
+    for hours in windows_hours:
+        totals = last(hours)
+        scans, sick = int(totals.sum()), int(totals[diseased].sum())
+        windows[f"{hours}h" if hours < 48 else f"{hours // 24}d"] = {
+            "scans": scans, "diseased": sick, "disease_rate": round(sick / scans, 4) if scans else 0.0,
+        }
+
+    recent = last(recent_hours)
+    window_total = counts.sum(axis=1)
+    recent_buckets = min(counts.shape[1], int(recent_hours * per_hour))
+    baseline_buckets = counts.shape[1] - recent_buckets
+    expected = (window_total - recent) * (recent_buckets / baseline_buckets) if baseline_buckets else np.zeros(len(keys))
+    growth = (recent + 1) / (expected + 1)
+    recent_scans = int(recent.sum())
+
+    diseases = []
+    for i in np.argsort(-window_total):
+        if not diseased[i] or window_total[i] == 0:
+            continue
+        crop, disease = keys[i]
+        diseases.append({
+            "crop": crop,
+            "disease": disease,
+            "cases": int(window_total[i]),
+            "recent_cases": int(recent[i]),
+            "recent_rate": round(int(recent[i]) / recent_scans, 4) if recent_scans else 0.0,
+            "growth": round(float(growth[i]), 2),
+        })
+    emerging = sorted((d for d in diseases if d["recent_cases"] >= min_cases and d["growth"] > 1.0),
+                      key=lambda d: (-d["growth"], -d["recent_cases"]))[:top]
+
+    # Diseased scans per day, oldest first (the window's trailing days)
+    per_day = max(1, int(24 * per_hour))
+    sick = counts[diseased].sum(axis=0)
+    days = len(sick) // per_day
+    daily = sick[len(sick) - days * per_day:].reshape(days, per_day).sum(axis=1).tolist()
+    return {"windows": windows, "diseases": diseases, "emerging": emerging, "daily": daily}
@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """
+    Content-addressed cache of per-image probability vectors.
+
+    Keys are a fast hash of the raw upload bytes plus the model name and
+    version, so re-uploads and client retries skip decoding and inference
+    entirely while a model change never serves stale vectors. Entries live
+    in a bounded in-memory LRU with a TTL; if `disk_dir` is set, vectors are
+    also written there as .npy files so the cache survives restarts.
+    """
+
+    def __init__(self, max_entries=2048, ttl_seconds=3600.0, disk_dir=None):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl_seconds
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (stored_at, probs)
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(contents, model_name, model_version):
+        h = hashlib.blake2b(contents, digest_size=16)
+        h.update(f"\0{model_name}\0{model_version}".encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, probs = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return probs
+                del self._entries[key]
+                self.evictions += 1
+
+        probs = self._read_disk(key, now)
+        with self._lock:
+            if probs is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._insert(key, probs, now)
+        return probs
+
+    def put(self, key, probs):
+        if not self.enabled:
+            return
+        probs = np.asarray(probs, dtype=np.float32)
+        probs.setflags(write=False)
+        now = time.time()
+        with self._lock:
+            self._insert(key, probs, now)
+        self._write_disk(key, probs)
+
+    def _insert(self, key, probs, now):
+        self._entries[key] = (now, probs)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # On-disk tier
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npy")
+
+    def _read_disk(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if now - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            probs = np.load(path)
+        except (OSError, ValueError):
+            return None
+        probs.setflags(write=False)
+        return probs
+
+    def _write_disk(self, key, probs):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, probs)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Prediction cache write failed", extra={"error": str(e)})
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_tier": bool(self.disk_dir),
+        }
@@ -0,0 +1,219 @@
+"""
+Image decoding and preprocessing, replacing the Hugging Face image processor
+on the serving path.
+
+Two stages:
+
+1. `Preprocessor.load(contents)` (per image, runs in the inference executor):
+   decode with JPEG draft mode so large photos are decoded at a reduced
+   scale, resize the shortest edge and center-crop to the model input, and
+   return a small uint8 (H, W, 3) array plus per-stage timings.
+2. `Preprocessor.normalize_into(arrays)` (per batch): rescale + normalize
+   all arrays straight into a preallocated float32 (N, 3, H, W) buffer.
+
+Clients that resize on the device can skip stage 1 and upload model inputs
+as a raw tensor: a 12-byte header followed by the uint8 pixels, which
+`Preprocessor.unpack_tensors` wraps as arrays without copying.
+
+    magic "AGT1" | count u16 | height u16 | width u16 | channels u8 (3) | dtype u8 (0 = uint8)
+    pixels: count x height x width x 3 bytes, RGB, row-major (all little-endian)
+"""
+import io
+import struct
+import threading
+import time
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+
+TENSOR_MAGIC = b"AGT1"
+TENSOR_HEADER = struct.Struct("<4sHHHBB")
+TENSOR_DTYPE_UINT8 = 0
+
+
+class ImageError(ValueError):
+    """The upload isn't a usable image (corrupt, unsupported or too large)"""
+
+
+def pack_tensors(arrays):
+    """uint8 (H, W, 3) arrays of one size -> raw tensor upload body (the client side of unpack_tensors)"""
+    batch = np.ascontiguousarray(np.stack(arrays), dtype=np.uint8)
+    count, height, width, channels = batch.shape
+    return TENSOR_HEADER.pack(TENSOR_MAGIC, count, height, width, channels, TENSOR_DTYPE_UINT8) + batch.tobytes()
+
+
+def _size_get(size, key):
+    if size is None:
+        return None
+    return size.get(key) if hasattr(size, "get") else getattr(size, key, None)
+
+
+class Preprocessor:
+    def __init__(self, shortest_edge=256, crop_size=(224, 224), resize_to=None,
+                 mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5), rescale_factor=1 / 255,
+                 resample=Image.BILINEAR, max_pixels=50_000_000):
+        if crop_size is None and resize_to is None:
+            crop_size = (shortest_edge, shortest_edge)
+        self.shortest_edge = shortest_edge
+        self.crop_size = crop_size      # (height, width) after center crop, None = no crop
+        self.resize_to = resize_to      # (height, width) direct resize, used when there's no shortest edge
+        self.resample = resample
+        self.max_pixels = max_pixels
+        self.output_size = crop_size or resize_to
+        # (x * rescale - mean) / std folded into one multiply-add per channel
+        std = np.asarray(std, dtype=np.float32)
+        self._scale = (rescale_factor / std).astype(np.float32).reshape(3, 1, 1)
+        self._bias = (-np.asarray(mean, dtype=np.float32) / std).astype(np.float32).reshape(3, 1, 1)
+        self._local = threading.local()
+
+    @classmethod
+    def from_image_processor(cls, image_processor, **kwargs):
+        """Build from a Hugging Face image processor so settings match the model's training"""
+        p = image_processor
+        shortest_edge = _size_get(p.size, "shortest_edge")
+        crop_size = None
+        if getattr(p, "do_center_crop", False) and p.crop_size is not None:
+            crop_size = (_size_get(p.crop_size, "height"), _size_get(p.crop_size, "width"))
+        resize_to = None
+        if shortest_edge is None:
+            resize_to = (_size_get(p.size, "height"), _size_get(p.size, "width"))
+        mean = p.image_mean if getattr(p, "do_normalize", True) else (0.0, 0.0, 0.0)
+        std = p.image_std if getattr(p, "do_normalize", True) else (1.0, 1.0, 1.0)
+        rescale = p.rescale_factor if getattr(p, "do_rescale", True) else 1.0
+        return cls(
+            shortest_edge=shortest_edge, crop_size=crop_size, resize_to=resize_to,
+            mean=mean, std=std, rescale_factor=rescale, resample=int(p.resample), **kwargs
+        )
+
+    def __getstate__(self):
+        # Sent to process-pool workers; the thread-local buffer stays behind
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    # Stage 1: decode + resize + crop (per image)
+
+    def _target_size(self, width, height):
+        """Size (w, h) the image is resized to before cropping"""
+        if self.shortest_edge is None:
+            return self.resize_to[1], self.resize_to[0]
+        # Same rounding as the Hugging Face processors (long edge truncated)
+        if width <= height:
+            return self.shortest_edge, int(self.shortest_edge * height / width)
+        return int(self.shortest_edge * width / height), self.shortest_edge
+
+    def decode(self, contents, target_size=None):
+        """
+        Decode bytes into an RGB image no (much) larger than needed for the model input.
+        target_size(width, height) -> (w, h) overrides the size needed (e.g. for tiling).
+        """
+        try:
+            image = Image.open(io.BytesIO(contents))
+        except UnidentifiedImageError as e:
+            raise ImageError("Unsupported or corrupt image file") from e
+        width, height = image.size
+        if width * height > self.max_pixels:
+            raise ImageError(f"Image is {width}x{height}, larger than the {self.max_pixels} pixel limit")
+
+        if image.format == "JPEG":
+            # JPEG draft mode decodes directly at 1/2, 1/4 or 1/8 scale (never below the requested size)
+            image.draft("RGB", (target_size or self._target_size)(width, height))
+        try:
+            return image.convert("RGB")
+        except Exception as e:
+            raise ImageError(f"Cannot decode image: {e}") from e
+
+    def decoded_bytes(self, fileobj):
+        """
+        Estimated size of the decoded RGB image, from the header only (the file
+        position is restored); 0 if the header can't be read. JPEGs are decoded
+        at a draft scale, so they cost less than width x height.
+        """
+        position = fileobj.tell()
+        try:
+            with Image.open(fileobj) as image:
+                (width, height), fmt = image.size, image.format
+        except Exception:
+            return 0
+        finally:
+            fileobj.seek(position)
+        scale = 1
+        if fmt == "JPEG":
+            target_w, target_h = self._target_size(width, height)
+            while scale < 8 and width // (2 * scale) >= target_w and height // (2 * scale) >= target_h:
+                scale *= 2
+        return (width // scale) * (height // scale) * 3
+
+    def to_array(self, image):
+        """Resize + center-crop a decoded image to a uint8 (H, W, 3) model input"""
+        target_w, target_h = self._target_size(*image.size)
+        if image.size != (target_w, target_h):
+            image = image.resize((target_w, target_h), self.resample)
+        if self.crop_size is not None:
+            crop_h, crop_w = self.crop_size
+            left = max(0, (target_w - crop_w) // 2)
+            top = max(0, (target_h - crop_h) // 2)
+            image = image.crop((left, top, left + crop_w, top + crop_h))
+        return np.asarray(image, dtype=np.uint8)
+
+    def load(self, contents):
+        """Bytes -> uint8 model input. Returns (array, {stage: milliseconds})."""
+        t0 = time.perf_counter()
+        image = self.decode(contents)
+        t1 = time.perf_counter()
+        array = self.to_array(image)
+        t2 = time.perf_counter()
+        return array, {"decode": (t1 - t0) * 1000, "resize": (t2 - t1) * 1000}
+
+    def unpack_tensors(self, body, max_count=None):
+        """
+        Raw tensor upload -> read-only uint8 (N, H, W, 3) view of `body` (no copy).
+        The size must be exactly the model input: the client did the resize + crop.
+        """
+        if len(body) < TENSOR_HEADER.size:
+            raise ImageError("Tensor upload is shorter than its header")
+        magic, count, height, width, channels, dtype = TENSOR_HEADER.unpack_from(body)
+        if magic != TENSOR_MAGIC:
+            raise ImageError("Not a tensor upload (bad magic)")
+        if dtype != TENSOR_DTYPE_UINT8 or channels != 3:
+            raise ImageError("Tensor upload must be uint8 RGB (3 channels)")
+        if (height, width) != tuple(self.output_size):
+            raise ImageError(f"Tensor upload must be {self.output_size[0]}x{self.output_size[1]}, got {height}x{width}")
+        if not 1 <= count <= (max_count or 0xFFFF):
+            raise ImageError(f"Tensor upload holds {count} images, 1 to {max_count or 0xFFFF} allowed")
+        expected = TENSOR_HEADER.size + count * height * width * 3
+        if len(body) != expected:
+            raise ImageError(f"Tensor upload is {len(body)} bytes, expected {expected}")
+        batch = np.frombuffer(body, dtype=np.uint8, offset=TENSOR_HEADER.size).reshape(count, height, width, 3)
+        batch.setflags(write=False)  # frombuffer over a bytearray is writable
+        return batch
+
+    # Stage 2: normalize a whole batch into a preallocated buffer
+
+    def _buffer(self, n):
+        buf = getattr(self._local, "buffer", None)
+        if buf is None or buf.shape[0] < n:
+            height, width = self.output_size
+            buf = np.empty((max(n, 16), 3, height, width), dtype=np.float32)
+            self._local.buffer = buf
+        return buf
+
+    def normalize_into(self, arrays, out=None):
+        """
+        Normalize uint8 (H, W, 3) arrays into a float32 (N, 3, H, W) batch.
+        Writes into a per-thread preallocated buffer unless `out` is given;
+        the returned view is only valid until the next call on this thread.
+        """
+        n = len(arrays)
+        out = self._buffer(n)[:n] if out is None else out
+        for i, array in enumerate(arrays):
+            if array.shape[:2] != self.output_size:
+                raise ImageError(f"Expected a {self.output_size} input, got {array.shape[:2]}")
+            np.multiply(array.transpose(2, 0, 1), self._scale, out=out[i])
+        out += self._bias
+        return out
@@ -0,0 +1,122 @@
+"""
+Columnar, memory-mapped store of mandi price history.
+
+Written by ingest_prices.py; one directory of .npy columns plus metadata:
+
+    date.npy     int32    days since 1970-01-01
+    crop.npy     int16    index into meta["crops"]
+    market.npy   int32    index into meta["markets"]
+    price.npy    float32  modal price, ₹/quintal
+    series.npy   int64    (n_series, 4): crop, market, start row, stop row
+    meta.json             crops, markets (name/state/district), row count, date range
+
+Rows are sorted by (crop, market, date), so every crop/market price series
+is one contiguous row range and a date window inside it is a binary search.
+Columns are opened with mmap_mode="r": queries only touch the pages of the
+series they read, and every uvicorn worker maps the same files, so the OS
+page cache holds one shared copy.
+"""
+import json
+import os
+
+import numpy as np
+
+COLUMNS = ("date", "crop", "market", "price")
+EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def day_number(date):
+    """datetime.date / 'YYYY-MM-DD' -> days since 1970-01-01"""
+    return int((np.datetime64(date, "D") - EPOCH).astype(np.int64))
+
+
+def day_string(days):
+    return str(EPOCH + np.timedelta64(int(days), "D"))
+
+
+class PriceStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+        self.crops = self.meta["crops"]
+        self.markets = self.meta["markets"]
+        self._crop_ids = {name.lower(): i for i, name in enumerate(self.crops)}
+        self._market_ids = {}
+        for i, m in enumerate(self.markets):
+            self._market_ids.setdefault((m["name"].lower(), m.get("state", "").lower()), i)
+            self._market_ids.setdefault((m["name"].lower(), None), i)
+
+        # (crop, market) -> (start, stop); the series table is small (one row per series)
+        series = np.load(os.path.join(path, "series.npy"))
+        self._series = {(int(c), int(m)): (int(a), int(b)) for c, m, a, b in series}
+        self._crop_markets = {}
+        for c, m in self._series:
+            self._crop_markets.setdefault(c, []).append(m)
+
+    @classmethod
+    def open(cls, path):
+        """The store at `path`, or None if nothing has been ingested there"""
+        if not path or not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        return cls(path)
+
+    @property
+    def rows(self):
+        return self.meta["rows"]
+
+    def crop_id(self, crop):
+        return self._crop_ids.get(crop.lower())
+
+    def market_id(self, name, state=None):
+        """Market id by name (and state, to tell same-named markets apart)"""
+        key = (name.lower(), state.lower() if state else None)
+        return self._market_ids.get(key, self._market_ids.get((key[0], None)))
+
+    def markets_for(self, crop_id):
+        return self._crop_markets.get(crop_id, [])
+
+    def find_markets(self, crop_id, location):
+        """
+        Market ids for a crop matching `location`: a market name, else a
+        district or state; empty if nothing matches.
+        """
+        candidates = self.markets_for(crop_id)
+        location = (location or "").strip().lower()
+        for field in ("name", "district", "state"):
+            matched = [m for m in candidates if self.markets[m].get(field, "").lower() == location]
+            if matched:
+                return matched
+        return []
+
+    def series(self, crop_id, market_id, since=None):
+        """(dates, prices) views of one series, optionally only days >= since"""
+        start, stop = self._series.get((crop_id, market_id), (0, 0))
+        dates = self.columns["date"][start:stop]
+        if since is not None and len(dates):
+            start += int(np.searchsorted(dates, since, side="left"))
+        return self.columns["date"][start:stop], self.columns["price"][start:stop]
+
+    def last_date(self, crop_id, market_ids):
+        last = [self.columns["date"][self._series[(crop_id, m)][1] - 1] for m in market_ids if (crop_id, m) in self._series]
+        return int(max(last)) if last else None
+
+    def daily_mean(self, crop_id, market_ids, since):
+        """(days, mean price) over the given markets for every day >= since with data"""
+        parts = [self.series(crop_id, m, since) for m in market_ids]
+        if not parts:
+            return np.empty(0, np.int32), np.empty(0, np.float64)
+        dates = np.concatenate([d for d, _ in parts])
+        prices = np.concatenate([p for _, p in parts]).astype(np.float64)
+        days, inverse = np.unique(dates, return_inverse=True)
+        return days, np.bincount(inverse, prices) / np.bincount(inverse)
+
+    def latest_prices(self, crop_id, market_ids, since):
+        """{market_id: (day, price)} of the last observation on or after `since`"""
+        latest = {}
+        for m in market_ids:
+            dates, prices = self.series(crop_id, m, since)
+            if len(dates):
+                latest[m] = (int(dates[-1]), float(prices[-1]))
+        return latest
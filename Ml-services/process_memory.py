@@ -0,0 +1,38 @@
+"""
+Per-process memory split into pages shared with other processes and pages
+only this process holds, from /proc/<pid>/smaps_rollup (Linux).
+
+    rss     resident pages, shared ones included (what `top` shows)
+    pss     proportional share: each shared page divided by the processes sharing it
+    shared  resident pages also mapped by another process (e.g. forked model weights)
+    unique  resident pages only this process maps (USS): what exiting would free
+
+Summing RSS over pre-forked workers counts the shared weights once per
+worker; summing PSS (or unique + the shared pages once) gives the real total.
+"""
+SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "unique",
+    "Private_Dirty": "unique",
+}
+
+
+def process_memory(pid="self"):
+    """{rss, pss, shared, unique} in bytes, or None where smaps_rollup isn't available"""
+    totals = dict.fromkeys(("rss", "pss", "shared", "unique"), 0)
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in SMAPS_FIELDS:
+                    totals[SMAPS_FIELDS[name]] += int(rest.split()[0]) * 1024  # values are in kB
+    except (OSError, ValueError):
+        return None
+    return totals
+
+
+def to_mb(memory):
+    return {name: round(value / 2 ** 20, 1) for name, value in memory.items()}
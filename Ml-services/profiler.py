@@ -0,0 +1,73 @@
+"""
+Low-overhead sampling profiler for individual requests.
+
+A background thread snapshots the Python stacks of every thread in the
+process (`sys._current_frames`) at a fixed interval and counts identical
+stacks. The result is written in the "folded" / collapsed-stack format
+(`frame;frame;frame count` per line) that flamegraph.pl, speedscope and
+inferno read directly.
+
+Samples cover all threads, so the event loop and the inference executor
+threads are both visible; other requests running at the same time show up
+too. Process-pool workers are separate processes and are not sampled.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval_s=0.002):
+        self.interval_s = interval_s
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+        self.duration_s = 0.0
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration_s = time.perf_counter() - self._started_at
+        return self
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            names.update((t.ident, t.name) for t in threading.enumerate() if t.ident not in names)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def folded(self):
+        """Collapsed stacks, one `stack count` line each"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
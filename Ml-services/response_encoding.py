@@ -0,0 +1,62 @@
+"""
+JSON encoding of diagnosis responses without building pydantic models.
+
+Half of every diagnosis (severity, description, symptoms, precautions,
+recommendations, treatment plan) is fixed per disease. Each DiseaseInfo
+encodes that block once (`DiseaseInfo.fragment`, filled in when the label
+index is built), and a response is three byte strings spliced together:
+
+    {"success":..,"status":..  +  ,<disease fragment>,  +  "top5_predictions":..,"duplicate_of":..}
+
+Keys come out in DiagnosisResponse field order, with the same values as its
+model_dump_json(), so the bytes (and the OpenAPI schema, which still
+documents DiagnosisResponse) don't change. Only the small per-request parts are
+encoded per request, with orjson (stdlib json if orjson isn't installed).
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def encode_info(info):
+    """The fields of a DiseaseInfo as a JSON object body (no braces), for splicing"""
+    return dumps({
+        "severity": info.severity,
+        "description": info.description,
+        "symptoms": list(info.symptoms),
+        "precautions": list(info.precautions),
+        "recommendations": list(info.recommendations),
+        "treatment_plan": [{"action": action, "days_later": days} for action, days in info.treatment_plan],
+    })[1:-1]
+
+
+class Diagnosis:
+    """
+    A diagnosis as head fields + disease info + tail fields.
+    head: success, plant, disease, confidence, status
+    tail: top5_predictions, model, views, similar_cases, duplicate_of
+    """
+
+    __slots__ = ("head", "info", "tail")
+
+    def __init__(self, head, info, tail):
+        self.head = head
+        self.info = info
+        self.tail = tail
+
+    def json(self):
+        """Response body, byte-identical to DiagnosisResponse(**as_dict()).model_dump_json()"""
+        return dumps(self.head)[:-1] + b"," + self.info.fragment + b"," + dumps(self.tail)[1:]
+
+    def as_dict(self):
+        return {**self.head, **json.loads(b"{" + self.info.fragment + b"}"), **self.tail}
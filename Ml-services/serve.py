@@ -0,0 +1,161 @@
+"""
+Pre-fork multi-worker launcher: every core serves requests, the model is in memory once.
+
+    python serve.py                     # one worker per CPU, port 5001
+    python serve.py --workers 4 --port 8000
+
+The master imports the app, loads the model without running a forward pass
+(so no torch worker threads exist yet and forking is safe), freezes the
+Python heap with gc.freeze() and binds the listening socket. Then it forks the
+workers. Weights are only ever read after loading, so the workers share those
+pages copy-on-write with the master: each worker's RSS includes the weights,
+but physical memory holds them once. Each worker warms up, starts its own
+executor and micro-batcher, and accepts connections on the shared socket.
+
+The master restarts workers that exit, and every --memory-report seconds it
+logs each worker's shared vs unique memory (from /proc/<pid>/smaps_rollup).
+Each worker also reports its own in /health and /metrics.
+
+ONNX Runtime sessions start their thread pools when they are created and
+cannot be forked, so with INFERENCE_BACKEND=onnx every worker loads its own copy.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger("agro.ml.serve")
+
+
+def bind(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(service, sock, worker):
+    """Body of a forked worker: serve on the inherited socket until told to stop"""
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    logger.info("Worker started", extra={"worker": worker, "pid": os.getpid()})
+    service.WORKER_ID = worker
+    server = uvicorn.Server(uvicorn.Config(service.app, lifespan="on"))
+    server.run(sockets=[sock])
+    os._exit(0)
+
+
+def memory_report(workers):
+    """Log shared vs unique memory per process, and the real total vs the sum of RSS"""
+    from process_memory import process_memory, to_mb
+
+    rows = {"master": process_memory()}
+    rows.update({f"worker-{worker}": process_memory(pid) for pid, worker in workers.items()})
+    rows = {name: memory for name, memory in rows.items() if memory is not None}
+    if not rows:
+        return
+    for name, memory in rows.items():
+        logger.info("Process memory (MB)", extra={"role": name, **to_mb(memory)})
+    total = {
+        "rss_sum": sum(m["rss"] for m in rows.values()),
+        "pss_sum": sum(m["pss"] for m in rows.values()),
+        "unique_sum": sum(m["unique"] for m in rows.values()),
+    }
+    logger.info("Memory total (MB): pss_sum is what the processes really use, rss_sum counts shared pages per process",
+                extra={"processes": len(rows), **to_mb(total)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ML service from pre-forked workers sharing one model copy")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "0")), help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--memory-report", type=float, default=float(os.getenv("MEMORY_REPORT_INTERVAL", "300")),
+                        help="Seconds between per-worker memory reports (0 = only once, after startup)")
+    args = parser.parse_args()
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    n_workers = args.workers or cpus
+    # Split the cores between workers instead of every worker running one torch thread per core
+    os.environ.setdefault("TORCH_NUM_THREADS", str(max(1, cpus // n_workers)))
+
+    import app as service
+    import inference
+    from jobs import JobStore
+
+    if service.INFERENCE_EXECUTOR != "thread":
+        logger.warning("INFERENCE_EXECUTOR=process loads a model per pool process; use thread with serve.py")
+    if inference.INFERENCE_BACKEND == "onnx":
+        logger.warning("ONNX Runtime sessions can't be forked; each worker loads its own model copy")
+    else:
+        t0 = time.perf_counter()
+        if not service.model.load(warm_up=False):
+            sys.exit(1)
+        logger.info("Model preloaded in the master", extra={"model": service.model.model_name,
+                                                             "seconds": round(time.perf_counter() - t0, 2)})
+
+    # Interrupted jobs are failed once here; a (re)started worker must not touch other workers' jobs
+    store = JobStore(service.JOB_DB_PATH)
+    store.recover(service.JOB_RETENTION_HOURS * 3600)
+    store.close()
+    service.JOB_RECOVER_ON_STARTUP = False
+
+    sock = bind(args.host, args.port)
+    logger.info("Listening", extra={"host": args.host, "port": args.port, "workers": n_workers,
+                                    "torch_threads_per_worker": os.environ["TORCH_NUM_THREADS"]})
+    # Objects that exist now are never scanned by the cyclic GC again, so collections
+    # in the workers don't write to (and un-share) the master's pages
+    gc.collect()
+    gc.freeze()
+
+    workers = {}  # pid -> worker number
+    stopping = False
+
+    def spawn(worker):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(service, sock, worker)
+        workers[pid] = worker
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for worker in range(n_workers):
+        spawn(worker)
+
+    # First report once the workers have warmed up (their own pages are allocated by then)
+    next_report = time.monotonic() + 30
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            worker = workers.pop(pid)
+            if not stopping:
+                logger.warning("Worker exited, restarting", extra={"worker": worker, "pid": pid,
+                                                                   "exit_code": os.waitstatus_to_exitcode(status)})
+                spawn(worker)
+            continue
+        if not stopping and time.monotonic() >= next_report:
+            memory_report(workers)
+            next_report = time.monotonic() + args.memory_report if args.memory_report > 0 else float("inf")
+        time.sleep(0.5)
+    logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
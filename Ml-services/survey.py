@@ -0,0 +1,156 @@
+"""
+Bulk field-survey pipeline.
+
+Images come from a large multipart upload and/or ZIP archives laid out like
+test_images.zip (one folder per crop). They stream through decoding and
+batched inference in fixed-size windows: while one window runs through the
+model, the next one is read and decoded. Only two windows are ever in
+memory, no matter how large the survey is. Results are yielded one record
+per image, followed by a per-folder summary.
+"""
+import asyncio
+import os
+import time
+import zipfile
+from collections import Counter, defaultdict
+from itertools import islice
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+DEFAULT_FOLDER = "uploads"
+
+
+class SurveyItemError(ValueError):
+    """A single survey entry can't be used (reported inline, the survey continues)"""
+
+
+def is_zip(filename, head):
+    return filename.lower().endswith(".zip") or head.startswith(b"PK\x03\x04")
+
+
+def iter_zip_images(fileobj, max_member_bytes):
+    """Yield (folder, name, read) for every image in a ZIP archive, folder = parent directory"""
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            folder = os.path.basename(os.path.dirname(name)) or DEFAULT_FOLDER
+            if info.file_size > max_member_bytes:
+                yield folder, name, SurveyItemError(f"{info.file_size} bytes uncompressed, over the {max_member_bytes} byte limit")
+                continue
+            # Read lazily, inside the ZipFile context, one member at a time
+            yield folder, name, archive.read(info)
+
+
+def iter_survey_files(files, max_bytes):
+    """
+    Flatten uploaded (filename, fileobj) pairs into (folder, name, bytes | SurveyItemError).
+    ZIP archives are expanded; plain images use their path prefix as the folder.
+    """
+    for filename, fileobj in files:
+        filename = filename or "image"
+        fileobj.seek(0)
+        head = fileobj.read(4)
+        fileobj.seek(0)
+        if is_zip(filename, head):
+            try:
+                yield from iter_zip_images(fileobj, max_bytes)
+            except zipfile.BadZipFile as e:
+                yield DEFAULT_FOLDER, filename, SurveyItemError(f"Bad ZIP archive: {e}")
+            continue
+
+        folder = os.path.basename(os.path.dirname(filename.replace("\\", "/"))) or DEFAULT_FOLDER
+        contents = fileobj.read(max_bytes + 1)
+        if len(contents) > max_bytes:
+            yield folder, filename, SurveyItemError(f"over the {max_bytes} byte upload limit")
+        else:
+            yield folder, filename, contents
+
+
+class SurveySummary:
+    """Running per-folder aggregates; O(folders x diseases) memory"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.images = Counter()
+        self.errors = Counter()
+        self.diseases = defaultdict(Counter)
+        self.confidence_sum = defaultdict(float)
+
+    def add(self, folder, record):
+        if record["type"] == "error":
+            self.errors[folder] += 1
+            return
+        self.images[folder] += 1
+        self.diseases[folder][f"{record['plant']} - {record['disease']}"] += 1
+        self.confidence_sum[folder] += record["confidence"]
+
+    def to_record(self):
+        folders = {}
+        for folder in sorted(set(self.images) | set(self.errors)):
+            n = self.images[folder]
+            folders[folder] = {
+                "images": n,
+                "errors": self.errors[folder],
+                "diseases": dict(self.diseases[folder].most_common()),
+                "mean_confidence": round(self.confidence_sum[folder] / n, 2) if n else None,
+            }
+        return {
+            "type": "summary",
+            "total_images": sum(self.images.values()),
+            "total_errors": sum(self.errors.values()),
+            "elapsed_s": round(time.perf_counter() - self.started, 3),
+            "folders": folders,
+        }
+
+
+async def run_survey(items, load_image, classify, describe, window=32):
+    """
+    Async generator of result records.
+
+    items:      sync iterator of (folder, name, bytes | SurveyItemError)
+    load_image: async bytes -> model input (decode + resize, on the executor)
+    classify:   async list of model inputs -> list of probability vectors
+    describe:   probability vector -> dict with plant / disease / confidence / ...
+    """
+    summary = SurveySummary()
+
+    async def next_window():
+        # Reading (and unzipping) happens off the event loop
+        return await asyncio.to_thread(lambda: list(islice(items, window)))
+
+    async def prepare(chunk):
+        async def load(entry):
+            _, _, contents = entry
+            if isinstance(contents, Exception):
+                return contents
+            try:
+                return await load_image(contents)
+            except Exception as e:
+                return e
+        return await asyncio.gather(*(load(entry) for entry in chunk))
+
+    async def finish(chunk, prepared):
+        inputs = [x for x in prepared if not isinstance(x, Exception)]
+        probs = iter(await classify(inputs) if inputs else [])
+        for (folder, name, _), x in zip(chunk, prepared):
+            if isinstance(x, Exception):
+                record = {"type": "error", "folder": folder, "file": name, "error": str(x)}
+            else:
+                record = {"type": "image", "folder": folder, "file": name, **describe(next(probs))}
+            summary.add(folder, record)
+            yield record
+
+    pending = None
+    while True:
+        chunk = await next_window()
+        prepared = asyncio.create_task(prepare(chunk)) if chunk else None
+        if pending is not None:
+            # Window k runs through the model while window k+1 decodes
+            async for record in finish(pending[0], await pending[1]):
+                yield record
+        if not chunk:
+            break
+        pending = (chunk, prepared)
+
+    yield summary.to_record()
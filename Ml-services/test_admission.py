@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Rejected
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_release_returns_slots_and_memory():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=2, memory_budget_bytes=1000)
+        a = await admission.acquire(300)
+        b = await admission.acquire(200, "bulk")
+        assert (admission.active, admission.memory_in_use) == (2, 500)
+        admission.release(a)
+        admission.release(b)
+        assert (admission.active, admission.memory_in_use) == (0, 0)
+        assert admission.stats()["admitted"] == {"interactive": 1, "bulk": 1}
+
+    run(scenario())
+
+
+def test_full_lane_is_rejected_with_retry_after():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queued={"interactive": 1}, max_wait_s=5)
+        held = await admission.acquire(10)
+        waiter = asyncio.create_task(admission.acquire(10))
+        await asyncio.sleep(0)
+        assert admission.queued("interactive") == 1
+
+        with pytest.raises(Rejected) as rejected:
+            await admission.acquire(10)
+        assert rejected.value.reason == "full"
+        assert 1 <= rejected.value.retry_after <= 60
+        assert admission.rejected["interactive"] == 1
+
+        admission.release(held)
+        admission.release(await waiter)
+        assert (admission.active, admission.memory_in_use, admission.queued("interactive")) == (0, 0, 0)
+
+    run(scenario())
+
+
+def test_interactive_wait_times_out_and_leaves_the_queue():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_wait_s=0.05)
+        held = await admission.acquire(10)
+        with pytest.raises(Rejected) as rejected:
+            await admission.acquire(10)
+        assert rejected.value.reason == "timeout"
+        assert admission.queued("interactive") == 0
+        admission.release(held)
+        assert (admission.active, admission.memory_in_use) == (0, 0)
+
+    run(scenario())
+
+
+def test_bulk_never_times_out_without_reject():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_wait_s=0.01)
+        held = await admission.acquire(10)
+        waiter = asyncio.create_task(admission.acquire(10, "bulk", reject=False))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        admission.release(held)
+        ticket = await waiter
+        assert ticket.waited_s >= 0.05
+        admission.release(ticket)
+
+    run(scenario())
+
+
+def test_interactive_is_admitted_before_earlier_bulk():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_wait_s=5)
+        held = await admission.acquire(10)
+        order = []
+
+        async def wait(lane):
+            ticket = await admission.acquire(10, lane)
+            order.append(lane)
+            return ticket
+
+        bulk = asyncio.create_task(wait("bulk"))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(wait("interactive"))
+        await asyncio.sleep(0)
+
+        admission.release(held)
+        admission.release(await interactive)
+        admission.release(await bulk)
+        assert order == ["interactive", "bulk"]
+        assert admission.active == 0
+
+    run(scenario())
+
+
+def test_memory_budget_queues_until_release():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=4, memory_budget_bytes=100, max_wait_s=5)
+        big = await admission.acquire(80)
+        waiter = asyncio.create_task(admission.acquire(50))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        admission.release(big)
+        small = await waiter
+        assert admission.memory_in_use == 50
+        admission.release(small)
+
+        # Larger than the whole budget: clamped, and still runs when alone
+        huge = await admission.acquire(10_000)
+        assert huge.cost == 100
+        admission.release(huge)
+        assert admission.memory_in_use == 0
+
+    run(scenario())
+
+
+def test_cancelled_waiter_releases_nothing():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_wait_s=5)
+        held = await admission.acquire(10)
+        waiter = asyncio.create_task(admission.acquire(10))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert admission.queued("interactive") == 0
+        admission.release(held)
+        assert (admission.active, admission.memory_in_use) == (0, 0)
+
+    run(scenario())
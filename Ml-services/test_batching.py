@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from batching import PRIORITY_BULK, PRIORITY_INTERACTIVE, MicroBatcher
+
+
+class GatedExecutor:
+    """Runs batches inline, after `gate` is set; records every batch"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.batches = []
+
+    async def run(self, fn, items):
+        await self.gate.wait()
+        self.batches.append(list(items))
+        return fn(items)
+
+
+def double(items):
+    return [item * 2 for item in items]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_results_come_back_to_their_callers():
+    async def scenario():
+        executor = GatedExecutor()
+        executor.gate.set()
+        batcher = MicroBatcher(double, executor, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit_many([2, 3]), batcher.submit(4))
+        await batcher.stop()
+        assert results == [2, [4, 6], 8]
+        assert executor.batches == [[1, 2, 3, 4]]
+
+    run(scenario())
+
+
+def test_interactive_groups_run_before_queued_bulk():
+    async def scenario():
+        executor = GatedExecutor()
+        batcher = MicroBatcher(double, executor, max_batch_size=2, max_wait_ms=0)
+        await batcher.start()
+        first = asyncio.create_task(batcher.submit_many(["a1", "a2"], PRIORITY_BULK))
+        await asyncio.sleep(0.01)  # first batch dispatched, blocked on the gate
+        bulk = [asyncio.create_task(batcher.submit_many([f"b{i}", f"b{i}"], PRIORITY_BULK)) for i in range(2)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(batcher.submit_many(["i", "i"], PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0.01)
+
+        executor.gate.set()
+        await asyncio.gather(first, interactive, *bulk)
+        await batcher.stop()
+        assert executor.batches == [["a1", "a2"], ["i", "i"], ["b0", "b0"], ["b1", "b1"]]
+
+    run(scenario())
+
+
+def test_group_that_does_not_fit_opens_the_next_batch():
+    async def scenario():
+        executor = GatedExecutor()
+        batcher = MicroBatcher(double, executor, max_batch_size=4, max_wait_ms=20)
+        await batcher.start()
+        tasks = [asyncio.create_task(batcher.submit_many(group))
+                 for group in ([1, 2, 3], [4, 5], [6])]
+        await asyncio.sleep(0)
+        executor.gate.set()
+        results = await asyncio.gather(*tasks)
+        await batcher.stop()
+        assert results == [[2, 4, 6], [8, 10], [12]]
+        assert executor.batches == [[1, 2, 3], [4, 5, 6]]
+        assert batcher.queue_depth == 0
+
+    run(scenario())
+
+
+def test_run_batch_errors_reach_every_caller():
+    def fail(items):
+        raise ValueError("bad batch")
+
+    async def scenario():
+        executor = GatedExecutor()
+        executor.gate.set()
+        batcher = MicroBatcher(fail, executor, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        # The batcher keeps serving after a failed batch
+        batcher.run_batch = double
+        assert await batcher.submit(3) == 6
+        await batcher.stop()
+        assert [type(r) for r in results] == [ValueError, ValueError]
+
+    run(scenario())
+
+
+def test_submit_requires_a_running_batcher():
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await MicroBatcher(double, GatedExecutor()).submit(1)
+
+    run(scenario())
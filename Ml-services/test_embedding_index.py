@@ -0,0 +1,106 @@
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+
+DIM = 16
+N_CLASSES = 4
+
+
+def vector(i):
+    """Distinct unit vectors: case i is most similar to itself"""
+    v = np.zeros(DIM, dtype=np.float32)
+    v[i % DIM] = 1.0
+    return v
+
+
+def probs(i):
+    p = np.full(N_CLASSES, 0.1, dtype=np.float32)
+    p[i % N_CLASSES] = 0.7
+    return p
+
+
+def add(index, i):
+    return index.add(f"k{i}", vector(i), probs(i), plant="Tomato", disease=f"d{i}", confidence=70.0)
+
+
+def test_search_returns_cases_with_metadata(tmp_path):
+    index = EmbeddingIndex(str(tmp_path))
+    for i in range(5):
+        add(index, i)
+    [hits] = index.search(vector(3), k=2)
+    row, similarity, case = hits[0]
+    assert (case["key"], case["disease"]) == ("k3", "d3")
+    assert similarity > 0.99
+    assert len(hits) == 2
+    assert index.row_for_key("k3") == row
+    np.testing.assert_allclose(index.embedding_for("k3"), vector(3), atol=1e-3)
+    np.testing.assert_allclose(index.probs_for(row, "k3"), probs(3), atol=1e-3)
+    assert index.embedding_for("missing") is None
+    index.close()
+
+
+def test_wraparound_overwrites_the_oldest_cases(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), max_rows=4)
+    rows = [add(index, i) for i in range(6)]
+    assert rows == [0, 1, 2, 3, 0, 1]
+    assert len(index) == 4
+    assert len(index._embeddings) == 4
+
+    # Evicted keys are gone; their rows now hold the newest cases
+    assert index.row_for_key("k0") is None and index.row_for_key("k1") is None
+    assert index.row_for_key("k4") == 0 and index.row_for_key("k5") == 1
+    assert index.probs_for(0, "k0") is None
+    np.testing.assert_allclose(index.probs_for(0, "k4"), probs(4), atol=1e-3)
+
+    [hits] = index.search(vector(0), k=4)
+    assert "k0" not in {case["key"] for _, _, case in hits}
+    [hits] = index.search(vector(5), k=1)
+    assert hits[0][2]["key"] == "k5"
+    index.close()
+
+
+def test_search_only_scans_the_newest_rows(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), max_rows=8, search_rows=3)
+    for i in range(10):  # wraps: rows 0 and 1 hold k8, k9
+        add(index, i)
+    [hits] = index.search(vector(0), k=8)
+    assert {case["key"] for _, _, case in hits} == {"k7", "k8", "k9"}
+    index.close()
+
+
+def test_second_instance_sees_appends_and_compaction(tmp_path):
+    writer = EmbeddingIndex(str(tmp_path), max_rows=4)
+    reader = EmbeddingIndex(str(tmp_path), max_rows=4)
+    add(writer, 0)
+    [hits] = reader.search(vector(0), k=1)
+    assert hits[0][2]["key"] == "k0"
+
+    # Enough overwrites to compact cases.jsonl (a new generation) several times
+    for i in range(1, 20):
+        add(writer, i)
+    assert writer._generation > 0
+    [hits] = reader.search(vector(19), k=4)
+    assert {case["key"] for _, _, case in hits} == {"k16", "k17", "k18", "k19"}
+    assert reader.row_for_key("k19") == writer.row_for_key("k19")
+    assert reader.row_for_key("k15") is None
+
+    # The reader can write too, and the writer picks it up
+    add(reader, 20)
+    [hits] = writer.search(vector(20), k=1)
+    assert hits[0][2]["key"] == "k20"
+    writer.close()
+    reader.close()
+
+
+def test_reopen_restores_the_ring(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), max_rows=4)
+    for i in range(7):
+        add(index, i)
+    index.close()
+
+    reopened = EmbeddingIndex(str(tmp_path), max_rows=4)
+    assert len(reopened) == 4
+    assert {case["key"] for case in reopened.cases} == {"k3", "k4", "k5", "k6"}
+    assert add(reopened, 7) == reopened.row_for_key("k7") == 3  # overwrites k3, the oldest
+    assert reopened.row_for_key("k3") is None
+    reopened.close()
@@ -0,0 +1,81 @@
+import numpy as np
+
+from outbreaks import OutbreakCounters, geohash, region_report, save_snapshot
+
+PUNE = (18.52, 73.85)
+NASHIK = (20.0, 73.79)
+HOUR = 3600
+
+
+def test_geohash_known_cell():
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_region_series_sums_cells_under_a_prefix():
+    counters = OutbreakCounters(bucket_seconds=HOUR, buckets=4, precision=5)
+    counters.record(*PUNE, "Tomato", "Late Blight", timestamp=0)
+    counters.record(*PUNE, "Tomato", "Late Blight", timestamp=HOUR)
+    counters.record(PUNE[0] + 0.1, PUNE[1], "Tomato", "Late Blight", timestamp=HOUR)  # next cell, same district
+    counters.record(*NASHIK, "Tomato", "Late Blight", timestamp=HOUR)
+
+    cell = geohash(*PUNE, 5)
+    series = counters.region_series(cell, now_bucket=1)
+    assert series[("Tomato", "Late Blight")].tolist() == [0, 0, 1, 1]
+    wide = counters.region_series(cell[:3], now_bucket=1)
+    assert wide[("Tomato", "Late Blight")].tolist() == [0, 0, 1, 2]
+    assert counters.recorded == 4
+
+
+def test_advancing_the_ring_clears_reused_buckets():
+    counters = OutbreakCounters(bucket_seconds=HOUR, buckets=4, precision=5)
+    cell = geohash(*PUNE, 5)
+    counters.record(*PUNE, "Tomato", "Healthy", timestamp=0)
+    counters.record(*PUNE, "Tomato", "Healthy", timestamp=2 * HOUR)
+    counters.record(*PUNE, "Tomato", "Healthy", timestamp=4 * HOUR)  # reuses bucket 0's slot
+    assert counters.region_series(cell, now_bucket=4)[("Tomato", "Healthy")].tolist() == [0, 1, 0, 1]
+
+    counters.record(*PUNE, "Tomato", "Healthy", timestamp=0)  # older than the window: ignored
+    assert counters.region_series(cell, now_bucket=4)[("Tomato", "Healthy")].sum() == 2
+
+    counters.record(*PUNE, "Tomato", "Healthy", timestamp=20 * HOUR)  # jumps past the whole window
+    assert counters.region_series(cell, now_bucket=20)[("Tomato", "Healthy")].tolist() == [0, 0, 0, 1]
+
+
+def test_series_of_a_lagging_peer_is_aligned_to_now():
+    counters = OutbreakCounters(bucket_seconds=HOUR, buckets=4, precision=5)
+    counters.record(*PUNE, "Tomato", "Late Blight", timestamp=HOUR)
+    cell = geohash(*PUNE, 5)
+    assert counters.region_series(cell, now_bucket=1)[("Tomato", "Late Blight")].tolist() == [0, 0, 0, 1]
+    assert counters.region_series(cell, now_bucket=3)[("Tomato", "Late Blight")].tolist() == [0, 1, 0, 0]
+    assert counters.region_series(cell, now_bucket=0)[("Tomato", "Late Blight")].tolist() == [0, 0, 0, 0]
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "counts-0.npz")
+    counters = OutbreakCounters(bucket_seconds=HOUR, buckets=4, precision=5)
+    for hour in range(3):
+        counters.record(*PUNE, "Potato", "Early Blight", timestamp=hour * HOUR)
+    save_snapshot(path, counters.snapshot())
+
+    restored = OutbreakCounters.load(path, bucket_seconds=HOUR, buckets=4, precision=5)
+    cell = geohash(*PUNE, 5)
+    assert restored.head == counters.head
+    assert restored.recorded == 3
+    np.testing.assert_array_equal(restored.region_series(cell, 2)[("Potato", "Early Blight")],
+                                  counters.region_series(cell, 2)[("Potato", "Early Blight")])
+
+    other_layout = OutbreakCounters.load(path, bucket_seconds=HOUR, buckets=8, precision=5)
+    assert other_layout.recorded == 0 and other_layout.head is None
+
+
+def test_region_report_flags_growing_diseases():
+    series = {
+        ("Tomato", "Late Blight"): np.array([0] * 20 + [2] * 4),
+        ("Tomato", "Healthy"): np.array([1] * 24),
+    }
+    report = region_report(series, HOUR, windows_hours=(24,), recent_hours=4, min_cases=3)
+    assert report["windows"]["24h"] == {"scans": 32, "diseased": 8, "disease_rate": 0.25}
+    [emerging] = report["emerging"]
+    assert (emerging["disease"], emerging["recent_cases"]) == ("Late Blight", 8)
+    assert emerging["growth"] > 1
+    assert report["daily"] == [8]
@@ -0,0 +1,170 @@
+"""
+Multi-view inference for high-resolution field photos.
+
+Two modes, both producing several model-sized views of one upload that run
+in the same forward pass as everything else in the batch:
+
+- tiles: the photo is resized once so that a grid of overlapping, model-sized
+  tiles covers it, and the tiles are cut out as array views. Small lesions
+  keep their detail instead of being squashed into one 224x224 input. The
+  per-tile disease probability forms a coarse lesion heat map.
+- tta:   test-time augmentation on the standard resize: center crop, its
+  mirror, then the four corner crops and their mirrors.
+
+The number of views is capped by a latency budget: TileBudget keeps a running
+estimate of the forward-pass cost per image (fed from the micro-batcher) and
+converts a budget in milliseconds into a view count.
+"""
+import math
+import time
+
+import numpy as np
+
+MODES = ("standard", "tiles", "tta")
+
+
+def _positions(total, size, count):
+    """`count` evenly spaced offsets of a `size` window in `total` (centered if one)"""
+    if count == 1:
+        return [max(0, (total - size) // 2)]
+    return np.linspace(0, total - size, count).round().astype(int).tolist()
+
+
+def plan_grid(width, height, tile_h, tile_w, max_tiles, overlap=0.25):
+    """
+    Grid for tiling a width x height photo with tiles of tile_h x tile_w model pixels.
+
+    The short side gets k tiles (k = 1, 2, ...) overlapping by `overlap`; the
+    long side as many as needed to cover it. The largest k whose grid fits in
+    max_tiles wins, as long as a tile still covers at least one model pixel
+    per photo pixel (no upsampling). Returns (rows, cols, (resized w, resized h)).
+    """
+    landscape = width / tile_w >= height / tile_h
+    short, long_ = (height, width) if landscape else (width, height)
+    tile_short, tile_long = (tile_h, tile_w) if landscape else (tile_w, tile_h)
+    stride = 1 - overlap
+
+    best = None
+    for k in range(1, max_tiles + 1):
+        scale = short / (tile_short * (1 + (k - 1) * stride))  # photo pixels per model pixel
+        if k > 1 and scale < 1:
+            break
+        resized_long = long_ / scale
+        n_long = 1 if resized_long <= tile_long else math.ceil((resized_long - tile_long) / (tile_long * stride)) + 1
+        if k * n_long > max_tiles:
+            if best is None:
+                best = (k, max(1, max_tiles // k), scale)
+            break
+        best = (k, n_long, scale)
+
+    k, n_long, scale = best
+    rows, cols = (k, n_long) if landscape else (n_long, k)
+    resized = (max(tile_w, round(width / scale)), max(tile_h, round(height / scale)))
+    return rows, cols, resized
+
+
+def load_tiles(preprocessor, contents, max_tiles, overlap=0.25):
+    """
+    Bytes -> grid of uint8 tiles (row-major). Runs in the inference executor.
+    Returns (tiles, (rows, cols), {stage: milliseconds}).
+    """
+    tile_h, tile_w = preprocessor.output_size
+    plan = {}
+
+    def target_size(width, height):
+        plan["grid"] = plan_grid(width, height, tile_h, tile_w, max_tiles, overlap)
+        return plan["grid"][2]
+
+    t0 = time.perf_counter()
+    image = preprocessor.decode(contents, target_size=target_size)
+    if "grid" not in plan:  # not a JPEG, so no draft call
+        target_size(*image.size)
+    t1 = time.perf_counter()
+
+    rows, cols, size = plan["grid"]
+    if image.size != size:
+        image = image.resize(size, preprocessor.resample)
+    array = np.asarray(image, dtype=np.uint8)
+    tiles = [
+        array[y:y + tile_h, x:x + tile_w]
+        for y in _positions(size[1], tile_h, rows)
+        for x in _positions(size[0], tile_w, cols)
+    ]
+    t2 = time.perf_counter()
+    return tiles, (rows, cols), {"decode": (t1 - t0) * 1000, "resize": (t2 - t1) * 1000}
+
+
+def load_tta(preprocessor, contents, max_views):
+    """
+    Bytes -> up to max_views augmented crops of the standard resize.
+    Returns (views, None, {stage: milliseconds}).
+    """
+    crop_h, crop_w = preprocessor.output_size
+    t0 = time.perf_counter()
+    image = preprocessor.decode(contents)
+    t1 = time.perf_counter()
+
+    if preprocessor.shortest_edge is not None:
+        size = preprocessor._target_size(*image.size)
+    else:
+        # Direct-resize models have no crop margin; leave the usual 256/224 one for the shifted crops
+        size = (round(crop_w * 8 / 7), round(crop_h * 8 / 7))
+    if image.size != size:
+        image = image.resize(size, preprocessor.resample)
+    array = np.asarray(image, dtype=np.uint8)
+
+    width, height = size
+    top, left = (height - crop_h) // 2, (width - crop_w) // 2
+    center = array[top:top + crop_h, left:left + crop_w]
+    corners = [array[y:y + crop_h, x:x + crop_w] for y in (0, height - crop_h) for x in (0, width - crop_w)]
+    views = [center, center[:, ::-1]] + corners + [c[:, ::-1] for c in corners]
+    t2 = time.perf_counter()
+    return views[:max(1, max_views)], None, {"decode": (t1 - t0) * 1000, "resize": (t2 - t1) * 1000}
+
+
+def combine_views(probs, mode):
+    """
+    One probability vector from the views of one image.
+
+    tiles: mean weighted by each tile's top probability, so confident tiles
+           (leaf, lesion) outweigh uninformative ones (soil, sky, blur)
+    tta:   plain mean
+    """
+    probs = np.asarray(probs, dtype=np.float32)
+    probs = probs.reshape(-1, probs.shape[-1])
+    if mode == "tiles":
+        weights = probs.max(axis=1)
+        return (weights[:, None] * probs).sum(axis=0) / weights.sum()
+    return probs.mean(axis=0)
+
+
+def lesion_heatmap(grid_probs, healthy_ids):
+    """(rows, cols, n_classes) tile probabilities -> (rows, cols) probability of any disease"""
+    grid_probs = np.asarray(grid_probs, dtype=np.float64)
+    healthy = grid_probs[..., list(healthy_ids)].sum(axis=-1) if healthy_ids else np.zeros(grid_probs.shape[:-1])
+    return np.round(1.0 - healthy, 3)
+
+
+class TileBudget:
+    """
+    Turns a latency budget into a view count per image.
+
+    The per-image forward cost is an exponential moving average over observed
+    batches (seconds / batch size), so it follows the hardware and backend
+    actually in use. Batches include fixed per-batch overhead, which makes
+    the estimate err on the side of fewer views.
+    """
+
+    def __init__(self, max_views=16, initial_ms_per_view=20.0, smoothing=0.2):
+        self.max_views = max(1, max_views)
+        self.ms_per_view = initial_ms_per_view
+        self.smoothing = smoothing
+
+    def observe(self, size, seconds):
+        if size > 0:
+            self.ms_per_view += self.smoothing * (seconds * 1000 / size - self.ms_per_view)
+
+    def views_for(self, budget_ms, images=1):
+        """Views per image that keep `images` images within budget_ms of forward-pass time"""
+        views = int(budget_ms / max(self.ms_per_view, 1e-3) / max(images, 1))
+        return max(1, min(self.max_views, views))
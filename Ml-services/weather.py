@@ -0,0 +1,191 @@
+"""
+Weather forecasts for advisories, cached per geohash cell.
+
+Farms in the same cell (precision 5, about 5 x 5 km) share one forecast,
+fetched for the cell centre. Entries are keyed by (cell, time bucket of
+ttl_seconds), so a forecast is reused until the bucket ends. Concurrent
+requests for a cell that is being fetched wait for that fetch instead of
+starting their own (coalescing), and at most max_concurrent upstream calls
+run at once. A batch of thousands of farms in one district costs a handful
+of upstream calls.
+
+Providers turn (lat, lng) into a Forecast of STEP_HOURS steps (blocking; the
+cache runs them in threads):
+
+    OpenWeatherProvider   OpenWeather 5 day / 3 hour forecast API
+    FileWeatherProvider   forecasts from a local JSON file (tests, offline demos)
+"""
+import asyncio
+import json
+import logging
+import time
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from outbreaks import geohash, geohash_center
+
+logger = logging.getLogger(__name__)
+
+STEP_HOURS = 3
+HORIZON_STEPS = 16  # 48 hours
+
+OPENWEATHER_FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+
+
+@dataclass
+class Forecast:
+    """Per-step arrays (HORIZON_STEPS, STEP_HOURS apart, first = now)"""
+    location: str
+    description: str
+    temp_c: np.ndarray
+    humidity: np.ndarray
+    rain_mm: np.ndarray   # rain within the step
+    wind_kmh: np.ndarray
+    storm: np.ndarray     # thunderstorm in the step
+
+    @classmethod
+    def from_steps(cls, location, steps):
+        """
+        From a list of {"temp", "humidity", "rain", "wind" (km/h), "description"} steps;
+        a short list is extended by repeating its last step.
+        """
+        if not steps:
+            raise ValueError("forecast has no steps")
+        steps = steps[:HORIZON_STEPS]
+        steps = steps + [steps[-1]] * (HORIZON_STEPS - len(steps))
+        descriptions = [str(s.get("description", "")).lower() for s in steps]
+        return cls(
+            location=location,
+            description=descriptions[0],
+            temp_c=np.array([s["temp"] for s in steps], dtype=np.float32),
+            humidity=np.array([s["humidity"] for s in steps], dtype=np.float32),
+            rain_mm=np.array([s.get("rain", 0.0) for s in steps], dtype=np.float32),
+            wind_kmh=np.array([s.get("wind", 0.0) for s in steps], dtype=np.float32),
+            storm=np.array([("storm" in d or "thunder" in d) for d in descriptions]),
+        )
+
+
+class OpenWeatherProvider:
+    def __init__(self, api_key, timeout=10.0):
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def fetch(self, lat, lng):
+        query = urllib.parse.urlencode({"lat": f"{lat:.4f}", "lon": f"{lng:.4f}", "units": "metric",
+                                        "cnt": HORIZON_STEPS, "appid": self.api_key})
+        with urllib.request.urlopen(f"{OPENWEATHER_FORECAST_URL}?{query}", timeout=self.timeout) as response:
+            data = json.load(response)
+        steps = [{
+            "temp": item["main"]["temp"],
+            "humidity": item["main"]["humidity"],
+            "rain": item.get("rain", {}).get("3h", 0.0),
+            "wind": item["wind"]["speed"] * 3.6,  # m/s
+            "description": item["weather"][0]["description"] if item.get("weather") else "",
+        } for item in data["list"]]
+        return Forecast.from_steps(data.get("city", {}).get("name", ""), steps)
+
+
+class FileWeatherProvider:
+    """
+    Forecasts from a JSON file, by longest matching geohash prefix:
+
+        {"cells": {"tek9": {"location": "Pune", "steps": [{"temp": 18, "humidity": 95, "rain": 1.2,
+                                                           "wind": 8, "description": "light rain"}, ...]}},
+         "default": {"location": "Anywhere", "steps": [...]}}
+
+    A single step stands for the whole horizon.
+    """
+
+    def __init__(self, path):
+        with open(path) as f:
+            data = json.load(f)
+        self.cells = {cell: Forecast.from_steps(entry.get("location", cell), entry["steps"])
+                      for cell, entry in data.get("cells", {}).items()}
+        default = data.get("default")
+        self.default = Forecast.from_steps(default.get("location", ""), default["steps"]) if default else None
+
+    def fetch(self, lat, lng):
+        cell = geohash(lat, lng, 12)
+        for length in range(len(cell), 0, -1):
+            forecast = self.cells.get(cell[:length])
+            if forecast is not None:
+                return forecast
+        if self.default is None:
+            raise LookupError(f"No forecast for {lat:.4f}, {lng:.4f} in the weather file")
+        return self.default
+
+
+class WeatherCache:
+    def __init__(self, provider, precision=5, ttl_seconds=1800.0, max_entries=50000, max_concurrent=8):
+        self.provider = provider
+        self.precision = precision
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.max_concurrent = max_concurrent
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.upstream_calls = 0
+        self._entries = OrderedDict()  # (cell, bucket) -> Forecast
+        self._pending = {}             # (cell, bucket) -> fetch task
+        self._limit = None
+
+    def cell(self, lat, lng):
+        return geohash(lat, lng, self.precision)
+
+    async def get(self, cell):
+        """Forecast for a cell (raises what the provider raised if it can't be fetched)"""
+        key = (cell, int(time.time() // self.ttl))
+        forecast = self._entries.get(key)
+        if forecast is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return forecast
+        task = self._pending.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._pending[key] = asyncio.ensure_future(self._fetch(key))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def get_many(self, cells):
+        """{cell: Forecast, or None if it couldn't be fetched} for distinct cells, fetched concurrently"""
+        cells = list(dict.fromkeys(cells))
+        results = await asyncio.gather(*(self.get(cell) for cell in cells), return_exceptions=True)
+        return {cell: None if isinstance(result, Exception) else result for cell, result in zip(cells, results)}
+
+    async def _fetch(self, key):
+        cell, bucket = key
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_concurrent)
+        async with self._limit:
+            self.upstream_calls += 1
+            try:
+                forecast = await asyncio.to_thread(self.provider.fetch, *geohash_center(cell))
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Weather fetch failed", extra={"cell": cell, "error": str(e)})
+                raise
+        self._entries.pop((cell, bucket - 1), None)
+        self._entries[key] = forecast
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return forecast
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "upstream_calls": self.upstream_calls,
+        }